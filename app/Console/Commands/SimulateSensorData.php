@@ -9,6 +9,7 @@
 use App\Models\Pipeline;
 use App\Events\SensorUpdated;
 use App\Events\LeakDetected;
+use App\Helpers\TrainingStore;
 
 class SimulateSensorData extends Command
 {
@@ -102,42 +103,14 @@ public function handle()
             
             $this->line("[$i/$count] 📡 Data Sent | 🚨 Alert Broadcasted: {$alertId} for {$targetPipeline->id}");
             
-            // 6. Save to CSV (For ML Retraining)
-            $this->appendToCsv($data, 1, 0); // 1 = Leak Detected
+            // 6. Save to the training store (For ML Retraining)
+            if (!TrainingStore::append('pipeline', array_merge($data, ['leak_detected' => 1, 'leak_location' => 0]))) {
+                $this->error("[$i/$count] Training store append failed");
+            }
 
             sleep($interval);
         }
 
         $this->info("✅ Simulation Complete.");
     }
-
-    /**
-     * Helper to save data to CSV for ML Training
-     */
-    private function appendToCsv($data, $isLeak, $leakLocation)
-    {
-        $filePath = storage_path('app/ml_models/pipeline_sensor_data.csv');
-        
-        // Create directory if missing
-        if (!file_exists(dirname($filePath))) mkdir(dirname($filePath), 0777, true);
-        
-        $isNewFile = !file_exists($filePath);
-        $file = fopen($filePath, 'a');
-        
-        // Add Header if new
-        if ($isNewFile) {
-            fputcsv($file, ['f_main', 'f_1', 'f_2', 'f_3', 'p_main', 'p_dma1', 'p_dma2', 'p_dma3', 'pump_on', 'comp_on', 's1', 's2', 's3', 'leak_detected', 'leak_location']);
-        }
-
-        $row = [
-            $data['f_main'], $data['f_1'], $data['f_2'], $data['f_3'],
-            $data['p_main'], $data['p_dma1'], $data['p_dma2'], $data['p_dma3'],
-            $data['pump_on'], $data['comp_on'], $data['s1'], $data['s2'], $data['s3'],
-            $isLeak, 
-            $leakLocation
-        ];
-        
-        fputcsv($file, $row);
-        fclose($file);
-    }
 }
\ No newline at end of file
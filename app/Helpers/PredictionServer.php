@@ -0,0 +1,88 @@
+<?php
+
+namespace App\Helpers;
+
+use App\Models\MLModel;
+use Illuminate\Support\Facades\Http;
+use Illuminate\Support\Facades\Log;
+
+/**
+ * Client for the long-lived app/ml/predict_server.py process.
+ * Every call returns null when the server is not configured or unreachable,
+ * so callers can fall back to spawning predict_leak.py.
+ */
+class PredictionServer
+{
+    public static function enabled()
+    {
+        return (bool) (config('services.ml.predict_url') || config('services.ml.predict_socket'));
+    }
+
+    /**
+     * Version tag used in model filenames (1.2 -> "v1_2").
+     */
+    public static function versionTag(MLModel $model)
+    {
+        return 'v' . str_replace('.', '_', (string) $model->version);
+    }
+
+    /**
+     * Score one reading with the given model.
+     */
+    public static function predict(MLModel $model, array $data)
+    {
+        $output = self::post('/predict', array_merge(self::modelPayload($model), ['input' => $data]));
+        if ($output === null) return null;
+
+        return [
+            'leak_detected' => $output['leak_detected'] ?? 0,
+            'leak_location' => $output['leak_location'] ?? 0,
+            'confidence'    => $output['confidence'] ?? 0,
+            // The server appended the reading to the training store itself (--store)
+            'stored'        => (bool) ($output['stored'] ?? false),
+        ];
+    }
+
+    /**
+     * Tell the server a new version went ACTIVE so it can load and swap it now.
+     */
+    public static function activate(MLModel $model)
+    {
+        return self::post('/activate', self::modelPayload($model));
+    }
+
+    private static function modelPayload(MLModel $model)
+    {
+        return [
+            'version'  => self::versionTag($model),
+            'detect'   => base_path($model->file_path_detect),
+            'locate'   => base_path($model->file_path_locate),
+            'features' => base_path($model->file_path_features),
+        ];
+    }
+
+    private static function post($path, array $payload)
+    {
+        if (!self::enabled()) return null;
+
+        $url = config('services.ml.predict_url');
+        $socket = config('services.ml.predict_socket');
+
+        try {
+            $client = Http::timeout((float) config('services.ml.predict_timeout', 2));
+            if ($socket) {
+                $client = $client->withOptions(['curl' => [CURLOPT_UNIX_SOCKET_PATH => $socket]]);
+                $url = 'http://localhost';
+            }
+
+            $response = $client->post(rtrim($url, '/') . $path, $payload);
+            $output = $response->json();
+
+            if ($response->successful() && is_array($output)) return $output;
+        } catch (\Exception $e) {
+            Log::warning('ML Prediction Server unavailable: ' . $e->getMessage());
+        }
+
+        return null;
+    }
+}
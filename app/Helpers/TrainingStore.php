@@ -0,0 +1,108 @@
+<?php
+
+namespace App\Helpers;
+
+/**
+ * PHP writer for the columnar training store read by app/ml/training_store.py.
+ *
+ * Rows are appended to storage/app/ml_models/store/{dataset}/{Y-m-d}.f32 as
+ * little-endian float32 values in COLUMNS order, so counting rows is just
+ * filesize / ROW_BYTES.
+ */
+class TrainingStore
+{
+    const COLUMNS = [
+        'f_main', 'f_1', 'f_2', 'f_3',
+        'p_main', 'p_dma1', 'p_dma2', 'p_dma3',
+        'pump_on', 'comp_on', 's1', 's2', 's3',
+        'solenoid_active', 'leak_detected', 'leak_location',
+    ];
+
+    const ROW_BYTES = 4 * 16;
+
+    public static function path($dataset)
+    {
+        return storage_path("app/ml_models/store/{$dataset}");
+    }
+
+    /**
+     * Append one row (keyed by column name, missing values = 0).
+     * Returns false when the row could not be written in full.
+     */
+    public static function append($dataset, array $row)
+    {
+        $dir = self::path($dataset);
+        if (!file_exists($dir)) mkdir($dir, 0777, true);
+        self::ensureManifest($dir);
+
+        $values = array_map(fn ($col) => (float) ($row[$col] ?? 0), self::COLUMNS);
+        $segment = $dir . '/' . date('Y-m-d') . '.f32';
+
+        $fp = false;
+        $attempts = 0;
+        // Robust File Locking for Windows
+        while (!$fp && $attempts < 10) {
+            $fp = @fopen($segment, 'ab');
+            if (!$fp) { usleep(100000); $attempts++; }
+        }
+        if (!$fp) return false;
+
+        $written = false;
+        if (flock($fp, LOCK_EX)) {
+            // A torn write from a crashed writer must not shift later rows (as in training_store.py)
+            $size = fstat($fp)['size'];
+            $aligned = $size - $size % self::ROW_BYTES;
+            if ($aligned !== $size) ftruncate($fp, $aligned);
+
+            $written = fwrite($fp, pack('g*', ...$values)) === self::ROW_BYTES;
+            if (!$written) ftruncate($fp, $aligned);
+            fflush($fp);
+            flock($fp, LOCK_UN);
+        }
+        fclose($fp);
+        return $written;
+    }
+
+    /**
+     * Row count from segment sizes (no file contents are read).
+     */
+    public static function count($dataset)
+    {
+        $rows = 0;
+        foreach (glob(self::path($dataset) . '/*.f32') ?: [] as $segment) {
+            $rows += intdiv(filesize($segment), self::ROW_BYTES);
+        }
+        return $rows;
+    }
+
+    /**
+     * Rows appended since the last training run, using the per-segment
+     * watermark train_with_ga.py writes to train_state.json.
+     */
+    public static function countSinceLastTraining($dataset)
+    {
+        $state = @json_decode(@file_get_contents(storage_path('app/ml_models/train_state.json')), true);
+        $watermark = $state["{$dataset}_watermark"] ?? null;
+        if (!is_array($watermark)) return self::count($dataset);
+
+        $rows = 0;
+        foreach (glob(self::path($dataset) . '/*.f32') ?: [] as $segment) {
+            $trained = $watermark[basename($segment, '.f32')] ?? 0;
+            $rows += max(0, intdiv(filesize($segment), self::ROW_BYTES) - $trained);
+        }
+        return $rows;
+    }
+
+    private static function ensureManifest($dir)
+    {
+        $manifest = $dir . '/manifest.json';
+        if (file_exists($manifest)) return;
+
+        file_put_contents($manifest, json_encode([
+            'format' => 1,
+            'columns' => self::COLUMNS,
+            'dtype' => '<f4',
+            'row_bytes' => self::ROW_BYTES,
+        ], JSON_PRETTY_PRINT), LOCK_EX);
+    }
+}
@@ -0,0 +1,79 @@
+<?php
+
+namespace App\Helpers;
+
+/**
+ * Writer for storage/app/ml_models/validated_alerts.csv, the human-labelled
+ * (HITL) training rows read by app/ml/train_with_ga.py.
+ *
+ * Each validated reading is written once with a `weight` column instead of
+ * being repeated; the trainer collapses identical rows and sums their
+ * weights into sample_weight (dataset.load_validated).
+ */
+class ValidatedAlerts
+{
+    const COLUMNS = [...TrainingStore::COLUMNS, 'weight'];
+
+    // Priority of one human label (it used to be written 10 times)
+    const WEIGHT = 10;
+
+    public static function path()
+    {
+        return storage_path('app/ml_models/validated_alerts.csv');
+    }
+
+    /**
+     * Append one labelled row (values in TrainingStore::COLUMNS order).
+     */
+    public static function append(array $row, $weight = self::WEIGHT)
+    {
+        $csvPath = self::path();
+        if (!file_exists(dirname($csvPath))) mkdir(dirname($csvPath), 0777, true);
+
+        $fp = false;
+        $attempts = 0;
+        // Retry loop
+        while (!$fp && $attempts < 10) {
+            $fp = @fopen($csvPath, 'c+');
+            if (!$fp) { usleep(100000); $attempts++; }
+        }
+        if (!$fp) return false;
+
+        if (flock($fp, LOCK_EX)) {
+            $header = fgetcsv($fp);
+            if (!$header) {
+                ftruncate($fp, 0);
+                fputcsv($fp, self::COLUMNS);
+            } elseif (!in_array('weight', $header)) {
+                self::upgrade($fp);
+            }
+            fseek($fp, 0, SEEK_END);
+            fputcsv($fp, [...array_values($row), $weight]);
+            fflush($fp);
+            flock($fp, LOCK_UN);
+        }
+        fclose($fp);
+        return true;
+    }
+
+    /**
+     * Rewrite a file from before the weight column: identical rows (the old
+     * 10x copies) become one row weighted by how often it appeared.
+     */
+    private static function upgrade($fp)
+    {
+        $counts = [];
+        $rows = [];
+        while (($line = fgetcsv($fp)) !== false) {
+            if ($line === [null]) continue;
+            $key = implode(',', $line);
+            if (!isset($counts[$key])) $rows[$key] = $line;
+            $counts[$key] = ($counts[$key] ?? 0) + 1;
+        }
+
+        rewind($fp);
+        ftruncate($fp, 0);
+        fputcsv($fp, self::COLUMNS);
+        foreach ($rows as $key => $line) fputcsv($fp, [...$line, $counts[$key]]);
+    }
+}
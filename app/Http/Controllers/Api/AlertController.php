@@ -7,6 +7,7 @@
 use App\Models\SensorData;
 use App\Models\Pipeline;
 use App\Helpers\PipelineMapper; // ✅ Critical Import
+use App\Helpers\ValidatedAlerts;
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\Log;
 
@@ -136,7 +137,6 @@ public function markFalseGroup(Request $request)
      */
     private function reinforceModel($alert, $isRealLeak, $correctedPipelineId = null)
     {
-        $csvPath = storage_path('app/ml_models/validated_alerts.csv');
         Log::info("🧠 HITL: Processing Alert ID: {$alert->id}");
 
         try {
@@ -172,24 +172,9 @@ private function reinforceModel($alert, $isRealLeak, $correctedPipelineId = null
                 $locationLabel
             ];
 
-            // 4. Write to File (Robust)
-            if (!file_exists(dirname($csvPath))) mkdir(dirname($csvPath), 0777, true);
-            
-            $fp = @fopen($csvPath, 'a');
-            
-            if ($fp) {
-                if (filesize($csvPath) == 0) {
-                    fputcsv($fp, ['f_main','f_1','f_2','f_3','p_main','p_dma1','p_dma2','p_dma3','pump_on','comp_on','s1','s2','s3','solenoid_active','leak_detected','leak_location']);
-                }
-                
-                // Write 10 times for priority (Oversampling)
-                if (flock($fp, LOCK_EX)) { 
-                    for ($i = 0; $i < 10; $i++) fputcsv($fp, $row);
-                    flock($fp, LOCK_UN); 
-                }
-                fclose($fp);
-                
-                Log::info("✅ HITL SUCCESS: Wrote 10 rows. Label: $locationLabel (Pipe: " . ($correctedPipelineId ?? 'None') . ")");
+            // 4. Write once, weighted for priority (collapsed into sample_weight at training)
+            if (ValidatedAlerts::append($row)) {
+                Log::info("✅ HITL SUCCESS: Wrote row (weight " . ValidatedAlerts::WEIGHT . "). Label: $locationLabel (Pipe: " . ($correctedPipelineId ?? 'None') . ")");
             } else {
                  Log::error("❌ HITL FAILED: Could not open CSV.");
             }
@@ -10,6 +10,8 @@
 use Symfony\Component\Process\Process;
 use Illuminate\Support\Facades\Log;
 use App\Helpers\PipelineMapper;
+use App\Helpers\PredictionServer;
+use App\Helpers\ValidatedAlerts;
 
 class MlModelController extends Controller
 {
@@ -78,6 +80,9 @@ public function activate($id)
         MLModel::query()->update(['status' => 'TRAINED', 'is_active' => false]);
         $model = MLModel::findOrFail($id);
         $model->update(['status' => 'ACTIVE', 'is_active' => true]);
+
+        // Hot-swap the prediction server (no-op if it isn't running)
+        PredictionServer::activate($model);
         
         return response()->json(['status' => 'success', 'message' => "v{$model->version} Activated"]);
     }
@@ -92,7 +97,7 @@ public function retrainWithGA(Request $request)
         return $this->executeRetraining('Manual API Trigger');
     }
 
-    public function executeRetraining($triggeredBy = 'Automatic')
+    public function executeRetraining($triggeredBy = 'Automatic', $incremental = false)
     {
         // 1. Check if already training
         $isTraining = MLModel::where('status', 'TRAINING')->exists();
@@ -134,13 +139,13 @@ public function executeRetraining($triggeredBy = 'Automatic')
         MLModel::create([
             'name' => 'GA Optimized Model',
             'version' => $newVersionVal,
-            'description' => "Retrained via {$triggeredBy}",
+            'description' => "Retrained via {$triggeredBy}" . ($incremental ? ' (incremental)' : ''),
             'status' => 'TRAINING',
             'is_active' => false,
             'accuracy' => 0,
             'file_path_detect' => "storage/app/ml_models/rf_leak_detect_{$versionTag}.joblib",
             'file_path_locate' => "storage/app/ml_models/rf_leak_locate_{$versionTag}.joblib",
-            'file_path_features' => 'storage/app/ml_models/feature_cols.joblib',
+            'file_path_features' => "storage/app/ml_models/feature_cols_{$versionTag}.joblib",
         ]);
 
         // Initialize Progress File
@@ -152,6 +157,8 @@ public function executeRetraining($triggeredBy = 'Automatic')
             // ✅ CMD CONSTRUCTION
             // We pass the python executable, the script path, and the version tag
             $cmd = "\"{$pythonExe}\" \"{$scriptPath}\" \"{$versionTag}\"";
+            // Incremental: extend the live forest with the new rows only (falls back to a full refit)
+            if ($incremental) $cmd .= " --incremental";
 
             if ($isWindows) {
                 // Windows Background: start /B "" command
@@ -267,35 +274,11 @@ public function collectLabeledData(Request $request)
                 $leakLoc
             ];
 
-            // 5. Write to CSV (With Locking)
-            $csvPath = storage_path('app/ml_models/validated_alerts.csv');
-            if (!file_exists(dirname($csvPath))) mkdir(dirname($csvPath), 0777, true);
-            
-            $fp = false; 
-            $attempts = 0;
-            // Retry loop
-            while (!$fp && $attempts < 10) { 
-                $fp = @fopen($csvPath, 'a'); 
-                if (!$fp) { usleep(100000); $attempts++; } 
-            }
-            
-            if ($fp) {
-                // Header if new
-                if (filesize($csvPath) == 0) {
-                    fputcsv($fp, ['f_main','f_1','f_2','f_3','p_main','p_dma1','p_dma2','p_dma3','pump_on','comp_on','s1','s2','s3','solenoid_active','leak_detected','leak_location']);
-                }
-
-                // Write 10 times (Priority)
-                if (flock($fp, LOCK_EX)) { 
-                    for ($i = 0; $i < 10; $i++) fputcsv($fp, $row);
-                    flock($fp, LOCK_UN); 
-                }
-                fclose($fp);
-                
-                Log::info("✅ HITL Saved: P_Main=" . $row[4] . " | Loc=" . $row[15]);
-            } else {
+            // 5. Write to CSV once, weighted (With Locking)
+            if (!ValidatedAlerts::append($row)) {
                 throw new \Exception("Could not open CSV file (Locked).");
             }
+            Log::info("✅ HITL Saved: P_Main=" . $row[4] . " | Loc=" . $row[15]);
 
             return response()->json(['message' => 'Data labeled and saved successfully.']);
 
@@ -9,6 +9,8 @@
 use App\Models\Pipeline;
 use App\Models\SystemSetting;
 use App\Helpers\PipelineMapper; // ✅ Critical Import
+use App\Helpers\PredictionServer;
+use App\Helpers\TrainingStore;
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\Log;
 use Symfony\Component\Process\Process;
@@ -106,16 +108,22 @@ public function store(Request $request)
             $this->createAlert($finalLocation, $accuracy);
         }
 
-        // 6. SAVE TO CSV (For Training)
+        // 6. SAVE TO TRAINING STORE (For Training)
         // Use simulated truth if available, otherwise use ML result
         $truthLeak = $data['simulated_leak'] ?? $finalIsLeak;
         $truthLoc = $data['simulated_location'] ?? $finalLocation;
-        
-        $csvPath = storage_path('app/ml_models/pipeline_sensor_data.csv');
-        $this->appendToCsv($csvPath, $data, $truthLeak, $truthLoc);
-        
+
+        // (skipped when the prediction server already stored it with its batch)
+        if (empty($mlResult['stored'])) {
+            $stored = TrainingStore::append('pipeline', array_merge($data, [
+                'leak_detected' => $truthLeak,
+                'leak_location' => $truthLoc,
+            ]));
+            if (!$stored) Log::error('🔥 Training store append failed');
+        }
+
         // 7. AUTO TRAIN CHECK
-        $this->checkAutoTrainThreshold($csvPath);
+        $this->checkAutoTrainThreshold();
 
         return response()->json([
             'status' => 'success',
@@ -144,6 +152,10 @@ private function getPredictionFromPython($data)
 
         if (!$activeModel) return $result;
 
+        // Prefer the long-lived prediction server (models already in memory)
+        $served = PredictionServer::predict($activeModel, $data);
+        if ($served !== null) return array_merge($result, $served);
+
         $inputData = json_encode($data);
         $isWindows = strtoupper(substr(PHP_OS, 0, 3)) === 'WIN';
         $pythonExe = base_path($isWindows ? 'venv\Scripts\python.exe' : 'venv/bin/python');
@@ -172,6 +184,10 @@ private function getPredictionFromPython($data)
                     $result['leak_location'] = $output['leak_location'] ?? 0;
                     $result['confidence'] = $output['confidence'] ?? 0;
                 }
+            } else {
+                // e.g. a window-feature model, which needs predict_server.py for the reading history
+                $output = json_decode($process->getOutput(), true);
+                Log::error('ML Prediction Error: ' . ($output['error'] ?? $process->getErrorOutput()));
             }
         } catch (\Exception $e) {
             Log::error('ML Prediction Error: ' . $e->getMessage());
@@ -213,52 +229,21 @@ private function createAlert($locationInt, $accuracy)
         }
     }
 
-    private function appendToCsv($filePath, $data, $isLeak, $leakLocation)
-    {
-        if (!file_exists(dirname($filePath))) mkdir(dirname($filePath), 0777, true);
-        
-        $fp = false;
-        $attempts = 0;
-        // Robust File Locking for Windows
-        while (!$fp && $attempts < 10) { 
-            $fp = @fopen($filePath, 'a'); 
-            if (!$fp) { usleep(100000); $attempts++; } 
-        }
-
-        if ($fp) {
-            if (filesize($filePath) == 0) {
-                fputcsv($fp, ['f_main', 'f_1', 'f_2', 'f_3', 'p_main', 'p_dma1', 'p_dma2', 'p_dma3', 'pump_on', 'comp_on', 's1', 's2', 's3', 'solenoid_active', 'leak_detected', 'leak_location']);
-            }
-            if (flock($fp, LOCK_EX)) {
-                fputcsv($fp, [
-                    $data['f_main'] ?? 0, $data['f_1'] ?? 0, $data['f_2'] ?? 0, $data['f_3'] ?? 0,
-                    $data['p_main'] ?? 0, $data['p_dma1'] ?? 0, $data['p_dma2'] ?? 0, $data['p_dma3'] ?? 0,
-                    $data['pump_on'] ?? 0, $data['comp_on'] ?? 0,
-                    $data['s1'] ?? 0, $data['s2'] ?? 0, $data['s3'] ?? 0,
-                    $data['solenoid_active'] ?? 0, 
-                    $isLeak, $leakLocation
-                ]);
-                flock($fp, LOCK_UN);
-            }
-            fclose($fp);
-        }
-    }
-
-    private function checkAutoTrainThreshold($csvPath) {
-        if (!file_exists($csvPath)) return;
-        // Optimization: Only check line count 10% of the time to save IO
+    private function checkAutoTrainThreshold() {
+        // Optimization: Only check settings 10% of the time to save DB queries
         if (rand(1, 10) !== 1) return;
         try {
             $target = (int) (SystemSetting::where('key', 'training_target')->value('value') ?? 100);
             $mode = SystemSetting::where('key', 'training_mode')->value('value') ?? 'manual';
             if ($mode === 'auto') {
-                $lineCount = count(file($csvPath));
-                if ($lineCount >= $target) {
+                // New rows since the last run (segment sizes vs. train_state.json watermark)
+                $rowCount = TrainingStore::countSinceLastTraining('pipeline');
+                if ($rowCount >= $target) {
                     $isTraining = MLModel::where('status', 'TRAINING')->exists();
                     if (!$isTraining) {
                         Log::info("🤖 Auto-Triggering ML Training");
                         $controller = new \App\Http\Controllers\Api\MlModelController();
-                        $controller->executeRetraining('Automatic Threshold');
+                        $controller->executeRetraining('Automatic Threshold', true);
                     }
                 }
             }
@@ -0,0 +1,277 @@
+"""
+Backtest stored model versions against the training history.
+
+Streams the same data train_with_ga.py trains on (historical CSV, the live
+pipeline store, the compacted reservoir and validated alerts) through any
+published rf_leak_detect_{version} / rf_leak_locate_{version} pair in large
+vectorized chunks, and reports per version and dataset:
+  - detection: confusion matrix, precision, recall, F1, accuracy
+  - location: confusion matrix and accuracy of the location model on true
+    leaks, and end-to-end accuracy (leak detected AND located correctly)
+  - throughput in rows/sec (features + scoring)
+
+Versions are scored concurrently (forest scoring releases the GIL); the raw
+data is loaded once and shared. Window features are computed per chunk with
+the preceding rows as context, so they match a whole-frame transform.
+
+With --unseen only pipeline rows appended after the last training run's
+watermark (train_state.json) are used, i.e. rows no model has trained on.
+With --record each version's summary is stored under "backtest" in
+models_manifest.json, next to the training metrics, before a promote.
+
+Usage:
+    python backtest.py [--versions v1_2,v1_3] [--datasets historical,pipeline,validated,reservoir]
+                       [--unseen] [--chunk-size 100000] [--n-jobs N] [--engine auto]
+                       [--early-exit DELTA] [--record] [--out backtest_result.json]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from features import frame_to_raw, load_pipeline
+from dataset import load_csv, load_validated
+from training_store import load_dataset
+from incremental import STATE_FILE, load_state
+from parallel_fit import resolve_n_jobs
+from predict_leak import load_model, score
+from retention import Reservoir
+from model_publisher import ModelPublisher, NAMES, LIVE_NAMES, STORAGE_DIR
+from instrumentation import write_json_atomic
+
+warnings.filterwarnings("ignore")
+
+DATASETS = {
+    "historical": "historical_sensor_data.csv",
+    "pipeline": "pipeline_sensor_data.csv",  # legacy CSV, read with the store
+    "validated": "validated_alerts.csv",
+    "reservoir": "reservoir",  # compacted older pipeline rows (retention.py)
+}
+CHUNK_ROWS = 100_000
+
+
+class Dataset:
+    """Raw feature inputs, labels and window-history groups of one data source."""
+
+    def __init__(self, name, df, groups):
+        self.name = name
+        self.raw = frame_to_raw(df, np.float32)
+        self.y_detect = (df["leak_detected"].to_numpy() > 0).astype(np.int64)
+        self.y_locate = df["leak_location"].to_numpy(dtype=np.int64)
+        self.groups = groups
+
+    def __len__(self):
+        return len(self.raw)
+
+
+def load_datasets(names, storage_dir=STORAGE_DIR, unseen=False):
+    """{name: Dataset}, grouped for window features the way train_with_ga.py groups them."""
+    out = {}
+    for name in names:
+        if name == "pipeline":
+            since = load_state(os.path.join(storage_dir, STATE_FILE)).get("pipeline_watermark") if unseen else None
+            # With a watermark the legacy CSV is skipped: it predates every store segment
+            df = load_dataset("pipeline", legacy_csv=os.path.join(storage_dir, DATASETS[name]),
+                              root=os.path.join(storage_dir, "store"), since=since or None)
+        elif name == "reservoir":
+            df = Reservoir(os.path.join(storage_dir, DATASETS[name])).load()
+        elif name == "validated":
+            # Distinct validated readings (the weights are training priorities, not repeats)
+            df = load_validated(os.path.join(storage_dir, DATASETS[name]))
+        else:
+            df = load_csv(os.path.join(storage_dir, DATASETS[name]))
+        if df.empty: continue
+        # One history per source; validated alerts and reservoir samples are isolated readings
+        groups = -1 - np.arange(len(df)) if name in ("validated", "reservoir") else np.full(len(df), 0 if name == "historical" else 1)
+        out[name] = Dataset(name, df, groups)
+    return out
+
+
+def discover_versions(storage_dir=STORAGE_DIR):
+    """Published versions (manifest) plus any older rf_leak_detect_{version} pair on disk."""
+    versions = set(ModelPublisher(storage_dir).manifest()["versions"])
+    prefix, suffix = NAMES["detect"].split("{}")
+    for path in glob.glob(os.path.join(storage_dir, NAMES["detect"].format("*"))):
+        version = os.path.basename(path)[len(prefix):-len(suffix)]
+        if version != "live" and os.path.exists(os.path.join(storage_dir, NAMES["locate"].format(version))):
+            versions.add(version)
+    return sorted(versions)
+
+
+def version_paths(version, storage_dir=STORAGE_DIR):
+    names = LIVE_NAMES if version == "live" else NAMES
+    return {kind: os.path.join(storage_dir, name.format(version)) for kind, name in names.items()}
+
+
+# ====================================================
+# METRICS
+# ====================================================
+def confusion(y_true, y_pred, labels):
+    """Confusion matrix (rows = truth, columns = prediction) over the fixed `labels`."""
+    labels = np.asarray(labels)
+    k = len(labels)
+    if len(y_true) == 0: return np.zeros((k, k), dtype=np.int64)
+    t, p = np.searchsorted(labels, y_true), np.searchsorted(labels, y_pred)
+    return np.bincount(t * k + p, minlength=k * k).reshape(k, k)
+
+
+def _ratio(num, den):
+    return round(float(num) / float(den), 4) if den else None
+
+
+def detection_metrics(cm):
+    tn, fp, fn, tp = (int(v) for v in cm.ravel())
+    precision, recall = _ratio(tp, tp + fp), _ratio(tp, tp + fn)
+    # Undefined without predicted or actual leaks; 0.0 when none of them were right
+    f1 = None
+    if precision is not None and recall is not None:
+        f1 = round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+    return {"labels": [0, 1], "confusion": cm.tolist(), "precision": precision, "recall": recall,
+            "f1": f1, "accuracy": _ratio(tn + tp, cm.sum())}
+
+
+def location_metrics(cm, labels, end_to_end):
+    leaks = int(cm.sum())
+    return {"labels": [int(l) for l in labels], "confusion": cm.tolist(), "leaks": leaks,
+            "accuracy": _ratio(np.trace(cm), leaks), "end_to_end": _ratio(end_to_end, leaks),
+            "end_to_end_rows": int(end_to_end)}
+
+
+# ====================================================
+# SCORING
+# ====================================================
+def iter_features(data, pipeline, chunk_rows=CHUNK_ROWS):
+    """(lo, hi, X) per chunk; window columns see up to max(window) - 1 rows of the previous chunk."""
+    context = max(pipeline.windows, default=1) - 1
+    for lo in range(0, len(data), chunk_rows):
+        hi = min(lo + chunk_rows, len(data))
+        start = max(0, lo - context)
+        X = pipeline.transform(data.raw[start:hi], np.float32, groups=data.groups[start:hi])
+        yield lo, hi, X[lo - start:]
+
+
+def backtest_version(version, datasets, storage_dir=STORAGE_DIR, engine="auto", early_exit=None,
+                     chunk_rows=CHUNK_ROWS):
+    paths = version_paths(version, storage_dir)
+    clf_detect, clf_locate = load_model(paths["detect"], engine), load_model(paths["locate"], engine)
+    pipeline = load_pipeline(paths["features"])
+    leak_labels = set(clf_locate.classes_.tolist())
+    for data in datasets.values(): leak_labels.update(np.unique(data.y_locate[data.y_detect == 1]).tolist())
+    loc_labels = np.array(sorted(leak_labels))
+
+    report = {"version": version, "features": pipeline.n_features, "datasets": {}}
+    total_rows, start = 0, time.perf_counter()
+    for name, data in datasets.items():
+        cm_det = np.zeros((2, 2), dtype=np.int64)
+        cm_loc = np.zeros((len(loc_labels), len(loc_labels)), dtype=np.int64)
+        end_to_end = 0
+        for lo, hi, X in iter_features(data, pipeline, chunk_rows):
+            y_det, y_loc = data.y_detect[lo:hi], data.y_locate[lo:hi]
+            proba, _ = score(clf_detect, X, early_exit)
+            detected = clf_detect.classes_[proba.argmax(axis=1)].astype(np.int64)
+            cm_det += confusion(y_det, detected, [0, 1])
+
+            # Location model on every true leak; end-to-end also needs the detection right
+            leaks = np.flatnonzero(y_det == 1)
+            if len(leaks):
+                proba_loc, _ = score(clf_locate, X[leaks], early_exit)
+                located = clf_locate.classes_[proba_loc.argmax(axis=1)].astype(np.int64)
+                cm_loc += confusion(y_loc[leaks], located, loc_labels)
+                end_to_end += int(np.count_nonzero((located == y_loc[leaks]) & (detected[leaks] == 1)))
+        report["datasets"][name] = {"rows": len(data), "detect": detection_metrics(cm_det),
+                                    "locate": location_metrics(cm_loc, loc_labels, end_to_end)}
+        total_rows += len(data)
+
+    seconds = time.perf_counter() - start
+    report.update(rows=total_rows, seconds=round(seconds, 3),
+                  rows_per_s=round(total_rows / seconds, 1) if seconds > 0 else None)
+    return report
+
+
+def summary(report):
+    """Pooled metrics over every dataset of one version's report."""
+    cm_det = sum(np.array(d["detect"]["confusion"]) for d in report["datasets"].values())
+    loc = [d["locate"] for d in report["datasets"].values()]
+    leaks = sum(l["leaks"] for l in loc)
+    correct = sum(np.trace(np.array(l["confusion"])) for l in loc)
+    end_to_end = sum(l["end_to_end_rows"] for l in loc)
+    det = detection_metrics(cm_det) if report["datasets"] else {}
+    return {"rows": report["rows"], "precision": det.get("precision"), "recall": det.get("recall"),
+            "f1": det.get("f1"), "accuracy": det.get("accuracy"),
+            "location_accuracy": _ratio(correct, leaks), "end_to_end": _ratio(end_to_end, leaks),
+            "datasets": sorted(report["datasets"])}
+
+
+def run_backtest(versions, datasets, storage_dir=STORAGE_DIR, n_jobs=None, engine="auto", early_exit=None,
+                 chunk_rows=CHUNK_ROWS):
+    """{version: report}; versions are scored concurrently on up to n_jobs threads."""
+    def run(version):
+        try:
+            return backtest_version(version, datasets, storage_dir, engine, early_exit, chunk_rows)
+        except Exception as e:
+            return {"version": version, "error": str(e)}
+
+    workers = min(resolve_n_jobs(n_jobs), max(1, len(versions)))
+    if workers == 1: return {v: run(v) for v in versions}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(versions, pool.map(run, versions)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest stored model versions on the training history.")
+    parser.add_argument("--versions", help="Comma-separated version tags, or 'live' (default: every stored version)")
+    parser.add_argument("--datasets", default=",".join(DATASETS), help="Subset of " + ",".join(DATASETS))
+    parser.add_argument("--unseen", action="store_true",
+                        help="Pipeline rows only from after the last training run's watermark")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--n-jobs", type=int, default=None, help="Versions scored at once (default: ML_TRAIN_JOBS or all cores)")
+    parser.add_argument("--engine", choices=["auto", "numpy", "sklearn"], default="auto")
+    parser.add_argument("--early-exit", type=float, metavar="DELTA", help="Score with early-exit forests (early_exit.py)")
+    parser.add_argument("--record", action="store_true", help="Store each summary in models_manifest.json")
+    parser.add_argument("--out", help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    names = [d.strip() for d in args.datasets.split(",") if d.strip()]
+    unknown = [d for d in names if d not in DATASETS]
+    if unknown:
+        print(json.dumps({"status": "error", "message": f"Unknown datasets: {unknown}"}))
+        sys.exit(1)
+    versions = [v.strip() for v in args.versions.split(",") if v.strip()] if args.versions else discover_versions()
+    if not versions:
+        print(json.dumps({"status": "error", "message": "No stored model versions"}))
+        sys.exit(1)
+
+    datasets = load_datasets(names, unseen=args.unseen)
+    start = time.perf_counter()
+    reports = run_backtest(versions, datasets, n_jobs=args.n_jobs, engine=args.engine,
+                           early_exit=args.early_exit, chunk_rows=args.chunk_size)
+    seconds = time.perf_counter() - start
+    scored = sum(r["rows"] for r in reports.values() if "error" not in r)
+
+    summaries = {v: summary(r) for v, r in reports.items() if "error" not in r}
+    if args.record:
+        publisher = ModelPublisher()
+        for version, s in summaries.items(): publisher.annotate(version, "backtest", dict(s, unseen=args.unseen))
+
+    out = {
+        "status": "success" if summaries else "error",
+        "datasets": {name: len(d) for name, d in datasets.items()},
+        "unseen": args.unseen,
+        "seconds": round(seconds, 3),
+        "rows_per_s": round(scored / seconds, 1) if seconds > 0 else None,
+        "summary": summaries,
+        "versions": reports,
+    }
+    if args.out: write_json_atomic(args.out, out)
+    print(json.dumps(out))
+    if not summaries: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
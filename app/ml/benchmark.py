@@ -0,0 +1,302 @@
+"""
+Benchmark suite for the ML pipeline, driven by synthetic data (generate_dataset.py).
+
+Stages:
+  inference  cold (new process / first call) and warm single-row latency of
+             predict_leak.py, and batch throughput (full and exact early-exit),
+             for both scoring engines
+  training   wall time and peak RSS of train_with_ga.py and train_model.py
+             per dataset size (each run is a child process in a scratch
+             ML_STORAGE_DIR; peak RSS comes from os.wait4's rusage)
+  loading    CSV parse (pd.read_csv and dataset.load_csv), training-store
+             load and feature transform per dataset size
+
+Results are written as JSON. With --baseline, every metric is compared to
+the stored run and changes worse than --tolerance are flagged as
+regressions (exit code 1).
+
+Usage:
+    python benchmark.py [--stages inference,training,loading] [--train-sizes 10000,100000,1000000]
+                        [--out benchmark_results.json] [--baseline baseline.json] [--tolerance 0.2]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+
+from features import get_pipeline
+from dataset import load_csv
+from training_store import TrainingStore
+from generate_dataset import iter_chunks, write_csv
+from forest_artifact import export_forest, artifact_path
+from predict_leak import load_models, predict, predict_batch
+
+warnings.filterwarnings("ignore")
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+SEED = 42
+
+
+def synthetic_frame(rows, seed=SEED):
+    frames = list(iter_chunks(rows, seed))
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def percentiles_ms(seconds):
+    arr = np.asarray(seconds) * 1000
+    return {"p50": round(float(np.percentile(arr, 50)), 4), "p99": round(float(np.percentile(arr, 99)), 4),
+            "mean": round(float(arr.mean()), 4)}
+
+
+# Forks the command from a small interpreter and reports its exit code and
+# ru_maxrss on stderr. Linux carries the pre-exec high-water mark over exec, so
+# forking straight from this (large) process would report our own RSS instead.
+RSS_LAUNCHER = """
+import os, sys, json
+pid = os.fork()
+if pid == 0:
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 2)
+    os.execv(sys.argv[1], sys.argv[1:])
+_, status, usage = os.wait4(pid, 0)
+sys.stderr.write(json.dumps([os.waitstatus_to_exitcode(status), usage.ru_maxrss]))
+"""
+
+
+def run_child(cmd, env=None, cwd=None):
+    """Run a command; returns (exit code, wall seconds, peak RSS in MB or None, stdout tail)."""
+    start = time.perf_counter()
+    if hasattr(os, "wait4"):
+        proc = subprocess.run([sys.executable, "-c", RSS_LAUNCHER] + cmd, env=env, cwd=cwd,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        code, maxrss = json.loads(proc.stderr.decode().strip().splitlines()[-1])
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss_mb = round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    else:
+        proc = subprocess.run(cmd, env=env, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        code, rss_mb = proc.returncode, None
+    wall = time.perf_counter() - start
+    return code, wall, rss_mb, proc.stdout.decode("utf-8", "replace")[-500:]
+
+
+# ====================================================
+# INFERENCE
+# ====================================================
+def bench_inference(workdir, train_rows=20_000, warm_iters=500, batch_rows=100_000):
+    df = synthetic_frame(train_rows)
+    pipeline = get_pipeline()
+    X = pipeline.transform_frame(df)
+    det = RandomForestClassifier(n_estimators=100, max_depth=12, random_state=42).fit(X, df["leak_detected"])
+    leaks = df["leak_detected"] == 1
+    loc = RandomForestClassifier(n_estimators=100, max_depth=12, random_state=42).fit(X[leaks.to_numpy()], df["leak_location"][leaks])
+
+    paths = {}
+    for name, clf in (("detect", det), ("locate", loc)):
+        paths[name] = os.path.join(workdir, f"rf_leak_{name}_bench.joblib")
+        joblib.dump(clf, paths[name])
+        export_forest(clf, artifact_path(paths[name]))
+    paths["features"] = os.path.join(workdir, "feature_cols_bench.joblib")
+    joblib.dump(list(pipeline.feature_cols), paths["features"])
+
+    records = synthetic_frame(batch_rows, seed=SEED + 1).to_dict("records")
+    sample = json.dumps({k: float(v) for k, v in records[0].items()})
+    results = {}
+
+    for engine in ("sklearn", "numpy"):
+        # Cold: fresh interpreter, model load and one prediction (what the PHP fallback pays per request)
+        code, wall, _, _ = run_child([sys.executable, os.path.join(ML_DIR, "predict_leak.py"),
+                                      "--detect", paths["detect"], "--locate", paths["locate"],
+                                      "--features", paths["features"], "--input", sample, "--engine", engine])
+        # Cold in-process: load + first call
+        start = time.perf_counter()
+        clf_det, clf_loc = load_models(paths["detect"], paths["locate"], engine)
+        predict(records[0], clf_det, clf_loc, pipeline)
+        cold_call = time.perf_counter() - start
+
+        warm = []
+        for i in range(warm_iters):
+            t = time.perf_counter()
+            predict(records[i % len(records)], clf_det, clf_loc, pipeline)
+            warm.append(time.perf_counter() - t)
+
+        _, batch_time = timed(predict_batch, records, clf_det, clf_loc, pipeline)
+        early, early_time = timed(predict_batch, records, clf_det, clf_loc, pipeline, early_exit=0.0)
+
+        results[engine] = {
+            "cold_process_ms": round(wall * 1000, 2) if code == 0 else None,
+            "cold_first_call_ms": round(cold_call * 1000, 3),
+            "warm_single_ms": percentiles_ms(warm),
+            "batch_rows_per_s": round(len(records) / batch_time, 1),
+            "early_exit_rows_per_s": round(len(records) / early_time, 1),
+            "early_exit_mean_trees": round(float(np.mean([r["trees_used"]["detect"] for r in early])), 1),
+        }
+    return results
+
+
+# ====================================================
+# TRAINING
+# ====================================================
+TRAIN_SCRIPTS = {
+    # script -> (CSV it reads, extra args)
+    "train_with_ga": ("historical_sensor_data.csv", ["bench"]),
+    "train_model": ("pipeline_sensor_data.csv", []),
+}
+
+
+def bench_training(workdir, sizes):
+    results = {}
+    for script, (csv_name, extra) in TRAIN_SCRIPTS.items():
+        results[script] = {}
+        for rows in sizes:
+            storage = os.path.join(workdir, f"{script}_{rows}")
+            os.makedirs(storage, exist_ok=True)
+            write_csv(rows, os.path.join(storage, csv_name), SEED)
+
+            env = dict(os.environ, ML_STORAGE_DIR=storage)
+            code, wall, rss, tail = run_child([sys.executable, os.path.join(ML_DIR, f"{script}.py")] + extra,
+                                              env=env, cwd=ML_DIR)
+            entry = {"wall_s": round(wall, 2), "peak_rss_mb": rss, "exit_code": code}
+            if code != 0: entry["output_tail"] = tail
+            results[script][str(rows)] = entry
+            shutil.rmtree(storage, ignore_errors=True)
+    return results
+
+
+# ====================================================
+# LOADING
+# ====================================================
+def bench_loading(workdir, sizes):
+    pipeline = get_pipeline()
+    results = {}
+    for rows in sizes:
+        path = os.path.join(workdir, f"load_{rows}.csv")
+        write_csv(rows, path, SEED)
+        store_root = os.path.join(workdir, f"store_{rows}")
+        store = TrainingStore("bench", store_root)
+        for df in iter_chunks(rows, SEED): store.append_frame(df)
+
+        _, t_read = timed(pd.read_csv, path)
+        df, t_load = timed(load_csv, path)
+        _, t_store = timed(store.load)
+        _, t_feat = timed(pipeline.transform_frame, df)
+
+        results[str(rows)] = {
+            "read_csv_s": round(t_read, 4),
+            "load_csv_s": round(t_load, 4),
+            "store_load_s": round(t_store, 4),
+            "features_s": round(t_feat, 4),
+            "load_csv_rows_per_s": round(rows / t_load, 1),
+            "frame_mb": round(df.memory_usage(deep=True).sum() / 1e6, 2),
+        }
+        os.remove(path)
+        shutil.rmtree(store_root, ignore_errors=True)
+    return results
+
+
+# ====================================================
+# BASELINE COMPARISON
+# ====================================================
+def flatten(d, prefix=""):
+    out = {}
+    for key, value in d.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict): out.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool): out[name] = value
+    return out
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_s")
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that got worse than `tolerance` (relative) vs. the baseline."""
+    current, base = flatten(results), flatten(baseline)
+    regressions = []
+    for metric, old in base.items():
+        new = current.get(metric)
+        if new is None or old in (0, None) or metric.endswith("exit_code"):
+            continue
+        change = (old - new) / old if higher_is_better(metric) else (new - old) / old
+        if change > tolerance:
+            regressions.append({"metric": metric, "baseline": old, "current": new, "worse_by": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ML pipeline on synthetic data.")
+    parser.add_argument("--stages", default="inference,training,loading")
+    parser.add_argument("--train-sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--load-sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    sizes = lambda spec: [int(s) for s in spec.split(",") if s.strip()]
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix="ml_bench_")
+    try:
+        for stage in stages:
+            print(f"⏱️ {stage}...", file=sys.stderr)
+            if stage == "inference":
+                report["results"]["inference"] = bench_inference(workdir)
+            elif stage == "training":
+                report["results"]["training"] = bench_training(workdir, sizes(args.train_sizes))
+            elif stage == "loading":
+                report["results"]["loading"] = bench_loading(workdir, sizes(args.load_sizes))
+            else:
+                raise SystemExit(f"Unknown stage: {stage}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        regressions = compare(report["results"], baseline.get("results", baseline), args.tolerance)
+        report["baseline"] = {"path": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+
+    tmp = args.out + ".tmp"
+    with open(tmp, "w") as f: json.dump(report, f, indent=2)
+    os.replace(tmp, args.out)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Parity check: pure-NumPy forest scoring (forest_eval.py) vs sklearn.
+
+Scores the training data (history CSV, live rows from the training store
+and validated alerts) with both engines and fails (exit 1) when
+probabilities, predicted classes or the final predict_leak.py results differ
+beyond float tolerance.
+
+Usage:
+    python check_parity.py [--detect rf_leak_detect_live.joblib --locate rf_leak_locate_live.joblib]
+                           [--features feature_cols.joblib] [--data file.csv ...] [--tol 1e-6]
+
+Without model paths the _live models in ML_STORAGE_DIR (default
+storage/app/ml_models) are used; if those do not exist, small forests are
+fitted on the data first. Without any data, generate_dataset.py rows are used.
+"""
+import os
+import sys
+import json
+import argparse
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from dataset import empty_frame, load_csv
+from features import get_pipeline, load_pipeline
+from forest_artifact import forest_arrays, CompactForest
+from generate_dataset import generate
+from predict_leak import predict_batch
+from training_store import load_dataset
+
+warnings.filterwarnings("ignore")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STORAGE_DIR = os.environ.get("ML_STORAGE_DIR") or os.path.join(BASE_DIR, "storage", "app", "ml_models")
+HIST_CSV = "historical_sensor_data.csv"
+LEGACY_CSV = "pipeline_sensor_data.csv"
+VAL_CSV = "validated_alerts.csv"
+
+# Rows scored when there is no training data at all
+SYNTHETIC_ROWS = 5000
+
+
+def to_compact(clf):
+    """In-memory CompactForest (same arrays as the .forest file, no disk round trip)."""
+    header, arrays = forest_arrays(clf)
+    return CompactForest(header, arrays)
+
+
+def load_data(paths=None, storage_dir=STORAGE_DIR):
+    """The given CSVs, or the training data: history, live rows (store + legacy CSV) and validated alerts."""
+    if paths:
+        frames = [load_csv(path) for path in paths]
+    else:
+        frames = [
+            load_csv(os.path.join(storage_dir, HIST_CSV)),
+            load_dataset("pipeline", legacy_csv=os.path.join(storage_dir, LEGACY_CSV), root=os.path.join(storage_dir, "store")),
+            load_csv(os.path.join(storage_dir, VAL_CSV)),
+        ]
+    frames = [f for f in frames if not f.empty]
+    if not frames: return empty_frame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def compare_forest(name, clf, X, tol):
+    expected = clf.predict_proba(X)
+    actual = to_compact(clf).predict_proba(X)
+    diff = float(np.abs(expected - actual).max()) if len(X) else 0.0
+
+    # Classes may only differ where sklearn itself is within `tol` of a tie
+    top2 = np.sort(expected, axis=1)[:, -2:] if expected.shape[1] > 1 else np.ones((len(X), 2))
+    near_tie = (top2[:, 1] - top2[:, 0]) <= tol
+    mismatched = (expected.argmax(axis=1) != actual.argmax(axis=1)) & ~near_tie
+
+    return {
+        "forest": name,
+        "rows": int(len(X)),
+        "max_abs_proba_diff": diff,
+        "class_mismatches": int(mismatched.sum()),
+        "ok": diff <= tol and not mismatched.any(),
+    }
+
+
+def compare_results(records, det, loc, pipeline):
+    expected = predict_batch(records, det, loc, pipeline)
+    actual = predict_batch(records, to_compact(det), to_compact(loc), pipeline)
+    bad = 0
+    for e, a in zip(expected, actual):
+        if (e["leak_detected"], e["leak_location"]) != (a["leak_detected"], a["leak_location"]) \
+                or abs(e["confidence"] - a["confidence"]) > 0.01:
+            bad += 1
+    return {"rows": len(records), "result_mismatches": bad, "ok": bad == 0}
+
+
+def run_checks(df, clf_det, clf_loc, pipeline, tol=1e-6):
+    """All parity checks of both forests on `df`; "status" is "success" when every check passes."""
+    X = pipeline.transform_frame(df)
+    checks = [
+        compare_forest("detect", clf_det, X, tol),
+        compare_forest("locate", clf_loc, X, tol),
+        dict(compare_results(df.to_dict("records"), clf_det, clf_loc, pipeline), forest="predict_leak"),
+    ]
+    return {"status": "success" if all(c["ok"] for c in checks) else "failed", "checks": checks}
+
+
+def fit_forests(df, pipeline, n_estimators=50):
+    """Small detection and location forests, for when there are no trained models."""
+    X = pipeline.transform_frame(df)
+    clf_det = RandomForestClassifier(n_estimators=n_estimators, max_depth=12, random_state=42)
+    clf_loc = RandomForestClassifier(n_estimators=n_estimators, max_depth=12, random_state=42)
+    return clf_det.fit(X, df["leak_detected"].astype(int)), clf_loc.fit(X, df["leak_location"].astype(int))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check NumPy forest scoring against sklearn.")
+    parser.add_argument("--detect")
+    parser.add_argument("--locate")
+    parser.add_argument("--features", help="feature_cols.joblib of the models (default: the live layout)")
+    parser.add_argument("--data", nargs="*", help="CSV files (default: the training data)")
+    parser.add_argument("--tol", type=float, default=1e-6)
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the synthetic rows used without data")
+    args = parser.parse_args()
+
+    df = load_data(args.data)
+    source = "files" if args.data else "training"
+    if df.empty:
+        df = generate(SYNTHETIC_ROWS, np.random.default_rng(args.seed))
+        source = "synthetic"
+
+    detect = args.detect or os.path.join(STORAGE_DIR, "rf_leak_detect_live.joblib")
+    locate = args.locate or os.path.join(STORAGE_DIR, "rf_leak_locate_live.joblib")
+    if os.path.exists(detect) and os.path.exists(locate):
+        pipeline = load_pipeline(args.features or os.path.join(STORAGE_DIR, "feature_cols.joblib"))
+        clf_det, clf_loc = joblib.load(detect), joblib.load(locate)
+    else:
+        pipeline = get_pipeline()
+        clf_det, clf_loc = fit_forests(df, pipeline)
+
+    out = dict(run_checks(df, clf_det, clf_loc, pipeline, args.tol), data=source)
+    print(json.dumps(out, indent=2))
+    sys.exit(0 if out["status"] == "success" else 1)
+
+
+if __name__ == "__main__":
+    main()
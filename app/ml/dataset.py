@@ -0,0 +1,92 @@
+"""
+Chunked loader for the training CSVs.
+
+Rows are counted first (a newline scan, constant memory), column arrays are
+preallocated in compact dtypes, and the file is then parsed in chunks that
+are coerced and copied into place. Peak memory is the compact result plus
+one chunk, however large pipeline_sensor_data.csv grows.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import CSV_COLS
+
+# Measurements as float32, on/off flags and detection label as int8.
+# leak_location is int16: PipelineMapper hands out one label per pipeline.
+FLAG_COLS = ["pump_on", "comp_on", "s1", "s2", "s3", "solenoid_active"]
+DTYPES = {c: np.float32 for c in CSV_COLS}
+DTYPES.update({c: np.int8 for c in FLAG_COLS})
+DTYPES["leak_detected"] = np.int8
+DTYPES["leak_location"] = np.int16
+
+# validated_alerts.csv: each human label is one row with a priority weight
+WEIGHT_COL = "weight"
+VALIDATED_DTYPES = dict(DTYPES, **{WEIGHT_COL: np.float32})
+
+CHUNK_ROWS = 100_000
+
+
+def count_rows(path, block_size=1 << 20):
+    """Data rows in a CSV with a header line, without parsing it."""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n": lines += 1  # final line without newline
+    return max(0, lines - 1)
+
+
+def empty_frame(dtypes=DTYPES):
+    return pd.DataFrame({c: np.zeros(0, dtype=t) for c, t in dtypes.items()})
+
+
+def load_csv(path, chunk_rows=CHUNK_ROWS, dtypes=DTYPES):
+    """
+    Load one training CSV into a DataFrame with compact dtypes.
+    Unparseable values become 0, missing columns are filled with 0, and rows
+    appended while the file is being read are left for the next run.
+    A file that cannot be read or parsed raises; it is not treated as empty.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return empty_frame(dtypes)
+
+    try:
+        capacity = count_rows(path)
+        columns = {c: np.zeros(capacity, dtype=t) for c, t in dtypes.items()}
+        if capacity == 0:
+            return pd.DataFrame(columns, copy=False)
+
+        pos = 0
+        reader = pd.read_csv(path, chunksize=chunk_rows, nrows=capacity,
+                             usecols=lambda c: c in dtypes, on_bad_lines="skip")
+        for chunk in reader:
+            n = min(len(chunk), capacity - pos)
+            for col in chunk.columns:
+                values = chunk[col]
+                if not pd.api.types.is_numeric_dtype(values):
+                    values = pd.to_numeric(values, errors="coerce")
+                columns[col][pos:pos + n] = values.to_numpy(dtype=np.float64, na_value=0)[:n]
+            pos += n
+
+        # Blank or skipped lines leave unused capacity at the end
+        return pd.DataFrame({c: a[:pos] for c, a in columns.items()}, copy=False)
+    except pd.errors.EmptyDataError:
+        # Nothing but blank lines: no header, no rows
+        return empty_frame(dtypes)
+
+
+def load_validated(path, chunk_rows=CHUNK_ROWS):
+    """
+    Load validated_alerts.csv with identical rows collapsed into one, whose
+    sample_weight is the sum of their weights. Rows without a weight (files
+    from before the column, where a label was written 10 times) count 1 each.
+    """
+    df = load_csv(path, chunk_rows, VALIDATED_DTYPES)
+    weights = df.pop(WEIGHT_COL).to_numpy(dtype=np.float64)
+    df["sample_weight"] = np.where(weights > 0, weights, 1.0)
+    if df.empty: return df
+    return df.groupby(CSV_COLS, sort=False, as_index=False)["sample_weight"].sum()
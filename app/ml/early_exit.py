@@ -0,0 +1,84 @@
+"""
+Early-exit forest scoring.
+
+A forest's decision is the argmax of its trees' summed leaf probabilities.
+Trees are evaluated in blocks; after each block, a row whose leading class
+is ahead of the runner-up by more than the number of trees still to come
+(each tree adds at most 1 to any class) has a decided outcome and stops.
+With delta > 0 a row may also stop once a Hoeffding-Serfling bound says
+the remaining trees flip the decision with probability below delta (trees
+of a bagged forest are exchangeable), which exits much sooner on clear-cut
+readings.
+
+The returned probabilities are the mean over the trees each row used, so
+class and confidence come from the same pass; trees_used says how many.
+Works with sklearn forests and CompactForest artifacts alike.
+"""
+import numpy as np
+
+import forest_eval
+from forest_artifact import CompactForest
+
+# Trees per block: smaller exits sooner, larger has less per-block overhead
+BLOCK_TREES = 10
+
+
+def _block_sums(clf, X, start, stop):
+    """Summed class probabilities of trees [start, stop) for the rows of X."""
+    if isinstance(clf, CompactForest):
+        leaves = forest_eval.apply(clf, X, clf.roots[start:stop])
+        return clf.value[leaves].sum(axis=1, dtype=np.float64)
+    out = np.zeros((len(X), len(clf.classes_)))
+    for est in clf.estimators_[start:stop]:
+        out += est.predict_proba(X, check_input=False)
+    return out
+
+
+def n_trees(clf):
+    return clf.n_trees if isinstance(clf, CompactForest) else len(clf.estimators_)
+
+
+def serfling_bound(done, total, delta):
+    """Deviation of the mean of `done` of `total` trees' margins (in [-1, 1]) from the all-tree mean at confidence 1-delta."""
+    return 2.0 * np.sqrt((1.0 - (done - 1) / total) * np.log(1.0 / delta) / (2.0 * done))
+
+
+def first_exit(total, delta):
+    """Fewest trees after which any row could stop (the margin per tree is at most 1)."""
+    stop = total // 2 + 1
+    if delta > 0:
+        t = np.arange(1, stop)
+        possible = np.flatnonzero(serfling_bound(t, total, delta) < 1.0)
+        if len(possible): stop = int(t[possible[0]])
+    return stop
+
+
+def predict_proba_early(clf, X, delta=0.0, block=BLOCK_TREES):
+    """
+    (proba, trees_used): per-row mean class probabilities over the trees used,
+    and how many trees each row used. delta=0 gives exactly the full forest's decision.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if X.ndim == 1: X = X.reshape(1, -1)
+    total = n_trees(clf)
+    sums = np.zeros((len(X), len(clf.classes_)))
+    used = np.zeros(len(X), dtype=np.int64)
+    active = np.arange(len(X))
+
+    # No row can stop before first_exit(), so those trees go in one block
+    first = first_exit(total, delta) if len(clf.classes_) > 1 else total
+    stops = sorted({min(first, total), total} | set(range(first + block, total, block)))
+    start = 0
+    for stop in stops:
+        sums[active] += _block_sums(clf, X[active], start, stop)
+        used[active] = start = stop
+        if stop == total: break
+
+        top2 = np.sort(sums[active], axis=1)[:, -2:]
+        margin = top2[:, 1] - top2[:, 0]
+        done = margin > total - stop
+        if delta > 0: done |= margin / stop > serfling_bound(stop, total, delta)
+        active = active[~done]
+        if len(active) == 0: break
+
+    return sums / used[:, None], used
@@ -0,0 +1,186 @@
+"""
+Shared feature engineering for training and inference.
+
+Everything that turns raw readings into model input lives here, so
+train_with_ga.py, train_model.py and predict_leak.py cannot drift apart.
+All transforms work on NumPy arrays: one row or a million rows take the
+same code path.
+
+Layouts may also carry sliding-window columns (temporal.py), e.g.
+p_main_mean_8. Those depend on the readings before the current one: a frame
+is treated as one time-ordered history (optionally split by `groups`), and
+the prediction server passes its TemporalState to continue each device's
+history one reading at a time.
+"""
+import os
+from functools import lru_cache
+
+import joblib
+import numpy as np
+
+from temporal import DEFAULT_DEVICE, WINDOW_SOURCES, parse_window_col, rolling_stats
+
+# Raw reading fields, in the order they appear in the training CSVs
+RAW_COLS = [
+    "f_main", "f_1", "f_2", "f_3",
+    "p_main", "p_dma1", "p_dma2", "p_dma3",
+    "pump_on", "comp_on",
+    "s1", "s2", "s3",
+    "solenoid_active"
+]
+
+LABEL_COLS = ["leak_detected", "leak_location"]
+
+# Column layout of pipeline_sensor_data.csv / historical / validated CSVs
+CSV_COLS = RAW_COLS + LABEL_COLS
+
+# Derived columns: name -> (minuend, subtrahend)
+GRADIENTS = {
+    "grad_main_dma1": ("p_main", "p_dma1"),  # Pressure drop Main -> 1
+    "grad_dma1_dma2": ("p_dma1", "p_dma2"),  # Pressure drop 1 -> 2
+    "grad_dma2_dma3": ("p_dma2", "p_dma3"),  # Pressure drop 2 -> 3
+}
+
+# Current model input (17 Features)
+FEATURE_COLS = RAW_COLS + list(GRADIENTS)
+
+_RAW_INDEX = {c: i for i, c in enumerate(RAW_COLS)}
+_WINDOW_IN = np.array([_RAW_INDEX[c] for c in WINDOW_SOURCES], dtype=np.intp)
+_STAT_INDEX = {"mean": 0, "var": 1, "slope": 2}
+
+
+class FeaturePipeline:
+    """
+    Maps a raw (n, len(RAW_COLS)) matrix to the model's feature columns.
+
+    The column plan is resolved once at construction; transform() is then
+    two vectorized gathers regardless of how many rows come in.
+    """
+
+    def __init__(self, feature_cols):
+        self.feature_cols = list(feature_cols)
+
+        copy_out, copy_in = [], []
+        grad_out, grad_a, grad_b = [], [], []
+        # window -> (output positions, stat index, source index into WINDOW_SOURCES)
+        temporal = {}
+        for pos, col in enumerate(self.feature_cols):
+            if col in _RAW_INDEX:
+                copy_out.append(pos)
+                copy_in.append(_RAW_INDEX[col])
+            elif col in GRADIENTS:
+                a, b = GRADIENTS[col]
+                grad_out.append(pos)
+                grad_a.append(_RAW_INDEX[a])
+                grad_b.append(_RAW_INDEX[b])
+            elif parse_window_col(col):
+                source, stat, window = parse_window_col(col)
+                plan = temporal.setdefault(window, ([], [], []))
+                plan[0].append(pos)
+                plan[1].append(_STAT_INDEX[stat])
+                plan[2].append(WINDOW_SOURCES.index(source))
+            else:
+                raise ValueError(f"Unknown feature column: {col}")
+
+        self._copy_out = np.array(copy_out, dtype=np.intp)
+        self._copy_in = np.array(copy_in, dtype=np.intp)
+        self._grad_out = np.array(grad_out, dtype=np.intp)
+        self._grad_a = np.array(grad_a, dtype=np.intp)
+        self._grad_b = np.array(grad_b, dtype=np.intp)
+        self._temporal = {w: tuple(np.array(a, dtype=np.intp) for a in plan) for w, plan in sorted(temporal.items())}
+
+    @property
+    def n_features(self):
+        return len(self.feature_cols)
+
+    @property
+    def windows(self):
+        """Window sizes this layout needs (empty for snapshot-only layouts)."""
+        return list(self._temporal)
+
+    def transform(self, raw, dtype=np.float64, groups=None, state=None, devices=None, stamps=None):
+        """
+        Build the feature matrix from a raw matrix in RAW_COLS order.
+        Window columns come from `state` (per-device streaming, `devices` gives
+        each row's device) if given, otherwise from the rows themselves.
+        A streamed row is identified by its values plus its `stamps` entry, so
+        scoring the same reading again does not advance the device's history.
+        """
+        raw = np.asarray(raw, dtype=dtype)
+        if raw.ndim == 1: raw = raw.reshape(1, -1)
+
+        X = np.empty((raw.shape[0], self.n_features), dtype=dtype)
+        X[:, self._copy_out] = raw[:, self._copy_in]
+        X[:, self._grad_out] = raw[:, self._grad_a] - raw[:, self._grad_b]
+        if self._temporal:
+            if state is not None: self._stream_windows(raw, X, state, devices, stamps)
+            else: self._rolling_windows(raw, X, groups)
+        return X
+
+    def _rolling_windows(self, raw, X, groups):
+        values = raw[:, _WINDOW_IN]
+        for window, (out, stat, src) in self._temporal.items():
+            stats = np.stack(rolling_stats(values, window, groups))  # (3, n, k)
+            X[:, out] = stats[stat, :, src].T
+
+    def _stream_windows(self, raw, X, state, devices, stamps):
+        values = raw[:, _WINDOW_IN]
+        for i in range(raw.shape[0]):
+            device = devices[i] if devices is not None else DEFAULT_DEVICE
+            key = (stamps[i] if stamps is not None else None, raw[i].astype(np.float64).tobytes())
+            for window, stats in state.push(device, values[i], self.windows, key).items():
+                out, stat, src = self._temporal[window]
+                X[i, out] = np.stack(stats)[stat, src]
+
+    def transform_records(self, records, dtype=np.float64, state=None):
+        """Build the feature matrix from a list of reading dicts (device from their "sensorId")."""
+        devices = stamps = None
+        if state is not None:
+            devices = [r.get("sensorId", DEFAULT_DEVICE) for r in records]
+            stamps = [r.get("timestamp") for r in records]
+        return self.transform(records_to_raw(records, dtype), dtype, state=state, devices=devices, stamps=stamps)
+
+    def transform_frame(self, df, dtype=np.float64, groups=None):
+        """Build the feature matrix from a DataFrame holding (some of) RAW_COLS."""
+        return self.transform(frame_to_raw(df, dtype), dtype, groups=groups)
+
+
+def records_to_raw(records, dtype=np.float64):
+    """Reading dicts -> raw (n, len(RAW_COLS)) matrix; missing fields are 0."""
+    return np.array([[r.get(c, 0) for c in RAW_COLS] for r in records], dtype=dtype).reshape(-1, len(RAW_COLS))
+
+
+def frame_to_raw(df, dtype=np.float64):
+    """DataFrame -> raw (n, len(RAW_COLS)) matrix; missing columns are 0."""
+    raw = np.zeros((len(df), len(RAW_COLS)), dtype=dtype)
+    for i, col in enumerate(RAW_COLS):
+        if col in df.columns:
+            raw[:, i] = df[col].to_numpy(dtype=dtype, na_value=0)
+    return raw
+
+
+@lru_cache(maxsize=32)
+def get_pipeline(feature_cols=tuple(FEATURE_COLS)):
+    """Compiled pipeline for a column list, built once per distinct layout."""
+    return FeaturePipeline(feature_cols)
+
+
+def load_feature_cols(path):
+    """Read the feature_cols.joblib saved next to a model; default layout if absent."""
+    if path and os.path.exists(path):
+        try:
+            return [str(c) for c in joblib.load(path)]
+        except Exception:
+            pass
+    return list(FEATURE_COLS)
+
+
+@lru_cache(maxsize=32)
+def _pipeline_from_file(path, mtime_ns):
+    return get_pipeline(tuple(load_feature_cols(path)))
+
+
+def load_pipeline(path=None):
+    """Pipeline driven by a model's feature_cols.joblib (re-read only when the file changes)."""
+    mtime_ns = os.stat(path).st_mtime_ns if path and os.path.exists(path) else None
+    return _pipeline_from_file(path, mtime_ns)
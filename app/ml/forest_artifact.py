@@ -0,0 +1,181 @@
+"""
+Compact, memory-mappable file format for the leak forests.
+
+A .forest file holds every tree of a RandomForestClassifier as flat arrays
+(all trees concatenated, child indices global):
+
+    b"AQFOREST" | uint32 header length | JSON header | 64-byte aligned arrays
+
+load_forest() maps the file read-only and returns zero-copy views, so
+several prediction processes loading the same file share one copy in the
+page cache.
+
+Usage:
+    python forest_artifact.py export rf_leak_detect_v1_2.joblib [out.forest]
+"""
+import os
+import sys
+import json
+import struct
+
+import numpy as np
+
+import forest_eval
+
+MAGIC = b"AQFOREST"
+FORMAT_VERSION = 1
+ALIGN = 64
+LEAF = -1
+
+
+class CompactForest:
+    """Flattened forest: node arrays shared by all trees, `roots` gives each tree's first node."""
+
+    def __init__(self, header, arrays, path=None):
+        self.path = path
+        self.n_features = int(header["n_features"])
+        self.n_trees = int(header["n_trees"])
+        self.max_depth = int(header["max_depth"])
+        self.classes_ = np.array(header["classes"])
+        self.n_classes = len(self.classes_)
+
+        self.roots = arrays["roots"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+
+    @property
+    def n_nodes(self):
+        return len(self.left)
+
+    # sklearn-compatible surface, so predict_leak.py can use either engine
+    @property
+    def n_features_in_(self):
+        return self.n_features
+
+    def predict_proba(self, X):
+        return forest_eval.predict_proba(self, X)
+
+    def predict(self, X):
+        return forest_eval.predict(self, X)
+
+
+def forest_arrays(clf):
+    """Flatten a fitted RandomForestClassifier into CompactForest arrays."""
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for est in clf.estimators_:
+        t = est.tree_
+        is_leaf = t.children_left == LEAF
+
+        roots.append(offset)
+        left.append(np.where(is_leaf, LEAF, t.children_left + offset))
+        right.append(np.where(is_leaf, LEAF, t.children_right + offset))
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(t.threshold)
+
+        # Per-leaf class probabilities (older sklearn stores counts, newer fractions)
+        v = t.value[:, 0, :]
+        totals = v.sum(axis=1, keepdims=True)
+        value.append(np.divide(v, totals, out=np.zeros_like(v), where=totals > 0))
+
+        offset += t.node_count
+        max_depth = max(max_depth, int(t.max_depth))
+
+    arrays = {
+        "roots": np.array(roots, dtype=np.int32),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int16),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float32),
+    }
+    header = {
+        "format": FORMAT_VERSION,
+        "n_features": int(clf.n_features_in_),
+        "n_trees": len(clf.estimators_),
+        "max_depth": max_depth,
+        "classes": [c.item() if hasattr(c, "item") else c for c in clf.classes_],
+    }
+    return header, arrays
+
+
+def write_forest(header, arrays, path):
+    """Write header + arrays to `path` (via a temp file, so readers never see a partial file)."""
+    layout = {}
+    pos = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arrays[name] = arr
+        layout[name] = {"dtype": arr.dtype.newbyteorder("<").str, "shape": list(arr.shape), "offset": pos}
+        pos += -(-arr.nbytes // ALIGN) * ALIGN
+
+    header = dict(header, arrays=layout)
+    head = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(head)) // ALIGN) * ALIGN
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(head)))
+        f.write(head)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(arr.astype(layout[name]["dtype"], copy=False).tobytes())
+        f.truncate(data_start + pos)
+    os.replace(tmp_path, path)
+    return path
+
+
+def export_forest(clf, path):
+    """Export a fitted forest to the compact .forest format."""
+    header, arrays = forest_arrays(clf)
+    return write_forest(header, arrays, path)
+
+
+def load_forest(path, mmap=True):
+    """Load a .forest file; with mmap=True the arrays are read-only views of the mapped file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a forest artifact: {path}")
+        (head_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(head_len))
+    if header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported forest format {header.get('format')} in {path}")
+
+    data_start = -(-(len(MAGIC) + 4 + head_len) // ALIGN) * ALIGN
+    buf = np.memmap(path, dtype=np.uint8, mode="r") if mmap else np.fromfile(path, dtype=np.uint8)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arr = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start + spec["offset"])
+        arrays[name] = arr.reshape(spec["shape"])
+    return CompactForest(header, arrays, path)
+
+
+def artifact_path(joblib_path):
+    """rf_leak_detect_v1_2.joblib -> rf_leak_detect_v1_2.forest"""
+    return os.path.splitext(joblib_path)[0] + ".forest"
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != "export":
+        print("Usage: python forest_artifact.py export <model.joblib> [out.forest]")
+        sys.exit(1)
+
+    import joblib
+    src = sys.argv[2]
+    dst = sys.argv[3] if len(sys.argv) > 3 else artifact_path(src)
+    export_forest(joblib.load(src), dst)
+    print(json.dumps({"status": "success", "source": src, "artifact": dst,
+                      "bytes_joblib": os.path.getsize(src), "bytes_forest": os.path.getsize(dst)}))
+
+
+if __name__ == "__main__":
+    main()
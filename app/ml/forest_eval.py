@@ -0,0 +1,49 @@
+"""
+Pure-NumPy scoring of CompactForest artifacts (see forest_artifact.py).
+
+All trees of a forest are walked together: every row keeps one node index
+per tree, and each step advances all (row, tree) pairs at once. Leaves point
+at themselves, so the loop simply runs max_depth steps with no per-tree
+Python work. Results match sklearn's predict_proba within float32 rounding
+of the stored leaf probabilities.
+"""
+import numpy as np
+
+LEAF = -1
+
+# Bound the (rows x trees x classes) working set per chunk
+CHUNK_CELLS = 1 << 20
+
+
+def apply(forest, X, roots=None):
+    """Leaf index reached in every tree (or only the trees starting at `roots`), shape (n_rows, n_trees)."""
+    # sklearn compares float32 inputs against float64 thresholds; do the same
+    X = np.asarray(X, dtype=np.float32)
+    if X.ndim == 1: X = X.reshape(1, -1)
+
+    node = np.tile((forest.roots if roots is None else roots).astype(np.intp), (X.shape[0], 1))
+    rows = np.arange(X.shape[0])[:, None]
+
+    for _ in range(forest.max_depth):
+        go_left = X[rows, forest.feature[node]] <= forest.threshold[node]
+        nxt = np.where(go_left, forest.left[node], forest.right[node])
+        node = np.where(nxt == LEAF, node, nxt)
+    return node
+
+
+def predict_proba(forest, X):
+    """Mean leaf class probabilities over all trees, shape (n_rows, n_classes)."""
+    X = np.asarray(X, dtype=np.float32)
+    if X.ndim == 1: X = X.reshape(1, -1)
+
+    out = np.empty((X.shape[0], forest.n_classes), dtype=np.float64)
+    step = max(1, CHUNK_CELLS // (forest.n_trees * forest.n_classes))
+    for start in range(0, X.shape[0], step):
+        leaves = apply(forest, X[start:start + step])
+        out[start:start + step] = forest.value[leaves].sum(axis=1, dtype=np.float64) / forest.n_trees
+    return out
+
+
+def predict(forest, X):
+    """Class labels, same tie-breaking as sklearn (first class wins)."""
+    return forest.classes_[predict_proba(forest, X).argmax(axis=1)]
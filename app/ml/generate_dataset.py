@@ -0,0 +1,141 @@
+"""
+Vectorized synthetic training data.
+
+Produces the same scenarios as generate_system_state() in simulate_device.py
+(idle 10%, usage at s1/s2/s3 40%, leaks at S001/S002/S003 50%) with the same
+value ranges, but whole columns at a time with NumPy instead of one
+random.uniform() call per value. Output goes straight into the training CSV
+layout (CSV_COLS) or into the columnar training store.
+
+Rows are generated in fixed-size chunks from one seeded generator, so the
+same --rows/--seed always give the same data.
+
+Usage:
+    python generate_dataset.py --rows 1000000 [--seed 42] [--out synthetic_sensor_data.csv]
+    python generate_dataset.py --rows 1000000 --store pipeline [--segment synthetic]
+"""
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from features import CSV_COLS
+from dataset import DTYPES
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STORAGE_DIR = os.environ.get("ML_STORAGE_DIR") or os.path.join(BASE_DIR, "storage", "app", "ml_models")
+DEFAULT_OUT = os.path.join(STORAGE_DIR, "synthetic_sensor_data.csv")
+
+CHUNK_ROWS = 1_000_000
+
+# Scenario mix (cumulative thresholds, as in generate_system_state)
+P_USAGE = 0.40
+P_LEAK = 0.90  # 0.40 - 0.90 leak, rest idle
+
+# Per-scenario overrides: column -> (low, high)
+USAGE = {
+    1: {"f_main": (90, 110), "p_main": (45, 48)},
+    2: {"f_main": (90, 110), "f_1": (85, 105), "p_dma1": (42, 46)},
+    3: {"f_main": (90, 110), "f_1": (85, 105), "f_2": (80, 100), "p_dma2": (40, 44)},
+}
+LEAKS = {
+    1: {"f_main": (140, 180), "p_main": (15, 25)},                                           # S001 main pipe
+    2: {"f_main": (140, 180), "f_1": (130, 160), "p_dma1": (10, 20)},                        # S002 DMA 1
+    3: {"f_main": (140, 180), "f_1": (130, 160), "f_2": (120, 150), "p_dma2": (5, 15)},      # S003 DMA 2
+}
+IDLE = {"f_main": (0, 5), "p_main": (50, 55), "f_1": (0, 5), "p_dma1": (48, 52), "f_2": (0, 5), "p_dma2": (46, 50)}
+
+
+def generate(n, rng):
+    """DataFrame of `n` labelled rows in CSV_COLS order with dataset.DTYPES."""
+    cols = {c: np.zeros(n, dtype=DTYPES[c]) for c in CSV_COLS}
+
+    def fill(col, idx, low, high):
+        cols[col][idx] = rng.uniform(low, high, len(idx))
+
+    # Base state: idle system, pump on
+    cols["pump_on"][:] = 1
+    for col, (low, high) in IDLE.items(): cols[col][:] = rng.uniform(low, high, n)
+
+    chance = rng.random(n)
+    choice = rng.integers(1, 4, n)  # user s1..s3 or leak location 1..3
+
+    # SCENARIO A: Normal Usage
+    usage = chance < P_USAGE
+    cols["solenoid_active"][usage] = 1
+    for user, ranges in USAGE.items():
+        idx = np.flatnonzero(usage & (choice == user))
+        cols[f"s{user}"][idx] = 1
+        for col, (low, high) in ranges.items(): fill(col, idx, low, high)
+
+    # SCENARIO B: Leak (valves closed, truth labels set)
+    leak = ~usage & (chance < P_LEAK)
+    cols["leak_detected"][leak] = 1
+    for loc, ranges in LEAKS.items():
+        idx = np.flatnonzero(leak & (choice == loc))
+        cols["leak_location"][idx] = loc
+        for col, (low, high) in ranges.items(): fill(col, idx, low, high)
+
+    return pd.DataFrame(cols, copy=False)
+
+
+def iter_chunks(rows, seed, chunk_rows=CHUNK_ROWS):
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_rows):
+        yield generate(min(chunk_rows, rows - start), rng)
+
+
+def write_csv(rows, path, seed):
+    """Write `rows` rows to `path` (via a temp file) and return label counts."""
+    counts = np.zeros(4, dtype=np.int64)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        for i, df in enumerate(iter_chunks(rows, seed)):
+            df.to_csv(f, header=(i == 0), index=False, float_format="%.4f")
+            counts += np.bincount(df["leak_location"], minlength=4)[:4]
+    os.replace(tmp, path)
+    return counts
+
+
+def write_store(rows, dataset, seed, segment=None):
+    from training_store import TrainingStore
+    store = TrainingStore(dataset)
+    counts = np.zeros(4, dtype=np.int64)
+    for df in iter_chunks(rows, seed):
+        store.append_frame(df, segment)
+        counts += np.bincount(df["leak_location"], minlength=4)[:4]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate labelled synthetic sensor data.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=DEFAULT_OUT, help="Training CSV to write")
+    parser.add_argument("--store", help="Append to this training-store dataset instead of writing a CSV")
+    parser.add_argument("--segment", help="Store segment name (default: today's)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.store:
+        counts = write_store(args.rows, args.store, args.seed, args.segment)
+        target = {"store": args.store, "segment": args.segment}
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        counts = write_csv(args.rows, args.out, args.seed)
+        target = {"path": args.out}
+
+    print(json.dumps(dict(target, **{
+        "status": "success",
+        "rows": args.rows,
+        "seed": args.seed,
+        "seconds": round(time.perf_counter() - start, 2),
+        "leak_locations": {str(i): int(c) for i, c in enumerate(counts)},
+    })))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Incremental retraining helpers.
+
+Instead of refitting from scratch, the _live forest is extended with
+`warm_start` trees fitted on the rows that arrived since the last run, and
+the oldest trees are dropped once the forest exceeds its size budget.
+train_state.json remembers the training-store watermark of the last run.
+"""
+import os
+import json
+
+import numpy as np
+
+STATE_FILE = "train_state.json"
+
+
+def load_state(path):
+    try:
+        with open(path) as f: return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f: json.dump(state, f, indent=4)
+    os.replace(tmp, path)
+
+
+def can_extend(clf, y):
+    """
+    warm_start re-derives classes_ from the new y; the old trees only stay
+    valid if the new data has exactly the same classes.
+    """
+    if not hasattr(clf, "estimators_"): return False
+    return set(np.unique(np.asarray(y)).tolist()) == set(np.asarray(clf.classes_).tolist())
+
+
+def extend_forest(clf, X, y, add_trees, max_trees, sample_weight=None):
+    """Add `add_trees` trees fitted on (X, y), then keep only the newest `max_trees`."""
+    clf.set_params(warm_start=True, n_estimators=len(clf.estimators_) + add_trees)
+    clf.fit(X, y, sample_weight=sample_weight)
+
+    if len(clf.estimators_) > max_trees:
+        clf.estimators_ = clf.estimators_[-max_trees:]
+    clf.set_params(n_estimators=len(clf.estimators_), warm_start=False)
+    return clf
+
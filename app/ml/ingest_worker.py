@@ -0,0 +1,274 @@
+"""
+Micro-batching ingest in front of the leak predictor.
+
+Readings arriving one at a time (HTTP requests, socket lines) are queued and
+scored together: a batch is flushed when it reaches `max_batch` readings or
+when its oldest reading has waited `max_delay_ms`, whichever comes first.
+Each flush is one vectorized predict_batch() call per model version, plus
+(optionally) one bulk append of the labelled rows to the training store.
+A single flusher thread handles batches in arrival order, so readings from
+the same device are scored, and update their window history, in order.
+
+predict_server.py uses MicroBatcher for /predict (--batch-max). This script
+is a standalone worker for device streams: newline-delimited JSON readings
+over a Unix socket (or TCP), answered line by line in the same order.
+
+Usage:
+    python ingest_worker.py --detect rf_leak_detect_live.joblib --locate rf_leak_locate_live.joblib \\
+        --features feature_cols.joblib [--socket /tmp/aquaguard_ingest.sock | --port 8766]
+        [--max-batch 256] [--max-delay-ms 5] [--store pipeline]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from features import CSV_COLS
+from predict_leak import predict_batch, error_result
+from model_registry import ModelRegistry
+from temporal import TemporalState
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_DELAY_MS = 5.0
+
+
+class MicroBatcher:
+    """Collects submitted items and hands them to `handler(items) -> results` in batches."""
+
+    def __init__(self, handler, max_batch=DEFAULT_MAX_BATCH, max_delay_ms=DEFAULT_MAX_DELAY_MS):
+        self.handler = handler
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max(0.0, float(max_delay_ms)) / 1000.0
+        self._queue = deque()  # (item, future, enqueued_at)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        with self._cond:
+            if self._closed: raise RuntimeError("Batcher is closed")
+            self._queue.append((item, future, time.monotonic()))
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch: self._cond.notify()
+        return future
+
+    def close(self):
+        """Flush what is queued, then stop the flusher."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def stats(self):
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch, "max_delay_ms": self.max_delay * 1000}
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed: self._cond.wait()
+            if not self._queue: return None
+            # Wait for a full batch, but never past the oldest reading's deadline
+            deadline = self._queue[0][2] + self.max_delay
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None: return
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.handler(items)
+                for (_, future, _), result in zip(batch, results): future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch: future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def stored_rows(readings, results):
+    """Training-store rows for scored readings; labels as SensorDataController sets them (simulated truth first)."""
+    rows = np.zeros((len(readings), len(CSV_COLS)), dtype=np.float64)
+    for n, (reading, result) in enumerate(zip(readings, results)):
+        row = dict(reading)
+        leak, location = reading.get("simulated_leak"), reading.get("simulated_location")
+        row["leak_detected"] = result["leak_detected"] if leak is None else leak
+        row["leak_location"] = result.get("leak_location", 0) if location is None else location
+        rows[n] = [_number(row.get(c)) for c in CSV_COLS]
+    return rows
+
+
+class ScoringHandler:
+    """
+    Batch handler: items are (ModelEntry, reading, early_exit) tuples.
+    Consecutive items for the same model and early-exit setting share one
+    predict_batch() call; if that call fails, its readings are retried one by
+    one so a single bad reading only fails itself.
+    """
+
+    def __init__(self, state=None, store=None):
+        self.state = state if state is not None else TemporalState()
+        self.store = store  # training_store.TrainingStore or None
+
+    def _score(self, entry, readings, early_exit):
+        try:
+            return predict_batch(readings, entry.clf_detect, entry.clf_locate, entry.pipeline, self.state, early_exit)
+        except Exception:
+            if len(readings) == 1: raise
+        return [self._score_one(entry, r, early_exit) for r in readings]
+
+    def _score_one(self, entry, reading, early_exit):
+        try:
+            return self._score(entry, [reading], early_exit)[0]
+        except Exception as e:
+            return error_result(e)
+
+    def __call__(self, items):
+        results = []
+        start = 0
+        while start < len(items):
+            entry, _, early_exit = items[start]
+            stop = start
+            while stop < len(items) and items[stop][0] is entry and items[stop][2] == early_exit: stop += 1
+            readings = [reading for _, reading, _ in items[start:stop]]
+            if len(readings) == 1: results.append(self._score_one(entry, readings[0], early_exit))
+            else: results.extend(self._score(entry, readings, early_exit))
+            start = stop
+
+        if self.store is not None:
+            scored = [n for n, r in enumerate(results) if "error" not in r]
+            if scored:
+                self.store.append(stored_rows([items[n][1] for n in scored], [results[n] for n in scored]))
+                for n in scored: results[n] = dict(results[n], stored=True)
+        return results
+
+
+# ====================================================
+# SOCKET SOURCE
+# ====================================================
+class LineHandler(socketserver.StreamRequestHandler):
+    """One JSON reading per line in, one JSON result per line out (same order)."""
+
+    def handle(self):
+        server = self.server
+        pending = deque()
+        done = threading.Event()
+        ready = threading.Condition()
+
+        def writer():
+            while True:
+                with ready:
+                    while not pending and not done.is_set(): ready.wait()
+                    if not pending: return
+                    future = pending.popleft()
+                try:
+                    out = future.result() if isinstance(future, Future) else future
+                except Exception as e:
+                    out = error_result(e)
+                self.wfile.write((json.dumps(out) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        try:
+            for line in self.rfile:
+                line = line.strip()
+                if not line: continue
+                try:
+                    reading = json.loads(line)
+                    if not isinstance(reading, dict): raise ValueError("Reading must be a JSON object")
+                    entry = server.registry.active()
+                    if entry is None: raise ValueError("No model loaded")
+                    item = server.batcher.submit((entry, reading, server.early_exit))
+                except Exception as e:
+                    item = error_result(e)
+                with ready:
+                    pending.append(item)
+                    ready.notify()
+        finally:
+            with ready:
+                done.set()
+                ready.notify()
+            thread.join()
+
+
+class ThreadingUnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching ingest worker for the leak predictor.")
+    parser.add_argument("--detect", required=True)
+    parser.add_argument("--locate", required=True)
+    parser.add_argument("--features")
+    parser.add_argument("--version", help="Version tag (default: from --detect)")
+    parser.add_argument("--socket", help="Unix socket to listen on")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--max-delay-ms", type=float, default=DEFAULT_MAX_DELAY_MS)
+    parser.add_argument("--early-exit", type=float, metavar="DELTA")
+    parser.add_argument("--engine", choices=["auto", "numpy", "sklearn"], default="auto")
+    parser.add_argument("--store", help="Also append scored readings to this training-store dataset (one write per batch)")
+    args = parser.parse_args()
+
+    store = None
+    if args.store:
+        from training_store import TrainingStore
+        store = TrainingStore(args.store)
+
+    registry = ModelRegistry(capacity=1, engine=args.engine)
+    registry.activate(args.version, args.detect, args.locate, args.features)
+    batcher = MicroBatcher(ScoringHandler(store=store), args.max_batch, args.max_delay_ms)
+
+    if args.socket:
+        if os.path.exists(args.socket): os.unlink(args.socket)
+        server = ThreadingUnixStreamServer(args.socket, LineHandler)
+        where = f"unix:{args.socket}"
+    else:
+        server = ThreadingTCPServer((args.host, args.port), LineHandler)
+        where = f"tcp://{args.host}:{args.port}"
+    server.registry, server.batcher, server.early_exit = registry, batcher, args.early_exit
+
+    print(f"📥 Ingest worker listening on {where}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        print(json.dumps(batcher.stats()), file=sys.stderr)
+        if args.socket and os.path.exists(args.socket): os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Progress and timing instrumentation for training runs.
+
+    tracker = TrainingTracker(progress_path, log=raw_log)
+    with tracker.stage("load", 5, "Loading Data..."):
+        ...
+    result["timings"] = tracker.summary()
+
+Each stage records wall time and process memory (current RSS when it ends,
+its change over the stage, and the process peak so far). Progress is written
+with write_json_atomic(), so the Laravel poller only ever sees a complete
+file.
+"""
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+MIB = 1024 * 1024
+
+
+def replace_file(src, dst, attempts=20):
+    """os.replace(), retried briefly: Windows refuses to replace a file a reader has open."""
+    for attempt in range(attempts):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == attempts - 1: raise
+            time.sleep(0.05)
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file next to `path`, then rename it over `path`."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    replace_file(tmp, path)
+
+
+def current_rss_mb():
+    """Resident set size of this process in MiB (None if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MIB
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / MIB
+    except Exception:
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far in MiB (None if unknown)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (MIB if sys.platform == "darwin" else 1024)  # bytes on macOS, KiB elsewhere
+    except Exception:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / MIB
+        except Exception:
+            return None
+
+
+def _mb(value):
+    return round(value, 1) if value is not None else None
+
+
+class TrainingTracker:
+    def __init__(self, progress_path, log=None):
+        self.progress_path = progress_path
+        self.log = log or (lambda msg: None)
+        self.started = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+        self._current = None
+        self._failed_stage = None
+
+    # ----------------------------------------------------------
+    # Progress file
+    # ----------------------------------------------------------
+    def progress(self, value, message, status="training"):
+        self.log(f"Progress {value}%: {message}")
+        write_json_atomic(self.progress_path, {
+            "progress": value,
+            "status": status,
+            "message": message,
+            "stage": self._current,
+            "elapsed_s": round(time.perf_counter() - self.started, 2),
+        })
+
+    def fail(self, message):
+        self.log(f"CRITICAL FAILURE: {message}")
+        try:
+            write_json_atomic(self.progress_path, {"progress": 0, "status": "error", "message": str(message),
+                                                   "stage": self._current or self._failed_stage,
+                                                   "timings": self.summary()})
+        except Exception:
+            pass
+
+    # ----------------------------------------------------------
+    # Timers
+    # ----------------------------------------------------------
+    def _record(self, name, seconds, rss_before):
+        rss = current_rss_mb()
+        entry = {
+            "stage": name,
+            "seconds": round(seconds, 4),
+            "rss_mb": _mb(rss),
+            "rss_delta_mb": _mb(rss - rss_before) if rss is not None and rss_before is not None else None,
+            "peak_rss_mb": _mb(peak_rss_mb()),
+        }
+        with self._lock: self.stages.append(entry)
+        self.log(f"Stage {name}: {entry['seconds']:.3f}s, rss {entry['rss_mb']} MB")
+        return entry
+
+    @contextmanager
+    def stage(self, name, progress=None, message=None):
+        """Time a block; with `progress` the progress file is updated as the stage starts."""
+        previous, self._current = self._current, name
+        if progress is not None: self.progress(progress, message or name)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self._failed_stage = self._failed_stage or name
+            raise
+        finally:
+            self._record(name, time.perf_counter() - start, rss_before)
+            self._current = previous
+
+    def timed(self, name, fn):
+        """Wrap a callable so its run is recorded as stage `name` (safe from worker threads)."""
+        def run():
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                self._record(name, time.perf_counter() - start, rss_before)
+        return run
+
+    def summary(self):
+        with self._lock: stages = list(self.stages)
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": _mb(peak_rss_mb()),
+            "stages": stages,
+        }
@@ -0,0 +1,237 @@
+"""
+Atomic, versioned model publishing.
+
+Every artifact is serialized once into a content-addressed object
+
+    storage/app/ml_models/objects/<sha256>.joblib   (and <sha256>.forest)
+
+and the names readers use (rf_leak_detect_v1_2.joblib, rf_leak_detect_live.joblib,
+feature_cols_v1_2.joblib, ...) are hard links to those objects. A name is
+switched by linking the object under a temp name and renaming that over the
+target, so a reader opening the path gets either the complete old file or
+the complete new one. Where hard links are not available the object is
+copied to the temp name instead; the rename is still atomic.
+
+models_manifest.json lists every published version with its files and
+metrics, and which version is live.
+
+Usage:
+    python model_publisher.py list
+    python model_publisher.py promote v1_2     # point the _live names at an earlier version
+    python model_publisher.py gc               # delete objects no name or manifest entry uses
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+
+import joblib
+
+from forest_artifact import export_forest, artifact_path
+from instrumentation import replace_file, write_json_atomic
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STORAGE_DIR = os.environ.get("ML_STORAGE_DIR") or os.path.join(BASE_DIR, "storage", "app", "ml_models")
+MANIFEST_FILE = "models_manifest.json"
+
+# kind -> file name for a version tag ("live" for the served copy)
+NAMES = {
+    "detect": "rf_leak_detect_{}.joblib",
+    "locate": "rf_leak_locate_{}.joblib",
+    "features": "feature_cols_{}.joblib",
+}
+# The live feature list has no suffix (predict_leak.py callers pass feature_cols.joblib)
+LIVE_NAMES = dict(NAMES, features="feature_cols.joblib")
+FORESTS = ("detect", "locate")
+
+
+class ModelPublisher:
+    def __init__(self, storage_dir=STORAGE_DIR):
+        self.storage_dir = storage_dir
+        self.objects_dir = os.path.join(storage_dir, "objects")
+        self.manifest_path = os.path.join(storage_dir, MANIFEST_FILE)
+
+    # ----------------------------------------------------------
+    # Objects
+    # ----------------------------------------------------------
+    def _store_bytes(self, data, ext):
+        """Write `data` as objects/<sha256><ext> unless it already exists; returns the path relative to storage_dir."""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.objects_dir, digest + ext)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            replace_file(tmp, path)
+        return os.path.relpath(path, self.storage_dir)
+
+    def store_object(self, obj):
+        """Serialize `obj` once (joblib) into the object store."""
+        buf = io.BytesIO()
+        joblib.dump(obj, buf)
+        return self._store_bytes(buf.getvalue(), ".joblib")
+
+    def store_forest(self, clf):
+        """Compact .forest artifact of a fitted forest, content-addressed like the joblib objects."""
+        tmp = os.path.join(self.objects_dir, f"export.{os.getpid()}.forest")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        export_forest(clf, tmp)
+        try:
+            with open(tmp, "rb") as f: return self._store_bytes(f.read(), ".forest")
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+
+    def link(self, obj_path, name):
+        """Atomically point storage_dir/name at obj_path."""
+        target = os.path.join(self.storage_dir, name)
+        obj_path = os.path.join(self.storage_dir, obj_path)
+        # rename() between two links of the same file is a no-op that would leave the temp name behind
+        if os.path.exists(target) and os.path.samefile(obj_path, target): return target
+        tmp = f"{target}.{os.getpid()}.tmp"
+        if os.path.exists(tmp): os.remove(tmp)
+        try:
+            os.link(obj_path, tmp)
+        except OSError:
+            shutil.copyfile(obj_path, tmp)
+        replace_file(tmp, target)
+        return target
+
+    # ----------------------------------------------------------
+    # Manifest
+    # ----------------------------------------------------------
+    @contextmanager
+    def _manifest_lock(self):
+        """Serialize manifest read-modify-writes (and the live links) across processes."""
+        os.makedirs(self.storage_dir, exist_ok=True)
+        with open(self.manifest_path + ".lock", "a") as f:
+            try:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield  # closing the file releases the lock
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path) as f: return json.load(f)
+        except (OSError, ValueError):
+            return {"live": None, "versions": {}}
+
+    def _link_version(self, files, suffix, names):
+        for kind, info in files.items():
+            self.link(info["object"], names[kind].format(suffix))
+            compact = artifact_path(names[kind].format(suffix))
+            if info.get("forest"):
+                self.link(info["forest"], compact)
+            elif kind in FORESTS and os.path.exists(os.path.join(self.storage_dir, compact)):
+                # No artifact for this model: drop the previous one rather than serve it
+                os.remove(os.path.join(self.storage_dir, compact))
+
+    # ----------------------------------------------------------
+    # Publish / promote
+    # ----------------------------------------------------------
+    def publish(self, version, clf_detect, clf_locate, feature_cols, metrics=None, live=True, compact=True):
+        """
+        Store the models once and link the version names (and the _live names if `live`).
+        Returns the manifest entry of the version.
+        """
+        files = {}
+        for kind, obj in (("detect", clf_detect), ("locate", clf_locate), ("features", list(feature_cols))):
+            obj_path = self.store_object(obj)
+            files[kind] = {"object": obj_path, "sha256": os.path.basename(obj_path).split(".")[0],
+                           "bytes": os.path.getsize(os.path.join(self.storage_dir, obj_path))}
+            if compact and kind in FORESTS:
+                try:
+                    files[kind]["forest"] = self.store_forest(obj)
+                except Exception as e:
+                    files[kind]["forest_error"] = str(e)
+
+        entry = {
+            "published_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "metrics": metrics or {},
+            "files": {k: dict(v, path=NAMES[k].format(version)) for k, v in files.items()},
+        }
+        with self._manifest_lock():
+            # Forest artifacts are linked after their joblib, so "auto" engine selection sees them as current
+            self._link_version(files, version, NAMES)
+            if live: self._link_version(files, "live", LIVE_NAMES)
+            manifest = self.manifest()
+            manifest["versions"][version] = entry
+            if live: manifest["live"] = version
+            write_json_atomic(self.manifest_path, manifest)
+        return entry
+
+    def promote(self, version):
+        """Point the _live names at an already published version."""
+        with self._manifest_lock():
+            manifest = self.manifest()
+            if version not in manifest["versions"]:
+                raise KeyError(f"Unknown version {version}")
+            files = manifest["versions"][version]["files"]
+            missing = [info["object"] for info in files.values()
+                       if not os.path.exists(os.path.join(self.storage_dir, info["object"]))]
+            if missing: raise FileNotFoundError(f"Objects missing for {version}: {missing}")
+            self._link_version(files, "live", LIVE_NAMES)
+            manifest["live"] = version
+            write_json_atomic(self.manifest_path, manifest)
+        return manifest
+
+    def annotate(self, version, key, value):
+        """Attach extra results (e.g. a backtest) to a published version's manifest entry."""
+        with self._manifest_lock():
+            manifest = self.manifest()
+            if version not in manifest["versions"]: return False
+            manifest["versions"][version][key] = value
+            write_json_atomic(self.manifest_path, manifest)
+        return True
+
+    def gc(self):
+        """Remove objects that neither a manifest entry nor a linked name refers to."""
+        referenced = set()
+        for entry in self.manifest()["versions"].values():
+            for info in entry["files"].values():
+                referenced.update(p for p in (info.get("object"), info.get("forest")) if p)
+        removed = []
+        if not os.path.isdir(self.objects_dir): return removed
+        for name in os.listdir(self.objects_dir):
+            path = os.path.join(self.objects_dir, name)
+            # st_nlink > 1: some model name still links to it
+            if os.path.relpath(path, self.storage_dir) in referenced or os.stat(path).st_nlink > 1: continue
+            os.remove(path)
+            removed.append(name)
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned model publisher.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show published versions")
+    p_promote = sub.add_parser("promote", help="Make a published version live")
+    p_promote.add_argument("version")
+    sub.add_parser("gc", help="Delete unreferenced objects")
+    args = parser.parse_args()
+
+    publisher = ModelPublisher()
+    try:
+        if args.command == "list":
+            out = publisher.manifest()
+        elif args.command == "promote":
+            out = {"status": "success", "live": publisher.promote(args.version)["live"]}
+        else:
+            out = {"status": "success", "removed": publisher.gc()}
+    except (KeyError, FileNotFoundError) as e:
+        print(json.dumps({"status": "error", "message": e.args[0] if e.args else str(e)}))
+        sys.exit(1)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
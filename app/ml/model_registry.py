@@ -0,0 +1,169 @@
+"""
+In-memory cache of loaded model versions (prediction server).
+
+A version's forests and feature layout are loaded once and reused until
+their files change on disk (publisher relinks, a retrain overwriting the
+_live names), detected by file stats or, with verify="hash", by content.
+At most `capacity` versions stay loaded, least recently used first out and
+never the ACTIVE one. activate() swaps the ACTIVE version in one step;
+requests already holding the previous entry finish on it.
+"""
+import os
+import re
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from predict_leak import fix_path, load_models
+from features import load_pipeline
+
+VERSION_RE = re.compile(r"rf_leak_detect_(.+?)\.joblib$")
+
+
+def version_from_path(detect_path):
+    """'storage/app/ml_models/rf_leak_detect_v1_2.joblib' -> 'v1_2'."""
+    m = VERSION_RE.search(os.path.basename(detect_path or ""))
+    return m.group(1) if m else os.path.basename(detect_path or "")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ModelEntry:
+    """One loaded model version. Immutable once built, so readers never see a half swap."""
+
+    def __init__(self, version, paths, stats, hashes, clf_detect, clf_locate, pipeline):
+        self.version = version
+        self.paths = paths
+        self.stats = stats
+        self.hashes = hashes
+        self.clf_detect = clf_detect
+        self.clf_locate = clf_locate
+        self.pipeline = pipeline
+        self.loaded_at = time.time()
+
+    def restat(self, stats):
+        """Same models, refreshed file stats (content was verified unchanged)."""
+        entry = ModelEntry(self.version, self.paths, stats, self.hashes, self.clf_detect, self.clf_locate, self.pipeline)
+        entry.loaded_at = self.loaded_at
+        return entry
+
+    def describe(self):
+        return {"version": self.version, "detect": self.paths[0], "locate": self.paths[1], "loaded_at": self.loaded_at}
+
+
+class ModelRegistry:
+    """
+    In-process cache of model versions keyed by version tag.
+
+    - Keeps the last `capacity` versions in memory (LRU; the ACTIVE one is never evicted).
+    - Detects changed files by (mtime, size, inode), or by content hash when verify="hash",
+      and reloads only what changed.
+    - activate() swaps the ACTIVE pointer in one assignment; predictions that already
+      hold the previous ModelEntry finish on it.
+    """
+
+    def __init__(self, capacity=4, verify="mtime", engine="auto"):
+        self.capacity = max(1, int(capacity))
+        self.verify = verify
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._active = None
+
+    # ----------------------------------------------------------
+    # Loading
+    # ----------------------------------------------------------
+    @staticmethod
+    def _stat(path):
+        if path is None or not os.path.exists(path): return None
+        st = os.stat(path)
+        # inode: model_publisher swaps names between hard-linked objects
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @staticmethod
+    def _hashes(paths):
+        return tuple(file_hash(p) if p and os.path.exists(p) else None for p in paths)
+
+    def _load(self, version, paths, stats):
+        detect_path, locate_path, features_path = paths
+        clf_detect, clf_locate = load_models(detect_path, locate_path, self.engine)
+        hashes = self._hashes(paths) if self.verify == "hash" else None
+        return ModelEntry(version, paths, stats, hashes, clf_detect, clf_locate, load_pipeline(features_path))
+
+    def _store(self, entry):
+        with self._lock:
+            self._entries[entry.version] = entry
+            self._entries.move_to_end(entry.version)
+            self._evict()
+        return entry
+
+    def load(self, version, detect_path, locate_path, features_path=None):
+        """Return the entry for `version`, (re)loading it from disk if missing or changed."""
+        paths = (fix_path(detect_path), fix_path(locate_path), fix_path(features_path) if features_path else None)
+        stats = tuple(self._stat(p) for p in paths)
+        version = version or version_from_path(detect_path)
+
+        entry = self._entries.get(version)
+        if entry is not None and entry.paths == paths:
+            if entry.stats == stats:
+                with self._lock:
+                    if version in self._entries: self._entries.move_to_end(version)
+                return entry
+            # Files were touched; with hash checks only reload if the bytes changed
+            if self.verify == "hash" and self._hashes(paths) == entry.hashes:
+                return self._store(entry.restat(stats))
+
+        # Load outside the lock so other versions keep serving meanwhile
+        return self._store(self._load(version, paths, stats))
+
+    def _evict(self):
+        while len(self._entries) > self.capacity:
+            for version in self._entries:
+                if version != self._active:
+                    del self._entries[version]
+                    break
+            else:
+                break
+
+    # ----------------------------------------------------------
+    # ACTIVE version
+    # ----------------------------------------------------------
+    def activate(self, version, detect_path, locate_path, features_path=None):
+        """Load (if needed) and make `version` the ACTIVE model."""
+        entry = self.load(version, detect_path, locate_path, features_path)
+        with self._lock:
+            self._active = entry.version
+        return entry
+
+    def active(self):
+        """Current ACTIVE entry, re-checked against disk (e.g. overwritten _live files)."""
+        with self._lock:
+            entry = self._entries.get(self._active) if self._active else None
+        if entry is None: return None
+        return self.load(entry.version, *entry.paths)
+
+    def get(self, version=None):
+        """Cached entry for `version`, or the ACTIVE one."""
+        if version is None: return self.active()
+        with self._lock:
+            entry = self._entries.get(version)
+        if entry is None: return None
+        return self.load(entry.version, *entry.paths)
+
+    @property
+    def active_version(self):
+        return self._active
+
+    def versions(self):
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,54 @@
+"""
+Training orchestrator: fits several forests at the same time.
+
+Tree building in sklearn releases the GIL, so independent fits (detection,
+location, the held-out evaluation fit) run in threads of one process and
+share the training arrays without copies. The core budget is split between
+the concurrent fits through each forest's own `n_jobs`.
+
+The worker count comes from --n-jobs, else ML_TRAIN_JOBS, else all cores.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_ENV = "ML_TRAIN_JOBS"
+
+
+def resolve_n_jobs(n_jobs=None):
+    """Total worker budget; None / <= 0 means ML_TRAIN_JOBS or every core."""
+    if n_jobs is None:
+        try:
+            n_jobs = int(os.environ.get(JOBS_ENV, "0"))
+        except ValueError:
+            n_jobs = 0
+    cores = os.cpu_count() or 1
+    return cores if n_jobs <= 0 else min(n_jobs, cores)
+
+
+def split_jobs(n_jobs, n_tasks):
+    """Per-fit n_jobs so that `n_tasks` concurrent fits share `n_jobs` workers."""
+    return max(1, n_jobs // max(1, n_tasks))
+
+
+def run_parallel(tasks, n_jobs=None, models=()):
+    """
+    Run {name: callable} concurrently and return {name: result}.
+    `models` are the forests the callables fit; their n_jobs is set to an
+    equal share of the budget for the fit and reset afterwards, so saved
+    models predict single-threaded as before. The first exception is re-raised.
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    per_fit = split_jobs(n_jobs, len(tasks))
+    for clf in models:
+        clf.set_params(n_jobs=per_fit)
+
+    try:
+        if len(tasks) == 1 or n_jobs == 1:
+            return {name: fn() for name, fn in tasks.items()}
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = {name: pool.submit(fn) for name, fn in tasks.items()}
+            return {name: f.result() for name, f in futures.items()}
+    finally:
+        for clf in models:
+            clf.set_params(n_jobs=None)
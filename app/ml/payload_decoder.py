@@ -0,0 +1,234 @@
+"""
+Batch decryption and parsing of encrypted device payloads.
+
+Same CTR scheme as SensorDataController::simon_decrypt_ctr():
+  - counter block = pack('P', intval(nonce)) . 8 zero bytes, i.e. a 128-bit
+    little-endian integer, incremented once per 16-byte block
+  - keystream block = counter block XOR key (simon_block_encrypt() repeats
+    the 16-byte key; there is no round function)
+  - plaintext = ciphertext XOR keystream, then JSON
+
+Instead of one chr()/ord() per byte, the whole batch is done in a few NumPy
+operations: the counter blocks of all payloads are built at once as
+(nonce + block) 128-bit integers, XORed with the key, and one XOR over the
+concatenated ciphertext decrypts everything. Parsed readings go
+through the shared feature pipeline, so the output is ready for scoring.
+
+Usage:
+    python payload_decoder.py selftest [--vectors tests/fixtures/simon_ctr_vectors.json]
+    python payload_decoder.py decrypt --batch payloads.jsonl [--features feature_cols.joblib]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from features import get_pipeline, load_pipeline
+
+# Device key (SensorDataController::store)
+KEY_HEX = "A9F1C43E92ABCDEF76881244B35A9DEE"
+KEY = bytes.fromhex(KEY_HEX)
+
+BLOCK = 16
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+VECTORS_PATH = os.path.join(BASE_DIR, "tests", "fixtures", "simon_ctr_vectors.json")
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+_LEADING_NUMBER = re.compile(r"^[ \t\n\r\v\f]*([+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)")
+_HEX = re.compile(r"^(?:[0-9a-fA-F]{2})*$")
+# Laravel TrimStrings: Unicode whitespace plus BOM, zero-width space and LRM
+_TRIM = re.compile(r"^[\s\ufeff\u200b\u200e]+|[\s\ufeff\u200b\u200e]+$")
+
+
+def php_intval(value):
+    """PHP 8 intval() for the nonce types a JSON request can carry (64-bit build)."""
+    if value is None or value is False: return 0
+    if value is True: return 1
+    if isinstance(value, int): return value
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")): return 0
+        # Out-of-range floats wrap modulo 2^64
+        wrapped = int(value) & 0xFFFFFFFFFFFFFFFF
+        return wrapped - (1 << 64) if wrapped > INT64_MAX else wrapped
+    match = _LEADING_NUMBER.match(str(value))
+    if not match: return 0
+    number = match.group(1)
+    if not number.lstrip("+-").isdigit():
+        number = float(number)
+        if number in (float("inf"), float("-inf")): return INT64_MAX if number > 0 else INT64_MIN
+    # Out-of-range numeric strings saturate
+    return max(INT64_MIN, min(INT64_MAX, int(number)))
+
+
+def php_input(value):
+    """A JSON field as the controller sees it after Laravel's TrimStrings and ConvertEmptyStringsToNull."""
+    if not isinstance(value, str): return value
+    return _TRIM.sub("", value) or None
+
+
+def php_truthy(value):
+    """PHP's boolean conversion: null, false, 0, 0.0, "", "0" and [] are false."""
+    return bool(value) and value != "0"
+
+
+def nonce_u64(nonce):
+    """The counter's low 64 bits, as pack('P', intval($nonce)) writes them."""
+    return php_intval(nonce) & 0xFFFFFFFFFFFFFFFF
+
+
+def keystream(nonces, lengths, key=KEY):
+    """Concatenated keystream for payloads of the given byte lengths."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if total == 0: return np.zeros(0, dtype=np.uint8)
+
+    # One counter block per 16 bytes of each payload: nonce + block number as a
+    # 128-bit little-endian integer (low word wraps, high word takes the carry)
+    blocks = -(-lengths // BLOCK)
+    first_block = np.cumsum(blocks) - blocks
+    owner = np.repeat(np.arange(len(lengths)), blocks)
+    start = np.array([nonce_u64(n) for n in nonces], dtype=np.uint64)[owner]
+    counters = np.empty((len(owner), 2), dtype="<u8")
+    counters[:, 0] = start + (np.arange(len(owner)) - first_block[owner]).astype(np.uint64)
+    counters[:, 1] = counters[:, 0] < start
+    stream = (counters.view(np.uint8).reshape(-1, BLOCK) ^ np.frombuffer(key, dtype=np.uint8)[np.arange(BLOCK) % len(key)]).ravel()
+
+    # Each payload uses the first len bytes of its blocks
+    byte_owner = np.repeat(np.arange(len(lengths)), lengths)
+    pos = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return stream[first_block[byte_owner] * BLOCK + pos]
+
+
+def decrypt_batch(ciphertexts, nonces, key=KEY):
+    """Plaintext bytes for each (hex ciphertext, nonce) pair."""
+    raw = [bytes.fromhex(c) for c in ciphertexts]
+    lengths = [len(r) for r in raw]
+    plain = (np.frombuffer(b"".join(raw), dtype=np.uint8) ^ keystream(nonces, lengths, key)).tobytes()
+    ends = np.cumsum(lengths)
+    return [plain[end - n:end] for end, n in zip(ends, lengths)]
+
+
+def decrypt(cipher_hex, nonce, key=KEY):
+    return decrypt_batch([cipher_hex], [nonce], key)[0]
+
+
+def encrypt(plaintext, nonce, key=KEY):
+    """CTR is symmetric; used to build test vectors and simulator payloads."""
+    data = plaintext.encode("utf-8") if isinstance(plaintext, str) else plaintext
+    return (np.frombuffer(data, dtype=np.uint8) ^ keystream([nonce], [len(data)], key)).tobytes().hex().upper()
+
+
+def parse_batch(payloads, pipeline=None, key=KEY, state=None):
+    """
+    Decrypt, decode and featurize a batch of {"ciphertext"|"cipher", "nonce"} dicts
+    (`state`: window history, as in predict_leak.predict_batch).
+    Returns (X, records, errors, decoded): X has one row per decoded record,
+    decoded gives the payload index of each record, and errors maps the index
+    of each payload that failed to its message.
+    """
+    if pipeline is None: pipeline = get_pipeline()
+    records, errors, cipher, nonces, index = [], {}, [], [], []
+    for i, p in enumerate(payloads):
+        if not isinstance(p, dict): p = {}
+        # Same checks as SensorDataController::store: `ciphertext ?? cipher`, then `if ($cipherHex && $nonce)`
+        c, nonce = php_input(p.get("ciphertext")), php_input(p.get("nonce"))
+        if c is None: c = php_input(p.get("cipher"))
+        if not php_truthy(c) or not php_truthy(nonce):
+            errors[i] = "Missing ciphertext or nonce"
+            continue
+        # hex2bin() rejects odd lengths and separators, unlike bytes.fromhex()
+        if not isinstance(c, str) or not _HEX.match(c):
+            errors[i] = "Ciphertext is not hex"
+            continue
+        cipher.append(c)
+        nonces.append(nonce)
+        index.append(i)
+
+    decoded = []
+    for i, plain in zip(index, decrypt_batch(cipher, nonces, key)):
+        try:
+            data = json.loads(plain.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            data = None
+        # Same rule as the PHP path: anything json_decode() would not turn into a non-empty array is rejected
+        if not isinstance(data, dict) or not data:
+            errors[i] = "Decryption invalid JSON"
+            continue
+        records.append(data)
+        decoded.append(i)
+
+    X = pipeline.transform_records(records, state=state) if records else np.empty((0, pipeline.n_features))
+    return X, records, errors, decoded
+
+
+# ====================================================
+# TEST VECTORS
+# ====================================================
+def reference_decrypt(cipher_hex, nonce, key=KEY):
+    """Byte-at-a-time port of the PHP code, to check the vectorized path against."""
+    cipher = bytes.fromhex(cipher_hex)
+    ctr = list(nonce_u64(nonce).to_bytes(8, "little") + bytes(8))
+    out = bytearray()
+    for off in range(0, len(cipher), BLOCK):
+        ks = [ctr[i] ^ key[i % len(key)] for i in range(BLOCK)]
+        out += bytes(c ^ k for c, k in zip(cipher[off:off + BLOCK], ks))
+        for i in range(BLOCK):
+            ctr[i] += 1
+            if ctr[i] <= 255: break
+            ctr[i] = 0
+    return bytes(out)
+
+
+def selftest(path=VECTORS_PATH):
+    """
+    Vectorized batch, single-payload and byte-at-a-time paths must all reproduce
+    the fixture. "from_php" tells whether its vectors are PHP output.
+    """
+    with open(path) as f: fixture = json.load(f)
+    key, vectors = bytes.fromhex(fixture["key_hex"]), fixture["vectors"]
+    batch = decrypt_batch([v["ciphertext_hex"] for v in vectors], [v["nonce"] for v in vectors], key)
+    failures = []
+    for v, plain in zip(vectors, batch):
+        expected = v["plaintext"].encode("utf-8")
+        if not (plain == expected == decrypt(v["ciphertext_hex"], v["nonce"], key)
+                == reference_decrypt(v["ciphertext_hex"], v["nonce"], key)):
+            failures.append(v["name"])
+        elif encrypt(expected, v["nonce"], key) != v["ciphertext_hex"].upper():
+            failures.append(v["name"])
+    out = {"status": "success" if not failures else "error", "vectors": len(vectors), "failures": failures,
+           "from_php": fixture.get("source", "").startswith("SensorDataController")}
+    # Vectors from the Python port only show that the Python paths agree with each other
+    if not out["from_php"]: out["warning"] = "Vectors were not generated by PHP; run php artisan ml:simon-vectors"
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decrypt and featurize encrypted device payloads.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_test = sub.add_parser("selftest", help="Check against the shared PHP test vectors")
+    p_test.add_argument("--vectors", default=VECTORS_PATH)
+    p_dec = sub.add_parser("decrypt", help="JSON-lines payloads -> decoded readings and feature rows")
+    p_dec.add_argument("--batch", required=True, help="JSON-lines file of payloads, or '-' for stdin")
+    p_dec.add_argument("--features", help="feature_cols.joblib of the model the rows are for")
+    args = parser.parse_args()
+
+    if args.command == "selftest":
+        out = selftest(args.vectors)
+        print(json.dumps(out))
+        sys.exit(0 if out["status"] == "success" else 1)
+
+    stream = sys.stdin if args.batch == "-" else open(args.batch)
+    with stream:
+        payloads = [json.loads(line) for line in stream if line.strip()]
+    X, records, errors, decoded = parse_batch(payloads, load_pipeline(args.features))
+    rows = dict(zip(decoded, zip(records, X.tolist())))
+    for i in range(len(payloads)):
+        if i in errors: print(json.dumps({"error": errors[i]}))
+        else: print(json.dumps({"reading": rows[i][0], "features": rows[i][1]}))
+
+
+if __name__ == "__main__":
+    main()
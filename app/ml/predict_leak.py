@@ -6,9 +6,141 @@ import argparse
 import os
 import warnings
 
+from features import get_pipeline, load_pipeline
+from temporal import TemporalState
+from forest_artifact import artifact_path, load_forest
+from early_exit import predict_proba_early
+
 # Suppress warnings to keep JSON output clean
 warnings.filterwarnings("ignore")
 
+def fix_path(p):
+    """Resolve model paths relative to the working directory (Laravel base path)."""
+    if os.path.isabs(p): return p
+    return os.path.join(os.getcwd(), p)
+
+def load_model(path, engine="auto"):
+    """
+    Load one forest.
+    engine="numpy" uses the compact .forest artifact (pure-NumPy scoring),
+    "sklearn" the pickled estimator, "auto" the artifact when it is present and
+    at least as new as the .joblib.
+    """
+    path = fix_path(path)
+    compact = artifact_path(path)
+    if engine == "numpy" or (engine == "auto" and os.path.exists(compact)
+                             and os.path.getmtime(compact) >= os.path.getmtime(path)):
+        return load_forest(compact)
+    return joblib.load(path)
+
+def load_models(detect_path, locate_path, engine="auto"):
+    """Load the detection and location forests from disk."""
+    return load_model(detect_path, engine), load_model(locate_path, engine)
+
+SENSOR_BY_LOCATION = {1: "S001", 2: "S002", 3: "S003"}
+
+def score(clf, X, early_exit=None):
+    """(proba, trees used per row); early_exit is the allowed flip probability (0 = exact decision), None = all trees."""
+    if early_exit is None: return clf.predict_proba(X), None
+    return predict_proba_early(clf, X, delta=early_exit)
+
+def predict_batch(records, clf_detect, clf_locate, pipeline=None, state=None, early_exit=None):
+    """
+    Score many readings with one probability pass per forest.
+    `state` (temporal.TemporalState) carries window features across calls;
+    without it the records themselves are the history. With `early_exit`
+    set, trees are evaluated until the decision is settled (early_exit.py)
+    and each result reports the trees it used.
+    """
+    if len(records) == 0: return []
+    # ✅ Same feature code as training (features.py)
+    if pipeline is None: pipeline = get_pipeline()
+    return predict_matrix(pipeline.transform_records(records, state=state), clf_detect, clf_locate, early_exit)
+
+def predict_matrix(X, clf_detect, clf_locate, early_exit=None):
+    """Result dicts for an already built feature matrix (see predict_batch)."""
+    if len(X) == 0: return []
+
+    # 1. Predict Leak & Confidence from a single probability pass
+    proba, used_det = score(clf_detect, X, early_exit)
+    best = proba.argmax(axis=1)
+    predictions = clf_detect.classes_[best]
+    confidences = proba[np.arange(len(X)), best]
+
+    # 2. Predict Location for leak rows only
+    locations = np.zeros(len(X), dtype=int)
+    used_loc = np.zeros(len(X), dtype=int)
+    leak_rows = np.flatnonzero(predictions == 1)
+    if len(leak_rows) > 0:
+        proba_loc, used = score(clf_locate, X[leak_rows], early_exit)
+        locations[leak_rows] = clf_locate.classes_[proba_loc.argmax(axis=1)]
+        if used is not None: used_loc[leak_rows] = used
+
+    results = []
+    for i, (prediction, location_num, confidence) in enumerate(zip(predictions, locations, confidences)):
+        result = {
+            "leak_detected": int(prediction),
+            "leak_location": 0,
+            "sensor_id": "S001",
+            "pipeline_id": None,
+            "confidence": round(float(confidence) * 100, 2)
+        }
+        if prediction == 1:
+            result["leak_location"] = int(location_num)
+            # Simple Sensor mapping for reference
+            # (Laravel PipelineMapper handles the real logic now)
+            result["sensor_id"] = SENSOR_BY_LOCATION.get(int(location_num), "Unknown")
+        if used_det is not None:
+            result["trees_used"] = {"detect": int(used_det[i]), "locate": int(used_loc[i])}
+        results.append(result)
+    return results
+
+def predict(data, clf_detect, clf_locate, pipeline=None, state=None, early_exit=None):
+    """Score one reading and return the result dict printed by main()."""
+    return predict_batch([data], clf_detect, clf_locate, pipeline, state, early_exit)[0]
+
+def iter_batches(stream, chunk_size):
+    """Yield lists of parsed JSON-lines readings (or the exception for a bad line)."""
+    chunk = []
+    for line in stream:
+        line = line.strip()
+        if not line: continue
+        try:
+            chunk.append(json.loads(line))
+        except Exception as e:
+            chunk.append(e)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+def run_batch(source, clf_detect, clf_locate, out, chunk_size=10000, pipeline=None, early_exit=None):
+    """
+    Score a JSON-lines stream and write one JSON result line per input line.
+    Window features follow each device's readings through the whole stream.
+    """
+    if pipeline is None: pipeline = get_pipeline()
+    state = TemporalState() if pipeline.windows else None
+    for chunk in iter_batches(source, chunk_size):
+        valid = [r for r in chunk if isinstance(r, dict)]
+        scored = iter(predict_batch(valid, clf_detect, clf_locate, pipeline, state, early_exit))
+        for r in chunk:
+            if isinstance(r, dict):
+                res = next(scored)
+            else:
+                res = error_result(r if isinstance(r, Exception) else ValueError("Reading must be a JSON object"))
+            out.write(json.dumps(res) + "\n")
+    out.flush()
+
+def error_result(e):
+    """Fallback error JSON shared by the CLI and the prediction server."""
+    return {
+        "error": str(e),
+        "leak_detected": 0,
+        "sensor_id": "ERROR",
+        "confidence": 0
+    }
+
 def main():
     try:
         # 1. Parse Arguments
@@ -16,106 +148,38 @@ def main():
         parser.add_argument("--detect", required=True)
         parser.add_argument("--locate", required=True)
         parser.add_argument("--features", required=True)
-        parser.add_argument("--input", required=True)
+        parser.add_argument("--input")
+        parser.add_argument("--batch", help="JSON-lines file of readings, or '-' for stdin")
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument("--engine", choices=["auto", "numpy", "sklearn"], default="auto")
+        parser.add_argument("--early-exit", type=float, metavar="DELTA",
+                            help="Stop evaluating trees once the decision is settled (0 = exact, e.g. 0.01 = 1%% flip risk)")
         args = parser.parse_args()
+        if args.input is None and args.batch is None:
+            parser.error("one of --input or --batch is required")
 
-        # 2. Load Input Data
-        data = json.loads(args.input)
-        
-        # 3. Load Models
-        base_path = os.getcwd()
-        def fix_path(p):
-            if os.path.isabs(p): return p
-            return os.path.join(base_path, p)
-
-        clf_detect = joblib.load(fix_path(args.detect))
-        clf_locate = joblib.load(fix_path(args.locate))
-        
-        # 4. Prepare Raw Features
-        # Extract variables first to make math easier
-        f_main = float(data.get('f_main', 0))
-        f_1 = float(data.get('f_1', 0))
-        f_2 = float(data.get('f_2', 0))
-        f_3 = float(data.get('f_3', 0))
-        
-        p_main = float(data.get('p_main', 0))
-        p_dma1 = float(data.get('p_dma1', 0))
-        p_dma2 = float(data.get('p_dma2', 0))
-        p_dma3 = float(data.get('p_dma3', 0))
-        
-        pump_on = float(data.get('pump_on', 0))
-        comp_on = float(data.get('comp_on', 0))
-        s1 = float(data.get('s1', 0))
-        s2 = float(data.get('s2', 0))
-        s3 = float(data.get('s3', 0))
-        solenoid_active = float(data.get('solenoid_active', 0))
-
-        # ✅ NEW: Calculate Pressure Gradients (MUST match training logic)
-        grad_main_dma1 = p_main - p_dma1
-        grad_dma1_dma2 = p_dma1 - p_dma2
-        grad_dma2_dma3 = p_dma2 - p_dma3
-
-        # Construct Final Feature Vector (17 Features)
-        features = [
-            f_main, f_1, f_2, f_3,
-            p_main, p_dma1, p_dma2, p_dma3,
-            pump_on, comp_on, 
-            s1, s2, s3, 
-            solenoid_active,
-            grad_main_dma1, # 15: Pressure drop Main -> 1
-            grad_dma1_dma2, # 16: Pressure drop 1 -> 2
-            grad_dma2_dma3  # 17: Pressure drop 2 -> 3
-        ]
-
-        X = np.array([features])
-
-        # 5. Predict Leak & Calculate Confidence
-        prediction = clf_detect.predict(X)[0]
-        
-        confidence = 0.0
-        if hasattr(clf_detect, "predict_proba"):
-            # Returns [[prob_safe, prob_leak]]
-            probabilities = clf_detect.predict_proba(X)
-            # Get the probability of the predicted class (0 or 1)
-            confidence = probabilities[0][int(prediction)]
-        else:
-            confidence = 1.0 # Fallback
+        # 2. Load Models & the feature layout they were trained with
+        clf_detect, clf_locate = load_models(args.detect, args.locate, args.engine)
+        pipeline = load_pipeline(fix_path(args.features))
 
-        result = {
-            "leak_detected": int(prediction),
-            "leak_location": 0,
-            "sensor_id": "S001", 
-            "pipeline_id": None, 
-            "confidence": round(confidence * 100, 2) 
-        }
-
-        # 6. Predict Location (If Leak)
-        if prediction == 1:
-            location_num = int(clf_locate.predict(X)[0])
-            result["leak_location"] = location_num
-            
-            # Simple Sensor mapping for reference 
-            # (Laravel PipelineMapper handles the real logic now)
-            if location_num == 1:
-                result["sensor_id"] = "S001"
-            elif location_num == 2:
-                result["sensor_id"] = "S002"
-            elif location_num == 3:
-                result["sensor_id"] = "S003"
+        # 3. Batch Mode: one result line per input line
+        if args.batch is not None:
+            if args.batch == "-":
+                run_batch(sys.stdin, clf_detect, clf_locate, sys.stdout, args.chunk_size, pipeline, args.early_exit)
             else:
-                result["sensor_id"] = "Unknown"
+                with open(args.batch) as f:
+                    run_batch(f, clf_detect, clf_locate, sys.stdout, args.chunk_size, pipeline, args.early_exit)
+            return
 
-        print(json.dumps(result))
+        # 4. Single Reading (no history to compute window features from)
+        if pipeline.windows:
+            raise ValueError("This model uses window features; score single readings through predict_server.py")
+        data = json.loads(args.input)
+        print(json.dumps(predict(data, clf_detect, clf_locate, pipeline, early_exit=args.early_exit)))
 
     except Exception as e:
-        # Fallback error JSON
-        print(json.dumps({
-            "error": str(e), 
-            "leak_detected": 0, 
-            "sensor_id": "ERROR",
-            "confidence": 0
-        }))
+        print(json.dumps(error_result(e)))
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
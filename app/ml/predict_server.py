@@ -0,0 +1,220 @@
+"""
+Long-lived leak prediction server.
+
+Keeps model versions loaded (model_registry.py), so Laravel
+(App\\Helpers\\PredictionServer) scores a reading with one local HTTP call
+instead of spawning predict_leak.py and unpickling the forests every time.
+Answers are the JSON predict_leak.py prints; the endpoints are listed on
+PredictHandler.
+
+With --batch-max > 1, concurrent /predict requests are scored together
+(ingest_worker.MicroBatcher). With --store as well, the scored readings are
+appended to the training store and results carry "stored": true, which tells
+SensorDataController not to append them a second time.
+
+Usage:
+    python predict_server.py --detect rf_leak_detect_live.joblib --locate rf_leak_locate_live.joblib \\
+        --features feature_cols.joblib [--port 8765 | --socket /tmp/aquaguard_predict.sock]
+        [--batch-max 64 [--store pipeline]]
+"""
+import os
+import sys
+import json
+import argparse
+import socketserver
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from predict_leak import predict, predict_batch, predict_matrix, error_result
+from payload_decoder import parse_batch
+from model_registry import ModelRegistry
+from temporal import TemporalState
+from ingest_worker import MicroBatcher, ScoringHandler
+
+# Suppress warnings to keep JSON output clean
+warnings.filterwarnings("ignore")
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class PredictHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict        {"version": ..., "detect": ..., "locate": ..., "features": ..., "input": {...}}
+    POST /predict_batch  {"version": ..., "detect": ..., "locate": ..., "inputs": [{...}, ...]} -> {"results": [...]}
+    POST /predict_encrypted {..., "payloads": [{"ciphertext": ..., "nonce": ...}, ...]} -> {"results": [...]}
+                         (device-encrypted readings, decrypted and featurized in one batch; payload_decoder.py)
+    POST /activate       {"version": ..., "detect": ..., "locate": ..., "features": ...}
+    GET  /health
+    Answers with the same JSON that predict_leak.py prints.
+
+    Model paths are optional on /predict*: without them the cached `version`
+    (A/B scoring, rollback) or the ACTIVE version is used.
+
+    "early_exit" (on /predict*, default --early-exit) scores with early-exit
+    trees and adds "trees_used" to each result; null evaluates every tree.
+
+    Every scored reading extends its device's window history (keyed by its
+    "sensorId"), which layouts with window features are computed from. The
+    same reading scored again by another version (same values and
+    "timestamp") does not extend it a second time.
+
+    With --batch-max > 1, concurrent /predict requests are coalesced into
+    micro-batches (ingest_worker.MicroBatcher) and scored together; with
+    --store the scored readings are appended to the training store per batch
+    and results carry "stored": true.
+    """
+    server_version = "AquaGuardPredict/1.0"
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send(404, {"error": "Not found"})
+        registry = self.server.registry
+        batcher = self.server.batcher
+        self._send(200, {"status": "ok", "active": registry.active_version, "versions": registry.versions(),
+                         "devices": self.server.temporal.devices(), "batching": batcher.stats() if batcher else None})
+
+    def do_POST(self):
+        if self.path not in ("/predict", "/predict_batch", "/predict_encrypted", "/activate"):
+            return self._send(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            registry = self.server.registry
+
+            if self.path == "/activate":
+                entry = registry.activate(body.get("version"), body["detect"], body["locate"], body.get("features"))
+                return self._send(200, {"status": "success", "active": entry.describe()})
+
+            # Hold on to this entry for the whole request; a concurrent swap won't affect it
+            if body.get("detect") and body.get("locate"):
+                entry = registry.load(body.get("version"), body["detect"], body["locate"], body.get("features"))
+            else:
+                entry = registry.get(body.get("version"))
+            if entry is None:
+                raise ValueError("No model loaded for this request")
+
+            state = self.server.temporal
+            early_exit = body.get("early_exit", self.server.early_exit)
+            if self.path == "/predict_batch":
+                inputs = body.get("inputs", [])
+                results = predict_batch(inputs, entry.clf_detect, entry.clf_locate, entry.pipeline, state, early_exit)
+                return self._send(200, {"results": results, "version": entry.version})
+
+            if self.path == "/predict_encrypted":
+                payloads = body.get("payloads", [])
+                X, records, errors, decoded = parse_batch(payloads, entry.pipeline, state=state)
+                # Each result carries the decrypted reading, so the caller can store it
+                rows = dict(zip(decoded, zip(records, predict_matrix(X, entry.clf_detect, entry.clf_locate, early_exit))))
+                results = [dict(rows[i][1], reading=rows[i][0]) if i in rows else error_result(errors[i])
+                           for i in range(len(payloads))]
+                return self._send(200, {"results": results, "version": entry.version})
+
+            data = body.get("input", {})
+            if isinstance(data, str): data = json.loads(data)
+            if self.server.batcher is not None:
+                result = self.server.batcher.submit((entry, data, early_exit)).result()
+                return self._send(500 if "error" in result else 200, result)
+            self._send(200, predict(data, entry.clf_detect, entry.clf_locate, entry.pipeline, state, early_exit))
+        except Exception as e:
+            self._send(500, error_result(e))
+
+    def _send(self, status, payload):
+        out = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) tuple
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write("[predict_server] %s\n" % (format % args))
+
+
+# Listen backlog: with batching, many clients connect at once by design
+REQUEST_QUEUE_SIZE = 128
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+class ThreadingTCPHTTPServer(ThreadingHTTPServer):
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+def build_server(args):
+    if args.socket:
+        if os.path.exists(args.socket): os.unlink(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, PredictHandler)
+        where = f"unix:{args.socket}"
+    else:
+        server = ThreadingTCPHTTPServer((args.host, args.port), PredictHandler)
+        where = f"http://{args.host}:{args.port}"
+
+    server.registry = ModelRegistry(capacity=args.cache_size, verify=args.verify, engine=args.engine)
+    server.temporal = TemporalState()
+    server.early_exit = args.early_exit
+    server.batcher = None
+    if args.batch_max > 1:
+        store = None
+        if args.store:
+            from training_store import TrainingStore
+            store = TrainingStore(args.store)
+        server.batcher = MicroBatcher(ScoringHandler(server.temporal, store), args.batch_max, args.batch_delay_ms)
+    server.verbose = args.verbose
+
+    # Warm up with the ACTIVE pair so the first request does not pay the load
+    if args.detect and args.locate:
+        server.registry.activate(args.version, args.detect, args.locate, args.features)
+
+    return server, where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived leak prediction server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--detect", help="ACTIVE detection model to preload")
+    parser.add_argument("--locate", help="ACTIVE location model to preload")
+    parser.add_argument("--features", help="feature_cols.joblib for the preloaded models")
+    parser.add_argument("--version", help="Version tag of the preloaded models (default: from --detect)")
+    parser.add_argument("--cache-size", type=int, default=4, help="Model versions kept in memory")
+    parser.add_argument("--verify", choices=["mtime", "hash"], default="mtime",
+                        help="How to detect changed model files")
+    parser.add_argument("--engine", choices=["auto", "numpy", "sklearn"], default="auto",
+                        help="Scoring engine (numpy needs the .forest artifacts)")
+    parser.add_argument("--early-exit", type=float, metavar="DELTA",
+                        help="Default early-exit scoring (0 = exact decision, e.g. 0.01 = 1%% flip risk)")
+    parser.add_argument("--batch-max", type=int, default=1,
+                        help="Coalesce concurrent /predict requests into batches of up to this size (1 = off)")
+    parser.add_argument("--batch-delay-ms", type=float, default=2.0,
+                        help="Longest a reading waits for its batch to fill")
+    parser.add_argument("--store", help="With batching: append scored readings to this training-store dataset")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server, where = build_server(args)
+    print(f"🚀 Prediction server listening on {where}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.batcher is not None: server.batcher.close()
+        if args.socket and os.path.exists(args.socket): os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
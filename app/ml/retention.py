@@ -0,0 +1,299 @@
+"""
+Bounded training history: time-partitioned compaction into a stratified reservoir.
+
+The live training store (training_store.py) is partitioned by day. Day
+segments older than --keep-days whose rows have all been trained on (the
+train_state.json watermark covers them) are folded into a reservoir and
+deleted. The legacy pipeline_sensor_data.csv is folded the same way once a
+training run has read all of it (train_state.json records its size) and it
+has not been written for --keep-days, then moved aside as .compacted.
+
+The reservoir keeps at most `capacity` rows per stratum (leak_detected,
+leak_location), each a uniform sample of every row that stratum has seen
+(reservoir sampling), so:
+  - training input is bounded by capacity x strata however long the plant runs,
+  - normal readings only ever replace other normal readings: a rare leak
+    location keeps all of its rows until it has `capacity` of its own.
+
+Layout (storage/app/ml_models/reservoir/):
+    reservoir.json       {"file", "capacity", "seen": {"<detected>:<location>": n}, "compacted": [...]}
+    rows-<n>.f32         rows in the store's float32 CSV_COLS layout
+A compaction writes a new rows file and then replaces reservoir.json, so a
+reader sees either the old reservoir or the new one. Segments are deleted
+only after that, and "compacted" is cleared once they are; names still
+listed there come from an interrupted run and are deleted, not re-folded.
+
+Usage:
+    python retention.py compact [--keep-days 7] [--capacity 5000] [--seed N]
+    python retention.py status
+"""
+import os
+import sys
+import json
+import glob
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from features import CSV_COLS
+from dataset import DTYPES, empty_frame, load_csv
+from training_store import ROW_DTYPE, LEGACY_PREFIX, TrainingStore
+from incremental import STATE_FILE, load_state, save_state
+from instrumentation import write_json_atomic
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STORAGE_DIR = os.environ.get("ML_STORAGE_DIR") or os.path.join(BASE_DIR, "storage", "app", "ml_models")
+RESERVOIR_DIR = os.path.join(STORAGE_DIR, "reservoir")
+LEGACY_CSV = "pipeline_sensor_data.csv"
+# The legacy CSV while it is being folded
+STAGED_SUFFIX = ".compacting"
+
+DEFAULT_CAPACITY = 5000
+DEFAULT_KEEP_DAYS = 7
+# Rows per block when folding a segment (bounds memory for large days)
+CHUNK_ROWS = 1_000_000
+
+_DETECTED = CSV_COLS.index("leak_detected")
+_LOCATION = CSV_COLS.index("leak_location")
+
+
+def _empty_rows():
+    return np.zeros((0, len(CSV_COLS)), dtype=ROW_DTYPE)
+
+
+def stratum_keys(rows):
+    """'<leak_detected>:<leak_location>' per row."""
+    detected = rows[:, _DETECTED].astype(np.int64)
+    location = np.where(detected > 0, rows[:, _LOCATION], 0).astype(np.int64)
+    return np.char.add(np.char.add(detected.astype(str), ":"), location.astype(str))
+
+
+class Reservoir:
+    def __init__(self, path=RESERVOIR_DIR, capacity=None, seed=None):
+        self.path = path
+        self.meta_path = os.path.join(path, "reservoir.json")
+        self.meta = self._read_meta()
+        self.capacity = int(capacity or self.meta.get("capacity") or DEFAULT_CAPACITY)
+        self.rng = np.random.default_rng(seed)
+        self.seen = dict(self.meta.get("seen", {}))
+        self._strata = None  # key -> rows, loaded on first add()
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def rows(self):
+        """(n, len(CSV_COLS)) float32 rows of the committed reservoir."""
+        name = self.meta.get("file")
+        if not name: return _empty_rows()
+        try:
+            return np.fromfile(os.path.join(self.path, name), dtype=ROW_DTYPE).reshape(-1, len(CSV_COLS))
+        except (OSError, ValueError):
+            return _empty_rows()
+
+    def load(self):
+        """DataFrame with the same compact dtypes as dataset.load_csv()."""
+        rows = self.rows()
+        if len(rows) == 0: return empty_frame()
+        return pd.DataFrame({c: rows[:, i].astype(DTYPES[c]) for i, c in enumerate(CSV_COLS)}, copy=False)
+
+    def _load_strata(self):
+        rows = self.rows()
+        keys = stratum_keys(rows)
+        self._strata = {str(k): rows[keys == k] for k in np.unique(keys)}
+        # A lowered capacity keeps a uniform subset of what is there
+        for k, kept in self._strata.items():
+            if len(kept) > self.capacity:
+                self._strata[k] = kept[np.sort(self.rng.choice(len(kept), self.capacity, replace=False))]
+
+    def add(self, rows):
+        """Offer rows to the reservoir (Algorithm R per stratum, vectorized per block)."""
+        if self._strata is None: self._load_strata()
+        rows = np.asarray(rows, dtype=ROW_DTYPE).reshape(-1, len(CSV_COLS))
+        keys = stratum_keys(rows)
+        for key in map(str, np.unique(keys)):
+            new = rows[keys == key]
+            kept = self._strata.get(key, _empty_rows())
+            seen = int(self.seen.get(key, len(kept)))
+
+            # Free slots take rows as they come
+            fill = min(max(0, self.capacity - len(kept)), len(new))
+            kept = np.concatenate([kept, new[:fill]])
+            rest = new[fill:]
+            if len(rest):
+                # The t-th row seen (0-based) replaces a random slot with probability capacity / (t + 1)
+                t = seen + fill + np.arange(len(rest))
+                slot = self.rng.integers(0, t + 1)
+                hit = np.flatnonzero(slot < len(kept))
+                # Several rows of one block may hit the same slot: the latest one wins, as in a sequential pass
+                _, last = np.unique(slot[hit][::-1], return_index=True)
+                hit = hit[len(hit) - 1 - last]
+                kept[slot[hit]] = rest[hit]
+            self._strata[key] = kept
+            self.seen[key] = seen + len(new)
+
+    def commit(self, compacted=()):
+        """Write the rows to a new file, then switch reservoir.json to it."""
+        if self._strata is None: self._load_strata()
+        os.makedirs(self.path, exist_ok=True)
+        rows = np.concatenate([self._strata[k] for k in sorted(self._strata)] or [_empty_rows()])
+        number = int(self.meta.get("generation", 0)) + 1
+        name = f"rows-{number}.f32"
+        with open(os.path.join(self.path, name), "wb") as f:
+            f.write(np.ascontiguousarray(rows, dtype=ROW_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        previous = self.meta.get("file")
+        self.meta = {
+            "generation": number,
+            "file": name,
+            "rows": len(rows),
+            "capacity": self.capacity,
+            "seen": self.seen,
+            "kept": {k: len(v) for k, v in sorted(self._strata.items())},
+            "compacted": list(compacted),
+            "updated_at": date.today().isoformat(),
+        }
+        write_json_atomic(self.meta_path, self.meta)
+
+        # Older rows files are no longer referenced (a reader that opened one keeps its handle)
+        for path in glob.glob(os.path.join(self.path, "rows-*.f32")):
+            if os.path.basename(path) not in (name, previous):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return self.meta
+
+    def finish(self):
+        """Mark the last commit's partitions as deleted (nothing left to resume)."""
+        self.meta["compacted"] = []
+        write_json_atomic(self.meta_path, self.meta)
+
+
+def load_reservoir(path=RESERVOIR_DIR):
+    return Reservoir(path).load()
+
+
+def _segment_day(name):
+    """Day of a store segment ("2025-11-20" or "legacy-2025-11-20"); None for other names."""
+    if name.startswith(LEGACY_PREFIX): name = name[len(LEGACY_PREFIX):]
+    try:
+        return date.fromisoformat(name)
+    except ValueError:
+        return None
+
+
+def _free_name(path):
+    """`path`, or `path`.1, .2, ... if it is taken (an earlier compaction's file is never overwritten)."""
+    n, candidate = 0, path
+    while os.path.exists(candidate):
+        n += 1
+        candidate = f"{path}.{n}"
+    return candidate
+
+
+def _legacy_trained(sim_path, state, cutoff):
+    """The legacy CSV is unchanged since a training run read all of it, and last written before `cutoff`."""
+    record = state.get("pipeline_legacy_csv") or {}
+    if not os.path.exists(sim_path): return False
+    st = os.stat(sim_path)
+    return st.st_size == record.get("bytes") and date.fromtimestamp(st.st_mtime) < cutoff
+
+
+def compact(keep_days=DEFAULT_KEEP_DAYS, capacity=None, seed=None, storage_dir=STORAGE_DIR, today=None):
+    """Fold trained day segments older than `keep_days` (and the legacy CSV) into the reservoir."""
+    state_path = os.path.join(storage_dir, STATE_FILE)
+    state = load_state(state_path)
+    watermark = state.get("pipeline_watermark")
+    if watermark is None:
+        return {"status": "skipped", "message": "No training run yet; nothing is known to be trained"}
+
+    store = TrainingStore("pipeline", os.path.join(storage_dir, "store"))
+    reservoir = Reservoir(os.path.join(storage_dir, "reservoir"), capacity, seed)
+    # Left over only when a run stopped between its commit and its deletes: those are folded already
+    interrupted = set(reservoir.meta.get("compacted", []))
+    sim_path = os.path.join(storage_dir, LEGACY_CSV)
+    staged = sim_path + STAGED_SUFFIX
+    cutoff = (today or date.today()) - timedelta(days=keep_days)
+
+    # 1. Old, fully trained day segments (the current ones keep their time order for windows)
+    segments = []
+    for name, path, rows in store.segments():
+        day = _segment_day(name)
+        if day is None or day >= cutoff: continue
+        if name not in interrupted and watermark.get(name, 0) < rows: continue
+        segments.append((name, path, rows))
+
+    # The legacy CSV is moved aside before it is read, so rows written to it meanwhile start a new file
+    if not os.path.exists(staged) and _legacy_trained(sim_path, state, cutoff):
+        os.replace(sim_path, staged)
+    legacy = os.path.exists(staged)
+    if not segments and not legacy:
+        if interrupted: reservoir.finish()
+        return {"status": "success", "segments_compacted": 0, "rows_folded": 0,
+                "reservoir_rows": reservoir.meta.get("rows", 0), "live_rows": store.count()}
+
+    # 2. Fold whatever an interrupted run has not already committed
+    store.check_manifest()
+    folded = 0
+    for name, path, rows in segments:
+        if name in interrupted: continue
+        data = np.memmap(path, dtype=ROW_DTYPE, mode="r", shape=(rows, len(CSV_COLS)))
+        for lo in range(0, rows, CHUNK_ROWS):
+            reservoir.add(np.array(data[lo:lo + CHUNK_ROWS]))
+        folded += rows
+        del data
+    if legacy and LEGACY_CSV not in interrupted:
+        df = load_csv(staged)
+        reservoir.add(df[CSV_COLS].to_numpy(dtype=np.float32))
+        folded += len(df)
+
+    compacted = [name for name, _, _ in segments] + ([LEGACY_CSV] if legacy else [])
+    meta = reservoir.commit(compacted)
+
+    # 3. Drop the folded partitions and their watermark entries, then close the run
+    for name, path, _ in segments:
+        os.remove(path)
+        watermark.pop(name, None)
+    if legacy:
+        os.replace(staged, _free_name(sim_path + ".compacted"))
+        state["pipeline_legacy_csv"] = None
+    if segments: state["pipeline_watermark"] = watermark
+    if segments or legacy: save_state(state_path, state)
+    reservoir.finish()
+
+    return {"status": "success", "segments_compacted": len(segments), "legacy_csv": legacy,
+            "rows_folded": folded, "reservoir_rows": meta["rows"], "kept": meta["kept"], "seen": meta["seen"],
+            "live_rows": store.count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bounded training history (stratified reservoir).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_compact = sub.add_parser("compact", help="Fold old, trained day segments into the reservoir")
+    p_compact.add_argument("--keep-days", type=int, default=DEFAULT_KEEP_DAYS,
+                           help="Recent days kept as segments (time-ordered, for incremental runs and window features)")
+    p_compact.add_argument("--capacity", type=int, help=f"Rows kept per (class, location) stratum (default: {DEFAULT_CAPACITY} or the reservoir's)")
+    p_compact.add_argument("--seed", type=int)
+    sub.add_parser("status", help="Reservoir and live store sizes")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        out = compact(args.keep_days, args.capacity, args.seed)
+    else:
+        meta = Reservoir().meta
+        out = {"status": "success", "reservoir_rows": meta.get("rows", 0), "capacity": meta.get("capacity"),
+               "kept": meta.get("kept", {}), "seen": meta.get("seen", {}),
+               "live_rows": TrainingStore("pipeline").count(), "updated_at": meta.get("updated_at")}
+    print(json.dumps(out))
+    if out["status"] == "error": sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
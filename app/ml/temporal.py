@@ -0,0 +1,176 @@
+"""
+Sliding-window temporal features.
+
+A window feature is named <source>_<stat>_<window>, e.g. p_main_mean_8:
+the mean of p_main over the device's last 8 readings (the current one
+included). Stats are the mean, the (population) variance and the
+least-squares slope per reading. Until a device has `window` readings the
+stats cover what it has so far, so the first reading gives mean = value,
+var = 0, slope = 0.
+
+Two engines produce identical values:
+  - RollingWindow / TemporalState: streaming, O(1) per reading on a ring
+    buffer of running sums (prediction server, one reading at a time)
+  - rolling_stats(): vectorized over a whole frame (training)
+Both finish through window_stats(), so they cannot drift apart.
+"""
+import threading
+
+import numpy as np
+
+# Raw fields that get window features (flow and pressure trends)
+WINDOW_SOURCES = ["f_main", "p_main", "p_dma1", "p_dma2", "p_dma3"]
+WINDOW_STATS = ("mean", "var", "slope")
+DEFAULT_DEVICE = "default"
+
+# Rows per vectorized block in rolling_stats (bounds the (rows, k, window) view work)
+CHUNK_ROWS = 65536
+
+
+def window_feature_cols(windows, sources=WINDOW_SOURCES):
+    """Feature names for the given window sizes, e.g. [8] -> f_main_mean_8, f_main_var_8, ..."""
+    return [f"{src}_{stat}_{w}" for w in windows for src in sources for stat in WINDOW_STATS]
+
+
+def parse_window_col(name):
+    """'p_main_mean_8' -> ('p_main', 'mean', 8); None if `name` is not a window feature."""
+    parts = name.rsplit("_", 2)
+    if len(parts) != 3: return None
+    source, stat, window = parts
+    if source not in WINDOW_SOURCES or stat not in WINDOW_STATS or not window.isdigit() or int(window) < 1:
+        return None
+    return source, stat, int(window)
+
+
+def window_stats(s, q, p, m):
+    """
+    (mean, var, slope) from running sums over the last m readings:
+    s = sum x, q = sum x^2, p = sum i*x with i = 0 for the oldest reading.
+    """
+    m = np.asarray(m, dtype=np.float64)
+    mean = s / m
+    var = np.maximum(q / m - mean * mean, 0.0)
+    sum_i = m * (m - 1) / 2
+    denom = m * (m - 1) * m * (2 * m - 1) / 6 - sum_i * sum_i  # m*sum(i^2) - sum(i)^2
+    slope = np.divide(m * p - sum_i * s, denom, out=np.zeros(np.broadcast(s, denom).shape), where=denom > 0)
+    return mean, var, slope
+
+
+# ====================================================
+# STREAMING
+# ====================================================
+class RollingWindow:
+    """Last `window` readings of k channels, with running sums updated in O(1)."""
+
+    def __init__(self, window, channels):
+        self.window = int(window)
+        self.buffer = np.zeros((self.window, channels))
+        self.head = 0   # slot the next reading goes into (= oldest once full)
+        self.count = 0
+        self.s = np.zeros(channels)
+        self.q = np.zeros(channels)
+        self.p = np.zeros(channels)
+
+    def push(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.count < self.window:
+            self.p += self.count * x
+            self.count += 1
+        else:
+            old = self.buffer[self.head]
+            # Everyone still in the window moves one index down; the new reading is the last index
+            self.p += (self.window - 1) * x - (self.s - old)
+            self.s -= old
+            self.q -= old * old
+        self.s += x
+        self.q += x * x
+        self.buffer[self.head] = x
+        self.head = (self.head + 1) % self.window
+        # Once per lap, recompute the sums exactly so float error cannot accumulate
+        if self.head == 0: self._resum()
+        return self
+
+    def _resum(self):
+        ordered = np.roll(self.buffer, -self.head, axis=0)[-self.count:]
+        self.s = ordered.sum(axis=0)
+        self.q = (ordered * ordered).sum(axis=0)
+        self.p = np.arange(self.count) @ ordered
+
+    def stats(self):
+        return window_stats(self.s, self.q, self.p, self.count)
+
+
+class TemporalState:
+    """
+    Per-device rolling windows for the streaming predictor (thread-safe).
+
+    Each window size has one history per device, shared by every model that
+    uses it. A reading pushed again with the same `key` as the last one (the
+    same reading scored by another model version) does not advance it.
+    """
+
+    def __init__(self, sources=WINDOW_SOURCES):
+        self.sources = list(sources)
+        self._windows = {}
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def push(self, device, values, windows, key=None):
+        """Add one reading (values in `sources` order) and return {window: (mean, var, slope)}."""
+        out = {}
+        with self._lock:
+            for w in windows:
+                slot = (device, w)
+                ring = self._windows.get(slot)
+                if ring is None: ring = self._windows[slot] = RollingWindow(w, len(self.sources))
+                if key is None or self._last.get(slot) != key:
+                    ring.push(values)
+                    self._last[slot] = key
+                out[w] = ring.stats()
+        return out
+
+    def devices(self):
+        with self._lock: return sorted({str(d) for d, _ in self._windows})
+
+
+# ====================================================
+# VECTORIZED
+# ====================================================
+def rolling_stats(values, window, groups=None):
+    """
+    (mean, var, slope), each (n, k), of `values` (n, k) over trailing windows of
+    `window` rows. Rows are in time order; `groups` (n,) starts a new history
+    wherever its value changes (e.g. another device or source file).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n, k = values.shape
+    w = int(window)
+    out = tuple(np.empty((n, k)) for _ in range(3))
+    if n == 0: return out
+
+    # Readings available to each row's window (capped at w)
+    idx = np.arange(n)
+    if groups is None:
+        start = np.zeros(n, dtype=np.int64)
+    else:
+        groups = np.asarray(groups)
+        first = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        start = np.repeat(first, np.diff(np.r_[first, n]))
+    m = np.minimum(idx - start + 1, w)
+
+    padded = np.vstack([np.zeros((w - 1, k)), values])
+    view = np.lib.stride_tricks.sliding_window_view(padded, w, axis=0)  # (n, k, w), oldest first
+    pos = np.arange(w)
+    for lo in range(0, n, CHUNK_ROWS):
+        hi = min(lo + CHUNK_ROWS, n)
+        mc = m[lo:hi]
+        first_valid = (w - mc)[:, None]
+        mask = (pos >= first_valid).astype(np.float64)  # (rows, w): slots inside this row's history
+        rel = (pos - first_valid) * mask                # index relative to the oldest valid slot
+        block = view[lo:hi]
+        s = np.einsum("nkw,nw->nk", block, mask)
+        q = np.einsum("nkw,nkw,nw->nk", block, block, mask)
+        p = np.einsum("nkw,nw->nk", block, rel)
+        stats = window_stats(s, q, p, mc[:, None])
+        for dst, src in zip(out, stats): dst[lo:hi] = src
+    return out
@@ -1,6 +1,4 @@
 import os
-import pandas as pd
-import numpy as np
 import joblib
 import json
 from sklearn.model_selection import train_test_split
@@ -8,14 +6,21 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
 from datetime import datetime
 import sys
-import time
+import argparse
 import traceback
 
+from features import FEATURE_COLS, get_pipeline
+from forest_artifact import export_forest, artifact_path
+from parallel_fit import run_parallel
+from training_store import load_dataset
+from instrumentation import TrainingTracker, write_json_atomic
+
 # ============================
 # CONFIGURATION
 # ============================
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_DIR = os.path.join(BASE_DIR, "storage", "app", "ml_models")
+# ML_STORAGE_DIR points training at another directory (used by benchmark.py)
+MODEL_DIR = os.environ.get("ML_STORAGE_DIR") or os.path.join(BASE_DIR, "storage", "app", "ml_models")
 DATA_PATH = os.path.join(MODEL_DIR, "pipeline_sensor_data.csv")
 
 PROGRESS_PATH = os.path.join(MODEL_DIR, "train_progress.json")
@@ -27,35 +32,32 @@ MODEL_DET_PATH = os.path.join(MODEL_DIR, "rf_leak_detect.joblib")
 MODEL_LOC_PATH = os.path.join(MODEL_DIR, "rf_leak_locate.joblib")
 FEATURES_PATH = os.path.join(MODEL_DIR, "feature_cols.joblib")
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--n-jobs", type=int, default=None, help="Training workers (default: ML_TRAIN_JOBS or all cores)")
+args = parser.parse_args()
+
 # ============================
 # HELPER FUNCTIONS
 # ============================
 def write_json(path, data):
-    """Safely write a JSON file."""
+    """Safely write a JSON file (temp file + rename, readers never see a partial file)."""
     try:
-        with open(path, "w") as f:
-            json.dump(data, f, indent=4)
+        write_json_atomic(path, data)
     except Exception as e:
         print(f"⚠️ Failed to write {path}: {e}")
 
-def update_progress(progress, status="training", message=""):
-    """Write training progress for Laravel to read."""
-    progress_data = {
-        "progress": progress,
-        "status": status,
-        "message": message,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    write_json(PROGRESS_PATH, progress_data)
+# Stage timers + memory samples (instrumentation.py)
+tracker = TrainingTracker(PROGRESS_PATH)
 
 def complete_training(result):
     """Save final training result."""
+    result["timings"] = tracker.summary()
     write_json(RESULT_PATH, result)
-    update_progress(100, "completed", "Training finished successfully")
+    tracker.progress(100, "Training finished successfully", status="completed")
 
 def fail_training(error_message):
     """Handle and log training failure."""
-    update_progress(0, "failed", error_message)
+    tracker.fail(error_message)
     print(json.dumps({"status": "error", "message": error_message}))
     sys.exit(1)
 
@@ -63,62 +65,50 @@ def fail_training(error_message):
 # TRAINING PIPELINE
 # ============================
 try:
-    update_progress(0, "training", "Checking dataset...")
-
     # --- Dataset check ---
-    if not os.path.exists(DATA_PATH):
-        fail_training(f"Dataset not found at {DATA_PATH}")
-
-    df = pd.read_csv(DATA_PATH)
-    features = [
-        "f_main", "f_1", "f_2", "f_3",
-        "p_main", "p_dma1", "p_dma2", "p_dma3",
-        "pump_on", "comp_on", "s1", "s2", "s3"
-    ]
-    required_cols = features + ["leak_detected", "leak_location"]
-    missing_cols = [c for c in required_cols if c not in df.columns]
-
-    if missing_cols:
-        fail_training(f"Dataset missing columns: {missing_cols}")
-
-    update_progress(10, "training", "Dataset validated successfully.")
+    with tracker.stage("load", 0, "Loading dataset..."):
+        # Live readings: columnar store (plus any CSV not yet converted); missing columns are 0
+        df = load_dataset("pipeline", legacy_csv=DATA_PATH, root=os.path.join(MODEL_DIR, "store"))
+        if df.empty:
+            fail_training(f"No training data in the pipeline store or at {DATA_PATH}")
+    features = list(FEATURE_COLS)
 
     # --- Split data ---
-    update_progress(20, "training", "Splitting data into training and test sets...")
-    X = df[features]
-    y_detect = df["leak_detected"]
-    y_loc = df["leak_location"]
+    with tracker.stage("features", 20, "Splitting data into training and test sets..."):
+        # Same feature code as predict_leak.py (incl. pressure gradients)
+        X = get_pipeline(tuple(features)).transform_frame(df)
+        y_detect = df["leak_detected"]
+        y_loc = df["leak_location"]
 
-    X_train, X_test, y_train_d, y_test_d = train_test_split(X, y_detect, test_size=0.2, random_state=42)
-    X_train_l, X_test_l, y_train_l, y_test_l = train_test_split(X, y_loc, test_size=0.2, random_state=42)
+        X_train, X_test, y_train_d, y_test_d = train_test_split(X, y_detect, test_size=0.2, random_state=42)
+        X_train_l, X_test_l, y_train_l, y_test_l = train_test_split(X, y_loc, test_size=0.2, random_state=42)
 
     # --- Initialize models ---
-    update_progress(30, "training", "Initializing models...")
     clf_det = RandomForestClassifier(n_estimators=150, random_state=42)
     clf_loc = RandomForestClassifier(n_estimators=150, random_state=42)
 
-    # --- Train detection model ---
-    update_progress(50, "training", "Training detection model (leak detection)...")
-    clf_det.fit(X_train, y_train_d)
-    time.sleep(2)  # simulate computation
-
-    # --- Train location model ---
-    update_progress(75, "training", "Training location model (leak location)...")
-    clf_loc.fit(X_train_l, y_train_l)
-    time.sleep(2)  # simulate computation
+    # --- Train detection and location models (concurrently, sharing the cores) ---
+    with tracker.stage("fit", 50, "Training detection and location models..."):
+        run_parallel({
+            "detect": tracker.timed("fit_detect", lambda: clf_det.fit(X_train, y_train_d)),
+            "locate": tracker.timed("fit_locate", lambda: clf_loc.fit(X_train_l, y_train_l)),
+        }, args.n_jobs, models=(clf_det, clf_loc))
 
     # --- Evaluate models ---
-    update_progress(90, "training", "Evaluating models...")
-    pred_det = clf_det.predict(X_test)
-    pred_loc = clf_loc.predict(X_test_l)
+    with tracker.stage("evaluate", 90, "Evaluating models..."):
+        pred_det = clf_det.predict(X_test)
+        pred_loc = clf_loc.predict(X_test_l)
 
-    acc_det = round(accuracy_score(y_test_d, pred_det) * 100, 2)
-    acc_loc = round(accuracy_score(y_test_l, pred_loc) * 100, 2)
+        acc_det = round(accuracy_score(y_test_d, pred_det) * 100, 2)
+        acc_loc = round(accuracy_score(y_test_l, pred_loc) * 100, 2)
 
     # --- Save models ---
-    joblib.dump(clf_det, MODEL_DET_PATH)
-    joblib.dump(clf_loc, MODEL_LOC_PATH)
-    joblib.dump(features, FEATURES_PATH)
+    with tracker.stage("save", 95, "Saving models..."):
+        joblib.dump(clf_det, MODEL_DET_PATH)
+        joblib.dump(clf_loc, MODEL_LOC_PATH)
+        joblib.dump(features, FEATURES_PATH)
+        export_forest(clf_det, artifact_path(MODEL_DET_PATH))
+        export_forest(clf_loc, artifact_path(MODEL_LOC_PATH))
 
     # --- Save final results ---
     result = {
@@ -0,0 +1,206 @@
+"""
+Append-only columnar store for training data.
+
+Each dataset (e.g. "pipeline") is a directory of per-day segments plus a
+manifest:
+
+    storage/app/ml_models/store/pipeline/manifest.json
+    storage/app/ml_models/store/pipeline/2025-12-11.f32
+
+A segment is a flat run of little-endian float32 rows in CSV_COLS order
+(64 bytes per row), so:
+  - ingest is a single append (SensorDataController does it from PHP with pack('g*')),
+  - row counts come from file sizes alone,
+  - training memory-maps segments instead of parsing text.
+
+Usage:
+    python training_store.py convert pipeline_sensor_data.csv pipeline [--keep-csv]
+    python training_store.py count pipeline
+"""
+import os
+import json
+import glob
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from features import CSV_COLS
+from dataset import DTYPES, empty_frame, load_csv
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STORE_DIR = os.path.join(os.environ.get("ML_STORAGE_DIR") or os.path.join(BASE_DIR, "storage", "app", "ml_models"), "store")
+
+FORMAT_VERSION = 1
+ROW_DTYPE = np.dtype("<f4")
+ROW_BYTES = ROW_DTYPE.itemsize * len(CSV_COLS)
+SEGMENT_EXT = ".f32"
+LEGACY_PREFIX = "legacy-"
+
+
+class TrainingStore:
+    def __init__(self, dataset, root=STORE_DIR):
+        self.dataset = dataset
+        self.path = os.path.join(root, dataset)
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+
+    # ----------------------------------------------------------
+    # Metadata
+    # ----------------------------------------------------------
+    def ensure(self):
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(self.manifest_path):
+            manifest = {"format": FORMAT_VERSION, "columns": CSV_COLS, "dtype": ROW_DTYPE.str, "row_bytes": ROW_BYTES}
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w") as f: json.dump(manifest, f, indent=4)
+            os.replace(tmp, self.manifest_path)
+        return self
+
+    def check_manifest(self):
+        if not os.path.exists(self.manifest_path): return
+        with open(self.manifest_path) as f: manifest = json.load(f)
+        if manifest.get("columns") != CSV_COLS or manifest.get("row_bytes") != ROW_BYTES:
+            raise ValueError(f"Store {self.path} has an incompatible layout")
+
+    def segments(self):
+        """[(segment name, path, whole rows)] oldest first."""
+        out = []
+        for path in glob.glob(os.path.join(self.path, "*" + SEGMENT_EXT)):
+            name = os.path.basename(path)[:-len(SEGMENT_EXT)]
+            out.append((name, path, os.path.getsize(path) // ROW_BYTES))
+        return sorted(out, key=lambda s: _segment_order(s[0]))
+
+    def count(self):
+        """Row count from segment sizes; no data is read."""
+        return sum(rows for _, _, rows in self.segments())
+
+    # ----------------------------------------------------------
+    # Write
+    # ----------------------------------------------------------
+    def append(self, rows, segment=None):
+        """Append (n, len(CSV_COLS)) rows to a segment (default: today's)."""
+        rows = np.ascontiguousarray(rows, dtype=ROW_DTYPE).reshape(-1, len(CSV_COLS))
+        self.ensure()
+        path = os.path.join(self.path, (segment or date.today().isoformat()) + SEGMENT_EXT)
+        with open(path, "ab") as f:
+            _lock(f)
+            try:
+                f.seek(0, os.SEEK_END)
+                # A torn write from a crashed writer must not shift later rows
+                misaligned = f.tell() % ROW_BYTES
+                if misaligned: f.truncate(f.tell() - misaligned)
+                f.write(rows.tobytes())
+            finally:
+                _unlock(f)
+        return len(rows)
+
+    def append_frame(self, df, segment=None):
+        rows = np.zeros((len(df), len(CSV_COLS)), dtype=ROW_DTYPE)
+        for i, col in enumerate(CSV_COLS):
+            if col in df.columns: rows[:, i] = df[col].to_numpy(dtype=np.float64, na_value=0)
+        return self.append(rows, segment)
+
+    # ----------------------------------------------------------
+    # Read
+    # ----------------------------------------------------------
+    def named_arrays(self):
+        """[(segment name, read-only memory map of shape (rows, len(CSV_COLS)))]"""
+        self.check_manifest()
+        out = []
+        for name, path, rows in self.segments():
+            if rows == 0: continue
+            out.append((name, np.memmap(path, dtype=ROW_DTYPE, mode="r", shape=(rows, len(CSV_COLS)))))
+        return out
+
+    def arrays(self):
+        """Read-only memory maps, one (rows, len(CSV_COLS)) array per segment."""
+        return [a for _, a in self.named_arrays()]
+
+    def watermark(self):
+        """{segment name: rows} snapshot; pass to load(since=...) to read only newer rows."""
+        return {name: rows for name, _, rows in self.segments()}
+
+    def load(self, since=None, until=None):
+        """
+        DataFrame with the same compact dtypes as dataset.load_csv().
+        `since` / `until` are watermarks bounding which rows of each segment are read.
+        """
+        since = since or {}
+        parts = [a[since.get(name, 0):until[name] if until is not None else None]
+                 for name, a in self.named_arrays() if until is None or name in until]
+        parts = [a for a in parts if len(a) > 0]
+        if not parts: return empty_frame()
+        matrix = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return pd.DataFrame({c: matrix[:, i].astype(DTYPES[c]) for i, c in enumerate(CSV_COLS)}, copy=False)
+
+
+def _segment_order(name):
+    # "legacy-2025-11-20" (converted CSV) sorts before the live "2025-11-20" segment
+    legacy = name.startswith(LEGACY_PREFIX)
+    return (name[len(LEGACY_PREFIX):] if legacy else name, not legacy)
+
+
+def _lock(f):
+    try:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    except ImportError:
+        pass
+
+
+def _unlock(f):
+    try:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    except ImportError:
+        pass
+
+
+def load_dataset(dataset, legacy_csv=None, root=STORE_DIR, since=None, until=None):
+    """
+    Store rows plus any not-yet-converted legacy CSV rows.
+    With a watermark (`since`) only store rows appended after it are returned.
+    """
+    frames = [TrainingStore(dataset, root).load(since, until)]
+    if legacy_csv and since is None: frames.append(load_csv(legacy_csv))
+    frames = [f for f in frames if not f.empty]
+    if not frames: return empty_frame()
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def convert_csv(csv_path, dataset, keep_csv=False, root=STORE_DIR):
+    """One-shot migration of a training CSV into a store segment."""
+    df = load_csv(csv_path)
+    store = TrainingStore(dataset, root)
+    segment = LEGACY_PREFIX + date.fromtimestamp(os.path.getmtime(csv_path)).isoformat() if os.path.exists(csv_path) else None
+    rows = store.append_frame(df, segment) if not df.empty else 0
+
+    # Move the CSV aside so its rows are not read twice
+    if not keep_csv and os.path.exists(csv_path):
+        os.replace(csv_path, csv_path + ".migrated")
+    return {"status": "success", "dataset": dataset, "rows_converted": rows, "rows_total": store.count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar training data store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_conv = sub.add_parser("convert", help="Import a training CSV")
+    p_conv.add_argument("csv")
+    p_conv.add_argument("dataset")
+    p_conv.add_argument("--keep-csv", action="store_true")
+
+    p_count = sub.add_parser("count", help="Row count from metadata")
+    p_count.add_argument("dataset")
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        print(json.dumps(convert_csv(args.csv, args.dataset, args.keep_csv)))
+    else:
+        store = TrainingStore(args.dataset)
+        print(json.dumps({"dataset": args.dataset, "rows": store.count(), "segments": len(store.segments())}))
+
+
+if __name__ == "__main__":
+    main()
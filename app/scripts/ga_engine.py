@@ -0,0 +1,307 @@
+# scripts/ga_engine.py
+"""
+Genetic-algorithm sample selector with a parallel fitness engine.
+
+A chromosome is a bit-packed mask (np.packbits layout, 8 genes per byte)
+over genes; a gene is a training row, a block of consecutive rows, or a
+cluster of similar rows (see GeneLayout). Its fitness is the
+validation accuracy of a forest fitted on the selected rows (plus a small
+diversity reward), which makes fitness calls the whole cost of a GA run.
+The engine therefore:
+
+  - evaluates a generation in parallel on a process pool. X_train / X_val
+    live in shared memory that the workers attach to once, so only the
+    packed chromosomes cross the process boundary;
+  - memoizes fitness by a hash of the selected subset, so elites and
+    repeated children are never refitted;
+  - scores early generations with a cheap proxy model (few shallow extra
+    trees) and switches to the full forest for the remaining generations.
+"""
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import accuracy_score
+
+MODELS = {
+    # Full model: what the original per-call fit used
+    "full": lambda: RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=1),
+    # Proxy: ranks subsets nearly the same way at a fraction of the cost
+    "proxy": lambda: ExtraTreesClassifier(n_estimators=15, max_depth=8, random_state=42, n_jobs=1),
+}
+
+
+# ==============================
+# GENE LAYOUT
+# ==============================
+class GeneLayout:
+    """
+    Maps genes to training rows. `groups[row]` is the gene owning that row;
+    groups=None means one gene per row.
+    """
+
+    def __init__(self, num_rows, num_genes, groups=None, unit="row"):
+        self.num_rows = num_rows
+        self.num_genes = num_genes
+        self.groups = groups
+        self.unit = unit
+
+    @property
+    def num_bytes(self):
+        return -(-self.num_genes // 8)
+
+    def rows(self, packed, groups=None):
+        """Selected row indices of a packed chromosome."""
+        bits = np.unpackbits(packed, count=self.num_genes).view(bool)
+        groups = self.groups if groups is None else groups
+        return np.flatnonzero(bits if groups is None else bits[groups])
+
+    def describe(self):
+        return {"unit": self.unit, "genes": self.num_genes, "rows": self.num_rows}
+
+
+def row_layout(num_rows):
+    return GeneLayout(num_rows, num_rows)
+
+
+def block_layout(num_rows, block_size):
+    """Genes are runs of `block_size` consecutive rows."""
+    groups = (np.arange(num_rows) // block_size).astype(np.int32)
+    return GeneLayout(num_rows, int(groups[-1]) + 1 if num_rows else 0, groups, unit=f"block:{block_size}")
+
+
+def cluster_layout(X, n_clusters, seed=42):
+    """Genes are k-means clusters of similar rows (empty clusters simply select nothing)."""
+    n_clusters = min(n_clusters, len(X))
+    km = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3, batch_size=4096)
+    groups = km.fit_predict(X).astype(np.int32)
+    return GeneLayout(len(X), n_clusters, groups, unit=f"cluster:{n_clusters}")
+
+
+# ==============================
+# SHARED MEMORY
+# ==============================
+def share_array(arr):
+    """Copy `arr` into a new shared-memory block; returns (block, spec for attach_array)."""
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def attach_array(spec):
+    name, shape, dtype = spec
+    try:
+        # The creating process owns (and unlinks) the block
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+# Per-process view of the shared data (set by _init_worker, or directly when running in-process)
+_DATA = {}
+_BLOCKS = []
+
+
+def _init_worker(specs, layout):
+    for key, spec in specs.items():
+        shm, arr = attach_array(spec)
+        _BLOCKS.append(shm)
+        _DATA[key] = arr
+    _DATA["layout"] = layout
+
+
+# ==============================
+# FITNESS
+# ==============================
+def subset_fitness(packed, model, min_samples):
+    indices = _DATA["layout"].rows(packed, _DATA.get("groups"))
+    if len(indices) < min_samples:
+        return 0.0  # Skip too-small subsets
+    X_sub, y_sub = _DATA["X_train"][indices], _DATA["y_train"][indices]
+    if len(np.unique(y_sub)) < 2:
+        return 0.0
+    clf = MODELS[model]()
+    clf.fit(X_sub, y_sub)
+    acc = accuracy_score(_DATA["y_val"], clf.predict(_DATA["X_val"]))
+    diversity = np.std(X_sub.mean(axis=0))  # Diversity reward
+    return float(acc * 0.9 + diversity * 0.1)
+
+
+def subset_key(packed):
+    """Hash of the selected subset (the packed gene mask identifies it)."""
+    return hashlib.blake2b(packed.tobytes(), digest_size=16).hexdigest()
+
+
+class FitnessEngine:
+    """Parallel, memoized fitness for a population of packed gene masks."""
+
+    def __init__(self, X_train, y_train, X_val, y_val, workers=None, min_samples=100, layout=None):
+        self.layout = layout or row_layout(len(X_train))
+        self.min_samples = min_samples
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+
+        data = {"X_train": X_train, "y_train": y_train, "X_val": X_val, "y_val": y_val}
+        if self.layout.groups is not None: data["groups"] = self.layout.groups
+        # Workers get the layout without its (shared) groups array
+        worker_layout = GeneLayout(self.layout.num_rows, self.layout.num_genes, unit=self.layout.unit)
+
+        self._blocks = []
+        self._pool = None
+        if self.workers > 1:
+            specs = {}
+            for key, arr in data.items():
+                shm, specs[key] = share_array(arr)
+                self._blocks.append(shm)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(specs, worker_layout))
+        else:
+            _DATA.clear()
+            _DATA.update({k: np.ascontiguousarray(v) for k, v in data.items()})
+            _DATA["layout"] = worker_layout
+
+    def evaluate(self, population, model="full"):
+        """Fitness per row of `population`; only subsets not seen before are fitted."""
+        keys = [(model, subset_key(sol)) for sol in population]
+        todo = {}
+        for key, sol in zip(keys, population):
+            if key in self.cache or key in todo: continue
+            todo[key] = sol
+        self.cache_hits += len(keys) - len(todo)
+        self.evaluations += len(todo)
+
+        if todo:
+            sols = list(todo.values())
+            if self._pool is not None:
+                chunk = max(1, len(sols) // (self.workers * 2))
+                scores = list(self._pool.map(subset_fitness, sols, [model] * len(sols),
+                                             [self.min_samples] * len(sols), chunksize=chunk))
+            else:
+                scores = [subset_fitness(s, model, self.min_samples) for s in sols]
+            self.cache.update(zip(todo.keys(), scores))
+
+        return np.array([self.cache[k] for k in keys])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==============================
+# GENETIC ALGORITHM
+# ==============================
+class GeneticSelector:
+    """
+    GA over packed gene masks: rank parent selection, single-point crossover,
+    random bit-flip mutation and elitism (same settings as the former pygad setup).
+    Crossover and mutation work on the packed bytes of the whole population at once.
+    """
+
+    def __init__(self, engine, num_generations=10, sol_per_pop=12, num_parents_mating=6,
+                 keep_elitism=2, crossover_probability=0.8, mutation_percent_genes=5,
+                 proxy_generations=5, stop_fitness=0.999, seed=42):
+        self.engine = engine
+        self.layout = engine.layout
+        self.num_genes = self.layout.num_genes
+        self.num_generations = num_generations
+        self.sol_per_pop = sol_per_pop
+        self.num_parents_mating = num_parents_mating
+        self.keep_elitism = keep_elitism
+        self.crossover_probability = crossover_probability
+        self.mutation_rate = mutation_percent_genes / 100.0
+        self.proxy_generations = proxy_generations
+        self.stop_fitness = stop_fitness
+        self.rng = np.random.default_rng(seed)
+        self.history = []
+
+    def _initial_population(self):
+        population = self.rng.integers(0, 256, size=(self.sol_per_pop, self.layout.num_bytes), dtype=np.uint8)
+        # Padding bits past the last gene stay 0 (so equal subsets hash equally)
+        pad = self.layout.num_bytes * 8 - self.num_genes
+        if pad: population[:, -1] &= np.uint8((0xFF << pad) & 0xFF)
+        return population
+
+    def _select_parents(self, population, fitness):
+        # Rank selection: probability proportional to rank (worst = 1)
+        ranks = np.empty(len(fitness))
+        ranks[np.argsort(fitness)] = np.arange(1, len(fitness) + 1)
+        idx = self.rng.choice(len(population), size=self.num_parents_mating, replace=False, p=ranks / ranks.sum())
+        return population[idx]
+
+    def _crossover(self, first, second):
+        """Single-point crossover on packed rows: genes >= point come from `second`."""
+        n, num_bytes = first.shape
+        points = self.rng.integers(1, max(2, self.num_genes), size=n)
+        points[self.rng.random(n) >= self.crossover_probability] = self.num_genes  # no crossover
+
+        byte_idx = np.arange(num_bytes)
+        cut = points[:, None] >> 3
+        # Bits are MSB-first within a byte; the cut byte keeps its high (point % 8) bits
+        partial = (0xFF >> (points[:, None] & 7)).astype(np.uint8)
+        mask = np.where(byte_idx > cut, np.uint8(0xFF), np.where(byte_idx == cut, partial, np.uint8(0)))
+        return (first & ~mask) | (second & mask)
+
+    def _mutate(self, children):
+        """Flip each gene with probability mutation_rate, touching only the flipped bytes."""
+        n = len(children)
+        counts = self.rng.binomial(self.num_genes, self.mutation_rate, size=n)
+        rows = np.repeat(np.arange(n), counts)
+        genes = self.rng.integers(0, self.num_genes, size=int(counts.sum()))
+        np.bitwise_xor.at(children, (rows, genes >> 3), (0x80 >> (genes & 7)).astype(np.uint8))
+        return children
+
+    def _offspring(self, parents, n):
+        pairs = self.rng.integers(0, len(parents), size=(n, 2))
+        children = self._crossover(parents[pairs[:, 0]], parents[pairs[:, 1]])
+        return self._mutate(children)
+
+    def run(self):
+        population = self._initial_population()
+        best, best_fitness = population[0], -1.0
+
+        for gen in range(self.num_generations):
+            model = "proxy" if gen < self.proxy_generations else "full"
+            fitness = self.engine.evaluate(population, model)
+            top = int(np.argmax(fitness))
+            if model == "full" and fitness[top] > best_fitness:
+                best, best_fitness = population[top].copy(), float(fitness[top])
+            self.history.append({"generation": gen, "model": model, "best": float(fitness[top]),
+                                 "mean": float(fitness.mean())})
+
+            if model == "full" and best_fitness >= self.stop_fitness: break
+            if gen == self.num_generations - 1: break
+
+            elite = population[np.argsort(fitness)[::-1][:self.keep_elitism]]
+            parents = self._select_parents(population, fitness)
+            children = self._offspring(parents, self.sol_per_pop - len(elite))
+            population = np.concatenate([elite, children])
+
+        if best_fitness < 0:
+            # Every generation used the proxy: confirm the final population with the full model
+            fitness = self.engine.evaluate(population, "full")
+            top = int(np.argmax(fitness))
+            best, best_fitness = population[top].copy(), float(fitness[top])
+
+        return best, best_fitness
+
+    def selected_rows(self, packed):
+        return self.layout.rows(packed)
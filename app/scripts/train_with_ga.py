@@ -4,114 +4,130 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
-import joblib, json, os, sys
+import joblib, json, os, sys, time, argparse
 from datetime import datetime
-import pygad
-
-# ==============================
-# LOAD & PREPARE DATA
-# ==============================
-try:
-    df = pd.read_csv("pipeline_sensor_data.csv")
-except FileNotFoundError:
-    print("❌ Dataset not found. Please ensure pipeline_sensor_data.csv exists.")
-    sys.exit(1)
-
-features = [
-    "f_main", "f_1", "f_2", "f_3",
-    "p_main", "p_dma1", "p_dma2", "p_dma3",
-    "pump_on", "comp_on", "s1", "s2", "s3"
-]
-
-if not all(f in df.columns for f in features + ["leak_detected", "leak_location"]):
-    print("❌ Missing required columns in dataset.")
-    sys.exit(1)
-
-X = df[features].values
-y_det = df["leak_detected"].values
-y_loc = df["leak_location"].values
-
-X_train, X_val, y_train_det, y_val_det = train_test_split(X, y_det, test_size=0.2, random_state=42)
-_, X_val_loc, _, y_val_loc = train_test_split(X, y_loc, test_size=0.2, random_state=42)
-
-print(f"✅ Dataset loaded: {len(X)} samples, {len(features)} features")
-
-# ==============================
-# GENETIC ALGORITHM SETUP
-# ==============================
-def fitness_func(solution, solution_idx):
-    indices = np.where(solution == 1)[0]
-    if len(indices) < 100:
-        return 0  # Skip too-small subsets
-    X_sub, y_sub = X_train[indices], y_train_det[indices]
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X_sub, y_sub)
-    preds = model.predict(X_val)
-    acc = accuracy_score(y_val_det, preds)
-    diversity = np.std(X_sub.mean(axis=0))  # Diversity reward
-    return acc * 0.9 + diversity * 0.1
-
-ga_instance = pygad.GA(
-    num_generations=10,
-    num_parents_mating=6,
-    fitness_func=fitness_func,
-    sol_per_pop=12,
-    num_genes=X_train.shape[0],
-    gene_space=[0, 1],
-    parent_selection_type="rank",
-    keep_elitism=2,
-    crossover_probability=0.8,
-    mutation_percent_genes=5,
-    mutation_type="random",
-    stop_criteria=["reach_0.999"]
-)
-
-print("🚀 Starting Genetic Algorithm optimization...")
-ga_instance.run()
-print("✅ Genetic Algorithm completed.")
-
-# ==============================
-# USE BEST SUBSET FOR TRAINING
-# ==============================
-best_solution, best_fitness, _ = ga_instance.best_solution()
-selected_indices = np.where(best_solution == 1)[0]
-print(f"📊 Selected {len(selected_indices)} optimal samples for retraining.")
-
-X_opt = X_train[selected_indices]
-y_opt_det = y_train_det[selected_indices]
-y_opt_loc = y_loc[selected_indices]
-
-clf_det = RandomForestClassifier(n_estimators=150, random_state=42)
-clf_det.fit(X_opt, y_opt_det)
-
-clf_loc = RandomForestClassifier(n_estimators=150, random_state=42)
-clf_loc.fit(X_opt, y_opt_loc)
-
-pred_det = clf_det.predict(X_val)
-pred_loc = clf_loc.predict(X_val_loc)
-
-acc_det = accuracy_score(y_val_det, pred_det) * 100
-acc_loc = accuracy_score(y_val_loc, pred_loc) * 100
-
-# ==============================
-# SAVE MODELS & METRICS
-# ==============================
-os.makedirs("models", exist_ok=True)
-joblib.dump(clf_det, "models/rf_leak_detect.joblib")
-joblib.dump(clf_loc, "models/rf_leak_locate.joblib")
-joblib.dump(features, "models/feature_cols.joblib")
-
-metrics = {
-    "leak_detection_accuracy": round(acc_det, 2),
-    "leak_location_accuracy": round(acc_loc, 2),
-    "selected_samples": int(len(selected_indices)),
-    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-}
-
-print(json.dumps(metrics, indent=4))
-
-# Save training summary
-with open("models/training_summary.json", "w") as f:
-    json.dump(metrics, f, indent=4)
-
-print("✅ Models retrained and saved successfully.")
+
+from ga_engine import FitnessEngine, GeneticSelector, row_layout, block_layout, cluster_layout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="Fitness worker processes (default: all cores)")
+    parser.add_argument("--generations", type=int, default=10)
+    parser.add_argument("--proxy-generations", type=int, default=5,
+                        help="Early generations scored with the cheap proxy model")
+    parser.add_argument("--unit", choices=["row", "block", "cluster"], default="row",
+                        help="Gene granularity: single rows, blocks of consecutive rows, or k-means clusters")
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=1024)
+    args = parser.parse_args()
+
+    # ==============================
+    # LOAD & PREPARE DATA
+    # ==============================
+    try:
+        df = pd.read_csv("pipeline_sensor_data.csv")
+    except FileNotFoundError:
+        print("❌ Dataset not found. Please ensure pipeline_sensor_data.csv exists.")
+        sys.exit(1)
+
+    features = [
+        "f_main", "f_1", "f_2", "f_3",
+        "p_main", "p_dma1", "p_dma2", "p_dma3",
+        "pump_on", "comp_on", "s1", "s2", "s3"
+    ]
+
+    if not all(f in df.columns for f in features + ["leak_detected", "leak_location"]):
+        print("❌ Missing required columns in dataset.")
+        sys.exit(1)
+
+    X = df[features].values
+    y_det = df["leak_detected"].values
+    y_loc = df["leak_location"].values
+
+    X_train, X_val, y_train_det, y_val_det, y_train_loc, y_val_loc = train_test_split(
+        X, y_det, y_loc, test_size=0.2, random_state=42)
+
+    print(f"✅ Dataset loaded: {len(X)} samples, {len(features)} features")
+
+    # ==============================
+    # GENETIC ALGORITHM
+    # ==============================
+    print("🚀 Starting Genetic Algorithm optimization...")
+    start = time.perf_counter()
+    if args.unit == "block":
+        layout = block_layout(len(X_train), args.block_size)
+    elif args.unit == "cluster":
+        layout = cluster_layout(X_train, args.clusters)
+    else:
+        layout = row_layout(len(X_train))
+
+    with FitnessEngine(X_train, y_train_det, X_val, y_val_det, workers=args.workers, layout=layout) as engine:
+        ga = GeneticSelector(
+            engine,
+            num_generations=args.generations,
+            sol_per_pop=12,
+            num_parents_mating=6,
+            keep_elitism=2,
+            crossover_probability=0.8,
+            mutation_percent_genes=5,
+            proxy_generations=args.proxy_generations,
+            stop_fitness=0.999,
+        )
+        best_solution, best_fitness = ga.run()
+    print(f"✅ Genetic Algorithm completed in {time.perf_counter() - start:.1f}s "
+          f"({engine.evaluations} fits, {engine.cache_hits} cached).")
+
+    # ==============================
+    # USE BEST SUBSET FOR TRAINING
+    # ==============================
+    selected_indices = ga.selected_rows(best_solution)
+    print(f"📊 Selected {len(selected_indices)} optimal samples for retraining.")
+
+    X_opt = X_train[selected_indices]
+    y_opt_det = y_train_det[selected_indices]
+    y_opt_loc = y_train_loc[selected_indices]
+
+    clf_det = RandomForestClassifier(n_estimators=150, random_state=42, n_jobs=-1)
+    clf_det.fit(X_opt, y_opt_det)
+
+    clf_loc = RandomForestClassifier(n_estimators=150, random_state=42, n_jobs=-1)
+    clf_loc.fit(X_opt, y_opt_loc)
+
+    pred_det = clf_det.predict(X_val)
+    pred_loc = clf_loc.predict(X_val)
+
+    acc_det = accuracy_score(y_val_det, pred_det) * 100
+    acc_loc = accuracy_score(y_val_loc, pred_loc) * 100
+
+    # ==============================
+    # SAVE MODELS & METRICS
+    # ==============================
+    os.makedirs("models", exist_ok=True)
+    joblib.dump(clf_det.set_params(n_jobs=None), "models/rf_leak_detect.joblib")
+    joblib.dump(clf_loc.set_params(n_jobs=None), "models/rf_leak_locate.joblib")
+    joblib.dump(features, "models/feature_cols.joblib")
+
+    metrics = {
+        "leak_detection_accuracy": round(acc_det, 2),
+        "leak_location_accuracy": round(acc_loc, 2),
+        "selected_samples": int(len(selected_indices)),
+        "ga_best_fitness": round(best_fitness, 4),
+        "ga_genes": layout.describe(),
+        "ga_fitness_evaluations": engine.evaluations,
+        "ga_cache_hits": engine.cache_hits,
+        "ga_generations": ga.history,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    print(json.dumps(metrics, indent=4))
+
+    # Save training summary
+    with open("models/training_summary.json", "w") as f:
+        json.dump(metrics, f, indent=4)
+
+    print("✅ Models retrained and saved successfully.")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,13 @@
         'region' => env('AWS_DEFAULT_REGION', 'us-east-1'),
     ],
 
+    'ml' => [
+        // Long-lived app/ml/predict_server.py; leave both empty to spawn predict_leak.py per reading
+        'predict_url' => env('ML_PREDICT_URL'),
+        'predict_socket' => env('ML_PREDICT_SOCKET'),
+        'predict_timeout' => env('ML_PREDICT_TIMEOUT', 2),
+    ],
+
     'slack' => [
         'notifications' => [
             'bot_user_oauth_token' => env('SLACK_BOT_USER_OAUTH_TOKEN'),
@@ -1,8 +1,11 @@
 <?php
 
+use App\Http\Controllers\Api\SensorDataController;
 use Illuminate\Foundation\Inspiring;
 use Illuminate\Support\Facades\Artisan;
+use Illuminate\Support\Facades\Log;
 use Illuminate\Support\Facades\Schedule;
+use Symfony\Component\Process\Process;
 
 // Default Laravel example command
 Artisan::command('inspire', function () {
@@ -22,3 +25,71 @@
     ->withoutOverlapping()
     ->onOneServer()
     ->sendOutputTo(storage_path('logs/ml_autotrain.log'));
+
+// ===========================================================
+// 🗜️ TRAINING HISTORY RETENTION
+// ===========================================================
+
+// Folds day segments of the live training store that are older than a week
+// and already trained on into a bounded, stratified reservoir (app/ml/retention.py).
+// Manually: php artisan ml:compact --keep-days=7 --capacity=5000
+Artisan::command('ml:compact {--keep-days=7} {--capacity=}', function () {
+    $isWindows = strtoupper(substr(PHP_OS, 0, 3)) === 'WIN';
+    $pythonExe = base_path($isWindows ? 'venv\Scripts\python.exe' : 'venv/bin/python');
+    if (!file_exists($pythonExe)) $pythonExe = 'python';
+
+    $cmd = [$pythonExe, base_path('app/ml/retention.py'), 'compact', '--keep-days', (string) (int) $this->option('keep-days')];
+    if ($this->option('capacity')) array_push($cmd, '--capacity', (string) (int) $this->option('capacity'));
+
+    $process = new Process($cmd, base_path());
+    $process->setTimeout(1800);
+    $process->run();
+
+    $output = trim($process->getOutput());
+    $this->line($output);
+    if (!$process->isSuccessful()) {
+        Log::error('ml:compact failed: ' . $process->getErrorOutput());
+        return 1;
+    }
+    Log::info('ml:compact finished', json_decode($output, true) ?? []);
+    return 0;
+})->purpose('Compact old training data into a bounded stratified reservoir');
+
+// ✅ Before the daily retraining, so it trains on the compacted history
+Schedule::command('ml:compact')
+    ->dailyAt('02:30')
+    ->withoutOverlapping()
+    ->onOneServer()
+    ->sendOutputTo(storage_path('logs/ml_compact.log'));
+
+// ===========================================================
+// 🔐 DEVICE PAYLOAD TEST VECTORS
+// ===========================================================
+
+// Rewrites every ciphertext in tests/fixtures/simon_ctr_vectors.json with
+// SensorDataController::simon_decrypt_ctr (CTR is symmetric), so the vectors
+// app/ml/payload_decoder.py is checked against come from PHP itself.
+// Manually: php artisan ml:simon-vectors
+Artisan::command('ml:simon-vectors', function () {
+    $path = base_path('tests/fixtures/simon_ctr_vectors.json');
+    $fixture = json_decode(file_get_contents($path), true);
+    $key = hex2bin($fixture['key_hex']);
+
+    $decrypt = new ReflectionMethod(SensorDataController::class, 'simon_decrypt_ctr');
+    $decrypt->setAccessible(true);
+    $controller = new SensorDataController();
+
+    $changed = [];
+    foreach ($fixture['vectors'] as &$vector) {
+        $cipherHex = strtoupper(bin2hex($decrypt->invoke($controller, bin2hex($vector['plaintext']), $vector['nonce'], $key)));
+        if ($cipherHex !== strtoupper($vector['ciphertext_hex'])) $changed[] = $vector['name'];
+        $vector['ciphertext_hex'] = $cipherHex;
+    }
+    unset($vector);
+    $fixture['source'] = 'SensorDataController::simon_decrypt_ctr (PHP ' . PHP_VERSION . ')';
+
+    file_put_contents($path, json_encode($fixture, JSON_PRETTY_PRINT | JSON_UNESCAPED_SLASHES | JSON_UNESCAPED_UNICODE) . "\n");
+    $this->info(count($fixture['vectors']) . " vectors written to {$path}");
+    if ($changed) $this->warn('Ciphertexts changed (payload_decoder.py disagrees with PHP): ' . implode(', ', $changed));
+    return 0;
+})->purpose('Regenerate the shared device payload test vectors from the PHP decryptor');
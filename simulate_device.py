@@ -1,8 +1,32 @@
-import requests
+"""
+Device simulator / ingest load generator for POST /api/sensor-data.
+
+Default mode behaves like the original simulator: one MASTER_NODE reading
+every 2 seconds, printing truth vs. ML verdict.
+
+Load mode (--rate) drives many virtual devices (MASTER_NODE_1..N, each
+sending its own sensorId) from one asyncio loop over a pool of keep-alive connections. Requests follow a fixed-rate
+schedule (request i is due at start + i / rate) and latency is measured from
+that due time, not from when a connection became free, so a slow server
+cannot hide its backlog (coordinated omission). At the end the achieved
+throughput and latency percentiles are reported.
+
+Usage:
+    python simulate_device.py                                   # watch mode against API_URL
+    python simulate_device.py --rate 500 --devices 200 --duration 30 --url http://127.0.0.1:8000/api/sensor-data
+    python simulate_device.py --local --rate 2000 --duration 10  # against the local stand-in server
+    python simulate_device.py --serve --port 8089                # run only the stand-in server
+"""
+import sys
+import ssl
+import json
 import time
 import random
-import json
+import asyncio
+import argparse
+import multiprocessing
 from datetime import datetime
+from urllib.parse import urlsplit
 
 # ==========================================
 # ⚙️ CONFIGURATION
@@ -10,10 +34,10 @@ from datetime import datetime
 API_URL = "http://217.216.32.69/api/sensor-data"
 DELAY_SECONDS = 2  # Fast updates
 
-def generate_system_state(sequence_id):
+def generate_system_state(sequence_id, sensor_id="MASTER_NODE"):
     # Base Data (Idle)
     data = {
-        "sensorId": "MASTER_NODE",
+        "sensorId": sensor_id,
         "pump_on": 1,
         "comp_on": 0,
         "f_main": random.uniform(0, 5), "p_main": random.uniform(50, 55), "s1": 0,
@@ -86,38 +110,310 @@ def generate_system_state(sequence_id):
 
     return data, status_label
 
-def run_simulation():
-    print(f"🚀 Training Simulator Started (Aggressive Mode)")
-    print(f"📡 Target: {API_URL}")
-    print("---------------------------------------------------")
+# ==========================================
+# 🔌 KEEP-ALIVE HTTP/1.1 CLIENT
+# ==========================================
+class HttpConnection:
+    def __init__(self, host, port, use_ssl):
+        self.host, self.port, self.use_ssl = host, port, use_ssl
+        self.reader = self.writer = None
+
+    async def open(self):
+        ctx = ssl.create_default_context() if self.use_ssl else None
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=ctx)
+
+    def close(self):
+        if self.writer: self.writer.close()
+        self.reader = self.writer = None
+
+    async def post_json(self, path, body, host_header):
+        if self.writer is None: await self.open()
+        head = (f"POST {path} HTTP/1.1\r\nHost: {host_header}\r\n"
+                f"Content-Type: application/json\r\nAccept: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line: raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = b""
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                payload += await self.reader.readexactly(size)
+                await self.reader.readline()
+        else:
+            payload = await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection", "").lower() == "close": self.close()
+        return status, payload
+
+
+class ConnectionPool:
+    """Fixed set of keep-alive connections shared by all virtual devices."""
+
+    def __init__(self, url, size):
+        parts = urlsplit(url)
+        self.use_ssl = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.host_header = parts.netloc
+        self.idle = asyncio.Queue()
+        for _ in range(size): self.idle.put_nowait(HttpConnection(self.host, self.port, self.use_ssl))
+
+    async def post(self, payload):
+        """(status, body, time the request actually went out on a connection)"""
+        conn = await self.idle.get()
+        try:
+            sent = time.perf_counter()
+            status, body = await conn.post_json(self.path, payload, self.host_header)
+            return status, body, sent
+        except Exception:
+            conn.close()  # reconnect on next use
+            raise
+        finally:
+            self.idle.put_nowait(conn)
+
+    def close(self):
+        while not self.idle.empty(): self.idle.get_nowait().close()
+
+# ==========================================
+# 📈 LOAD RUN
+# ==========================================
+def percentile(sorted_values, q):
+    if not sorted_values: return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []       # from scheduled send time (coordinated-omission corrected)
+        self.service_times = []   # from actual send time
+        self.statuses = {}
+        self.errors = 0
+        self.truth_hits = 0
+        self.truth_total = 0
+
+    def report(self, elapsed, scheduled, rate):
+        lat = sorted(self.latencies)
+        svc = sorted(self.service_times)
+        ms = lambda values, q: round(percentile(values, q) * 1000, 2)
+        done = len(lat)
+        return {
+            "target_rate": rate,
+            "scheduled": scheduled,
+            "completed": done,
+            "errors": self.errors,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "elapsed_s": round(elapsed, 2),
+            "throughput_rps": round(done / elapsed, 1) if elapsed > 0 else 0.0,
+            "latency_ms": {f"p{q}": ms(lat, q) for q in (50, 90, 99, 99.9)} | {"max": ms(lat, 100)},
+            "service_time_ms": {f"p{q}": ms(svc, q) for q in (50, 90, 99, 99.9)} | {"max": ms(svc, 100)},
+            "ml_agreement": round(self.truth_hits / self.truth_total, 3) if self.truth_total else None,
+        }
+
+
+async def send_one(pool, stats, sensor_id, seq, due, verbose):
+    data, status_label = generate_system_state(seq, sensor_id)
+    body = json.dumps(data).encode("utf-8")
 
-    counter = 0
+    try:
+        status, payload, sent = await pool.post(body)
+    except Exception as e:
+        stats.errors += 1
+        if verbose: print(f"❌ Connection Error: {str(e)}")
+        return
+    done = time.perf_counter()
+
+    stats.latencies.append(done - due)
+    stats.service_times.append(done - sent)
+    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    if status == 200:
+        try:
+            res_json = json.loads(payload or b"{}")
+        except ValueError:
+            res_json = {}
+        if 'ml_leak_detected' in res_json:
+            stats.truth_total += 1
+            stats.truth_hits += int(bool(res_json['ml_leak_detected']) == bool(data['simulated_leak']))
+        if verbose:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            # We check what the ML thought vs what we Sent
+            ml_thought = "🚨 DETECTED" if res_json.get('ml_leak_detected') else "Safe"
+            truth = "🚨 LEAK" if data['simulated_leak'] == 1 else "Safe"
+            print(f"[{timestamp}] {status_label:<20} | Truth: {truth:<7} | ML Says: {ml_thought}")
+    elif verbose:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ ERROR {status}")
+
+
+async def run_load(url, rate, devices, duration, connections, max_in_flight, verbose=False):
+    pool = ConnectionPool(url, connections)
+    stats = Stats()
+    in_flight = set()
+    scheduled = 0
+    start = time.perf_counter()
+    total = int(rate * duration) if duration else None
+    # One device keeps the original MASTER_NODE id
+    sensor_ids = ["MASTER_NODE"] if devices == 1 else [f"MASTER_NODE_{i + 1}" for i in range(devices)]
+
+    try:
+        while total is None or scheduled < total:
+            due = start + scheduled / rate
+            delay = due - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+
+            # Bound memory when the server falls far behind; the due time keeps counting
+            while len(in_flight) >= max_in_flight:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+            sensor_id = sensor_ids[scheduled % devices]
+            task = asyncio.ensure_future(send_one(pool, stats, sensor_id, scheduled // devices, due, verbose))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            scheduled += 1
+
+        if in_flight: await asyncio.wait(in_flight)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        for task in in_flight: task.cancel()
+    finally:
+        pool.close()
+
+    return stats.report(time.perf_counter() - start, scheduled, rate)
+
+# ==========================================
+# 🧪 LOCAL STAND-IN SERVER
+# ==========================================
+async def _handle_client(reader, writer, delay):
     try:
         while True:
-            counter += 1
-            data, status_label = generate_system_state(counter)
+            request_line = await reader.readline()
+            if not request_line: break
+            length = 0
+            close = False
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""): break
+                key, _, value = line.decode("latin-1").partition(":")
+                key = key.strip().lower()
+                if key == "content-length": length = int(value)
+                elif key == "connection" and value.strip().lower() == "close": close = True
+            body = await reader.readexactly(length) if length else b"{}"
 
+            if delay: await asyncio.sleep(delay)
             try:
-                response = requests.post(API_URL, json=data)
-                timestamp = datetime.now().strftime("%H:%M:%S")
+                data = json.loads(body)
+                status = 200 if "f_main" in data else 400
+            except ValueError:
+                data, status = {}, 400
+            # Same shape as SensorDataController::store; "ML" echoes the simulated truth
+            out = {"status": "success", "ml_leak_detected": bool(data.get("simulated_leak")),
+                   "ml_location": data.get("simulated_location", 0)} if status == 200 \
+                else {"error": "Invalid data format."}
+            payload = json.dumps(out).encode("utf-8")
+            writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Bad Request'}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                         f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin-1") + payload)
+            await writer.drain()
+            if close: break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
 
-                if response.status_code == 200:
-                    res_json = response.json()
-                    # We check what the ML thought vs what we Sent
-                    ml_thought = "🚨 DETECTED" if res_json.get('ml_leak_detected') else "Safe"
-                    truth = "🚨 LEAK" if data['simulated_leak'] == 1 else "Safe"
-                    
-                    print(f"[{timestamp}] {status_label:<20} | Truth: {truth:<7} | ML Says: {ml_thought}")
-                else:
-                    print(f"[{timestamp}] ❌ ERROR {response.status_code}")
+async def serve(host, port, delay_ms=0.0, ready=None):
+    server = await asyncio.start_server(lambda r, w: _handle_client(r, w, delay_ms / 1000.0), host, port,
+                                        backlog=4096)
+    if ready is not None: ready.set()
+    async with server:
+        await server.serve_forever()
 
-            except Exception as e:
-                print(f"❌ Connection Error: {str(e)}")
 
-            time.sleep(DELAY_SECONDS)
+def _serve_process(host, port, delay_ms, ready):
+    try:
+        asyncio.run(serve(host, port, delay_ms, ready))
+    except KeyboardInterrupt:
+        pass
 
+# ==========================================
+# 🚀 ENTRY POINT
+# ==========================================
+def run_simulation(url=API_URL):
+    print(f"🚀 Training Simulator Started (Aggressive Mode)")
+    print(f"📡 Target: {url}")
+    print("---------------------------------------------------")
+    try:
+        asyncio.run(run_load(url, 1.0 / DELAY_SECONDS, 1, None, 1, 1, verbose=True))
     except KeyboardInterrupt:
         print("\n🛑 Stopped.")
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Device simulator and ingest load generator.")
+    parser.add_argument("--url", default=API_URL)
+    parser.add_argument("--rate", type=float, help="Target requests/second (enables load mode)")
+    parser.add_argument("--devices", type=int, default=100, help="Virtual devices (MASTER_NODE_1..N)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--connections", type=int, default=64, help="Keep-alive connection pool size")
+    parser.add_argument("--max-in-flight", type=int, default=10000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", action="store_true", help="Print every reading")
+    parser.add_argument("--local", action="store_true", help="Start a local stand-in server and target it")
+    parser.add_argument("--serve", action="store_true", help="Only run the stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--server-delay-ms", type=float, default=0.0, help="Stand-in processing time per request")
+    args = parser.parse_args()
+
+    if args.seed is not None: random.seed(args.seed)
+
+    if args.serve:
+        print(f"🧪 Stand-in ingest server on http://{args.host}:{args.port}/api/sensor-data")
+        _serve_process(args.host, args.port, args.server_delay_ms, None)
+        return
+
+    if args.rate is None and not args.local:
+        run_simulation(args.url)
+        return
+
+    server = None
+    url = args.url
+    if args.local:
+        # Separate process, so server work does not compete with the load generator's loop
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=_serve_process,
+                                         args=(args.host, args.port, args.server_delay_ms, ready), daemon=True)
+        server.start()
+        if not ready.wait(10):
+            print(json.dumps({"status": "error", "message": "stand-in server did not start"}))
+            sys.exit(1)
+        url = f"http://{args.host}:{args.port}/api/sensor-data"
+
+    rate = args.rate or 500.0
+    print(f"📡 Target: {url} | {rate:g} req/s | {args.devices} devices | {args.connections} connections", file=sys.stderr)
+    try:
+        report = asyncio.run(run_load(url, rate, args.devices, args.duration, args.connections,
+                                      args.max_in_flight, args.verbose))
+        report["url"] = url
+        print(json.dumps(report, indent=2))
+    finally:
+        if server is not None: server.terminate()
+
+
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    main()
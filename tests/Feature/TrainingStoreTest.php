@@ -0,0 +1,80 @@
+<?php
+
+namespace Tests\Feature;
+
+use App\Helpers\TrainingStore;
+use Illuminate\Support\Facades\File;
+use Symfony\Component\Process\Process;
+use Tests\TestCase;
+
+/**
+ * App\Helpers\TrainingStore must write the exact rows app/ml/training_store.py
+ * reads (and writes itself).
+ */
+class TrainingStoreTest extends TestCase
+{
+    private string $storage;
+
+    const ROW = [
+        'f_main' => 101.37, 'f_1' => 88.125, 'f_2' => 0.1, 'f_3' => 0,
+        'p_main' => 48.255, 'p_dma1' => 43.9, 'p_dma2' => -1.5, 'p_dma3' => 1e-7,
+        'pump_on' => 1, 'comp_on' => 0, 's1' => 1, 's2' => 0, 's3' => 0,
+        'solenoid_active' => 1, 'leak_detected' => 1, 'leak_location' => 3,
+    ];
+
+    protected function setUp(): void
+    {
+        parent::setUp();
+        $this->storage = sys_get_temp_dir() . '/training_store_test_' . uniqid();
+        $this->app->useStoragePath($this->storage);
+    }
+
+    protected function tearDown(): void
+    {
+        File::deleteDirectory($this->storage);
+        parent::tearDown();
+    }
+
+    private function segment(): string
+    {
+        return TrainingStore::path('pipeline') . '/' . date('Y-m-d') . '.f32';
+    }
+
+    public function test_rows_match_the_python_writer(): void
+    {
+        $this->assertTrue(TrainingStore::append('pipeline', self::ROW));
+
+        $python = base_path(strtoupper(substr(PHP_OS, 0, 3)) === 'WIN' ? 'venv\Scripts\python.exe' : 'venv/bin/python');
+        $script = <<<'PY'
+import sys, json
+from training_store import CSV_COLS, TrainingStore
+row = json.loads(sys.argv[2])
+store = TrainingStore("pipeline", sys.argv[1])
+store.append([[row[c] for c in CSV_COLS]], "python")
+PY;
+        $process = new Process([file_exists($python) ? $python : 'python3', '-c', $script,
+                                $this->storage . '/py_store', json_encode(self::ROW)], base_path('app/ml'));
+        $process->run();
+        if (!$process->isSuccessful()) $this->markTestSkipped('Python writer unavailable: ' . $process->getErrorOutput());
+
+        $this->assertSame(
+            bin2hex(file_get_contents($this->storage . '/py_store/pipeline/python.f32')),
+            bin2hex(file_get_contents($this->segment()))
+        );
+    }
+
+    public function test_torn_tail_is_dropped_before_appending(): void
+    {
+        TrainingStore::append('pipeline', self::ROW);
+        // A crashed writer left part of a row behind
+        file_put_contents($this->segment(), str_repeat("\xFF", 10), FILE_APPEND);
+
+        $this->assertTrue(TrainingStore::append('pipeline', self::ROW));
+
+        clearstatcache();
+        $this->assertSame(2 * TrainingStore::ROW_BYTES, filesize($this->segment()));
+        $row = substr(file_get_contents($this->segment()), 0, TrainingStore::ROW_BYTES);
+        $this->assertSame(str_repeat($row, 2), file_get_contents($this->segment()));
+        $this->assertSame(2, TrainingStore::count('pipeline'));
+    }
+}
@@ -0,0 +1,57 @@
+<?php
+
+namespace Tests\Unit;
+
+use App\Http\Controllers\Api\SensorDataController;
+use PHPUnit\Framework\TestCase;
+use ReflectionMethod;
+
+/**
+ * The device payload vectors in tests/fixtures/simon_ctr_vectors.json are
+ * shared with app/ml/payload_decoder.py (`python payload_decoder.py selftest`),
+ * so both decryptors are held to the same output. `php artisan ml:simon-vectors`
+ * regenerates them from this PHP implementation.
+ */
+class SimonCtrDecryptTest extends TestCase
+{
+    private function fixture(): array
+    {
+        return json_decode(file_get_contents(__DIR__.'/../fixtures/simon_ctr_vectors.json'), true);
+    }
+
+    private function decrypt(string $cipherHex, $nonce, string $key): string
+    {
+        $method = new ReflectionMethod(SensorDataController::class, 'simon_decrypt_ctr');
+        $method->setAccessible(true);
+
+        return $method->invoke(new SensorDataController(), $cipherHex, $nonce, $key);
+    }
+
+    public function test_decrypts_shared_vectors(): void
+    {
+        $fixture = $this->fixture();
+        $key = hex2bin($fixture['key_hex']);
+
+        foreach ($fixture['vectors'] as $vector) {
+            $this->assertSame(
+                $vector['plaintext'],
+                $this->decrypt($vector['ciphertext_hex'], $vector['nonce'], $key),
+                $vector['name']
+            );
+        }
+    }
+
+    public function test_ctr_mode_is_symmetric(): void
+    {
+        $fixture = $this->fixture();
+        $key = hex2bin($fixture['key_hex']);
+
+        foreach ($fixture['vectors'] as $vector) {
+            $this->assertSame(
+                strtoupper($vector['ciphertext_hex']),
+                strtoupper(bin2hex($this->decrypt(bin2hex($vector['plaintext']), $vector['nonce'], $key))),
+                $vector['name']
+            );
+        }
+    }
+}
@@ -0,0 +1,65 @@
+"""
+Shared fixtures for the app/ml tests.
+
+The ML scripts import each other by module name (they run from app/ml), so
+that directory goes on sys.path. Scripts that configure themselves at import
+time (train_with_ga.py, ...) are run as subprocesses against a temporary
+ML_STORAGE_DIR instead.
+"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+ML_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "app", "ml")
+sys.path.insert(0, ML_DIR)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Empty ML storage directory."""
+    path = tmp_path / "ml_models"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def run_script(storage):
+    """Run an app/ml script against `storage`; returns the JSON it printed last."""
+    def run(script, *args):
+        env = dict(os.environ, ML_STORAGE_DIR=storage, ML_TRAIN_JOBS="1")
+        proc = subprocess.run([sys.executable, script, *args], cwd=ML_DIR, env=env,
+                              capture_output=True, text=True, timeout=600)
+        lines = proc.stdout.splitlines()
+        starts = [i for i, line in enumerate(lines) if line.startswith("{")]
+        assert proc.returncode == 0 and starts, proc.stdout + proc.stderr
+        # The last top-level JSON document (one line, or indented over several)
+        return json.loads("\n".join(lines[starts[-1]:]))
+    return run
+
+
+@pytest.fixture
+def publish(storage):
+    """
+    Publish small forests as `version` into `storage`; returns their
+    (detect, locate, features) paths. flip=True trains on inverted leak
+    labels, so a version can be told apart by its answers.
+    """
+    import numpy as np
+    from sklearn.ensemble import RandomForestClassifier
+    from features import FEATURE_COLS, get_pipeline
+    from generate_dataset import generate
+    from model_publisher import NAMES, ModelPublisher
+
+    df = generate(1500, np.random.default_rng(0))
+    X = get_pipeline().transform_frame(df)
+
+    def run(version, flip=False):
+        y = df["leak_detected"].to_numpy()
+        clf_det = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0).fit(X, 1 - y if flip else y)
+        clf_loc = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0).fit(X, df["leak_location"])
+        ModelPublisher(storage).publish(version, clf_det, clf_loc, FEATURE_COLS, live=False, compact=False)
+        return tuple(os.path.join(storage, NAMES[kind].format(version)) for kind in ("detect", "locate", "features"))
+    return run
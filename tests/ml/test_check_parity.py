@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+import pytest
+
+from check_parity import fit_forests, run_checks
+from features import FEATURE_COLS, get_pipeline
+from generate_dataset import generate
+from temporal import window_feature_cols
+from training_store import TrainingStore
+
+
+@pytest.mark.parametrize("feature_cols", [FEATURE_COLS, FEATURE_COLS + window_feature_cols([8])])
+def test_numpy_forests_match_sklearn(feature_cols):
+    df = generate(2000, np.random.default_rng(0))
+    pipeline = get_pipeline(tuple(feature_cols))
+    clf_det, clf_loc = fit_forests(df, pipeline, n_estimators=10)
+    out = run_checks(df, clf_det, clf_loc, pipeline)
+    assert out["status"] == "success", out["checks"]
+    assert [c["rows"] for c in out["checks"]] == [2000] * 3
+
+
+def test_default_run_checks_the_training_store(storage, run_script):
+    TrainingStore("pipeline", os.path.join(storage, "store")).append_frame(generate(300, np.random.default_rng(1)))
+    out = run_script("check_parity.py")
+    assert out["data"] == "training"
+    assert out["checks"][0]["rows"] == 300
+
+
+def test_default_run_without_data_uses_synthetic_rows(storage, run_script):
+    out = run_script("check_parity.py")
+    assert (out["status"], out["data"]) == ("success", "synthetic")
@@ -0,0 +1,54 @@
+import os
+
+from model_registry import ModelRegistry, version_from_path
+
+
+def test_version_from_path():
+    assert version_from_path("storage/app/ml_models/rf_leak_detect_v1_2.joblib") == "v1_2"
+
+
+def test_load_is_cached_until_the_files_change(publish):
+    paths = publish("v1")
+    registry = ModelRegistry()
+    entry = registry.load("v1", *paths)
+    assert registry.load("v1", *paths) is entry
+
+    # Republishing relinks the names to new objects (new inode)
+    publish("v1", flip=True)
+    reloaded = registry.load("v1", *paths)
+    assert reloaded is not entry
+    assert reloaded.clf_detect is not entry.clf_detect
+
+
+def test_hash_verify_keeps_entries_whose_bytes_are_unchanged(publish):
+    paths = publish("v1")
+    registry = ModelRegistry(verify="hash")
+    entry = registry.load("v1", *paths)
+    os.utime(paths[0], ns=(1, 1))
+    assert registry.load("v1", *paths).clf_detect is entry.clf_detect
+
+
+def test_lru_eviction_never_drops_the_active_version(publish):
+    registry = ModelRegistry(capacity=2)
+    registry.activate("v1", *publish("v1"))
+    registry.load("v2", *publish("v2"))
+    registry.load("v3", *publish("v3"))
+    assert registry.versions() == ["v1", "v3"]
+    assert registry.get("v2") is None
+
+    registry.load("v2", *publish("v2"))
+    assert registry.versions() == ["v1", "v2"]
+    assert registry.active_version == "v1"
+
+
+def test_activate_swaps_the_active_entry(publish):
+    registry = ModelRegistry()
+    assert registry.active() is None
+    old = registry.activate("v1", *publish("v1"))
+    held = registry.get()
+    new = registry.activate("v2", *publish("v2", flip=True))
+
+    assert registry.get() is new
+    assert registry.get("v1") is old
+    # A request that took the entry before the swap keeps scoring on it
+    assert held is old and held.version == "v1"
@@ -0,0 +1,27 @@
+import pytest
+
+from payload_decoder import encrypt, parse_batch, selftest
+
+
+def test_shared_vectors():
+    out = selftest()
+    assert out["status"] == "success", out["failures"]
+
+
+@pytest.mark.parametrize("nonce, accepted", [
+    (7, True), (" 7 ", True), ("0.0", True),
+    ("0", False), (0, False), (0.0, False), ("", False), (" ", False), (None, False), (False, False), ([], False),
+])
+def test_nonce_follows_php_truthiness(nonce, accepted):
+    _, _, errors, _ = parse_batch([{"ciphertext": encrypt('{"f_main":1}', 7), "nonce": nonce}])
+    assert (errors.get(0) != "Missing ciphertext or nonce") == accepted
+
+
+def test_ciphertext_falls_back_like_null_coalescing():
+    cipher = encrypt('{"f_main":1}', 7)
+    _, records, errors, _ = parse_batch([
+        {"ciphertext": "", "cipher": cipher, "nonce": 7},   # "" reaches PHP as null
+        {"ciphertext": "0", "cipher": cipher, "nonce": 7},  # "0" is kept, and is falsy
+    ])
+    assert records == [{"f_main": 1}]
+    assert errors == {1: "Missing ciphertext or nonce"}
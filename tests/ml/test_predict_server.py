@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import http.client
+
+import numpy as np
+import pytest
+
+from conftest import ML_DIR
+from generate_dataset import generate
+from training_store import TrainingStore
+
+# A training row with a leak: models published with flip=True call it safe
+LEAK = next(r for r in generate(1500, np.random.default_rng(0)).to_dict("records") if r["leak_detected"] == 1)
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost", timeout=30)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+@pytest.fixture
+def server(storage):
+    """start(*args) runs predict_server.py on a Unix socket and returns request(method, path, body)."""
+    procs = []
+    sock = os.path.join(storage, "predict.sock")
+
+    def request(method, path, body=None):
+        conn = UnixConnection(sock)
+        try:
+            conn.request(method, path, json.dumps(body) if body is not None else None,
+                         {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def start(*args):
+        env = dict(os.environ, ML_STORAGE_DIR=storage)
+        proc = subprocess.Popen([sys.executable, "predict_server.py", "--socket", sock, *args],
+                                cwd=ML_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        procs.append(proc)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            assert proc.poll() is None, proc.stderr.read().decode()
+            try:
+                request("GET", "/health")
+                return request
+            except OSError:
+                time.sleep(0.1)
+        pytest.fail("predict_server.py did not start")
+
+    yield start
+    for proc in procs:
+        proc.terminate()
+        proc.wait(10)
+
+
+def model(paths, version):
+    detect, locate, features = paths
+    return {"version": version, "detect": detect, "locate": locate, "features": features}
+
+
+def test_activate_swaps_the_served_version(server, publish):
+    request = server()
+    assert request("GET", "/health") == (200, {"status": "ok", "active": None, "versions": [],
+                                                "devices": [], "batching": None})
+    status, result = request("POST", "/predict", {"input": LEAK})
+    assert status == 500 and "error" in result
+
+    status, result = request("POST", "/activate", model(publish("v1"), "v1"))
+    assert (status, result["active"]["version"]) == (200, "v1")
+    status, result = request("POST", "/predict", {"input": LEAK})
+    assert (status, result["leak_detected"]) == (200, 1)
+    assert "stored" not in result
+
+    # Hot swap: later requests use v2, and v1 stays cached for version-pinned (A/B) requests
+    request("POST", "/activate", model(publish("v2", flip=True), "v2"))
+    assert request("POST", "/predict", {"input": LEAK})[1]["leak_detected"] == 0
+    assert request("POST", "/predict", {"version": "v1", "input": LEAK})[1]["leak_detected"] == 1
+
+    status, health = request("GET", "/health")
+    assert (health["active"], sorted(health["versions"])) == ("v2", ["v1", "v2"])
+
+
+def test_predict_with_model_paths_and_batches(server, publish):
+    request = server()
+    paths = model(publish("v1"), "v1")
+    status, result = request("POST", "/predict", dict(paths, input=LEAK))
+    assert (status, result["leak_detected"]) == (200, 1)
+
+    status, result = request("POST", "/predict_batch", dict(paths, inputs=[LEAK, LEAK]))
+    assert status == 200 and result["version"] == "v1"
+    assert [r["leak_detected"] for r in result["results"]] == [1, 1]
+    assert request("GET", "/unknown")[0] == 404
+
+
+def test_batched_store_marks_results_stored(server, publish, storage):
+    detect, locate, features = publish("v1")
+    request = server("--detect", detect, "--locate", locate, "--features", features,
+                     "--batch-max", "8", "--store", "pipeline")
+    status, result = request("POST", "/predict", {"input": LEAK})
+    assert (status, result["leak_detected"], result["stored"]) == (200, 1, True)
+
+    # Stored by the server, so SensorDataController skips its own append
+    assert TrainingStore("pipeline", os.path.join(storage, "store")).count() == 1
+    assert request("GET", "/health")[1]["batching"] is not None
@@ -0,0 +1,54 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from generate_dataset import generate, write_csv
+from incremental import STATE_FILE
+from retention import LEGACY_CSV, compact
+from training_store import TrainingStore
+
+
+def state_of(storage):
+    with open(os.path.join(storage, STATE_FILE)) as f: return json.load(f)
+
+
+def test_legacy_csv_is_compacted_after_an_incremental_run(storage, run_script):
+    csv_path = os.path.join(storage, LEGACY_CSV)
+    write_csv(300, csv_path, seed=1)
+    size = os.path.getsize(csv_path)
+
+    # Full run: reads the legacy CSV
+    run_script("train_with_ga.py", "v1")
+    assert state_of(storage)["pipeline_legacy_csv"] == {"bytes": size}
+
+    # Incremental run: reads only the new store rows, keeps the CSV record
+    TrainingStore("pipeline", os.path.join(storage, "store")).append_frame(generate(200, np.random.default_rng(2)))
+    run_script("train_with_ga.py", "v2", "--incremental")
+    state = state_of(storage)
+    assert state["mode"] == "incremental"
+    assert state["pipeline_legacy_csv"] == {"bytes": size}
+
+    old = time.time() - 3 * 86400
+    os.utime(csv_path, (old, old))
+    out = compact(keep_days=1, storage_dir=storage)
+    assert out["legacy_csv"] is True
+    assert out["rows_folded"] == 300
+    assert not os.path.exists(csv_path)
+    assert os.path.exists(csv_path + ".compacted")
+    assert state_of(storage)["pipeline_legacy_csv"] is None
+
+
+def test_changed_legacy_csv_is_not_compacted(storage, run_script):
+    csv_path = os.path.join(storage, LEGACY_CSV)
+    write_csv(300, csv_path, seed=1)
+    run_script("train_with_ga.py", "v1")
+
+    # Rows appended after the run was trained
+    with open(csv_path, "a") as f: f.write(",".join(["1"] * 16) + "\n")
+    old = time.time() - 3 * 86400
+    os.utime(csv_path, (old, old))
+    out = compact(keep_days=1, storage_dir=storage)
+    assert out["rows_folded"] == 0
+    assert os.path.exists(csv_path)
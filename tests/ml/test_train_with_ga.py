@@ -0,0 +1,47 @@
+import os
+import json
+
+import numpy as np
+
+from generate_dataset import generate
+from incremental import STATE_FILE
+from training_store import TrainingStore, load_dataset
+
+
+def state_of(storage):
+    with open(os.path.join(storage, STATE_FILE)) as f: return json.load(f)
+
+
+def write_validated(storage, rows, seed):
+    """validated_alerts.csv as ValidatedAlerts::append writes it (one row per label, with a weight)."""
+    generate(rows, np.random.default_rng(seed)).assign(weight=10).to_csv(
+        os.path.join(storage, "validated_alerts.csv"), index=False)
+
+
+def test_strict_run_keeps_the_store_watermark(storage, run_script):
+    root = os.path.join(storage, "store")
+    store = TrainingStore("pipeline", root)
+    store.append_frame(generate(200, np.random.default_rng(1)))
+    run_script("train_with_ga.py", "v1")
+    trained = state_of(storage)["pipeline_watermark"]
+    assert trained == store.watermark()
+
+    # Live rows arrive, then a strict run trains on validated alerts only
+    store.append_frame(generate(100, np.random.default_rng(2)))
+    write_validated(storage, 40, seed=3)
+    run_script("train_with_ga.py", "v2")
+    assert state_of(storage)["pipeline_watermark"] == trained
+
+    # ... so the next incremental run still sees them
+    assert len(load_dataset("pipeline", root=root, since=trained)) == 100
+    run_script("train_with_ga.py", "v3", "--incremental")
+    state = state_of(storage)
+    assert state["mode"] == "incremental"
+    assert state["pipeline_watermark"] == store.watermark()
+
+
+def test_strict_first_run_marks_nothing_trained(storage, run_script):
+    TrainingStore("pipeline", os.path.join(storage, "store")).append_frame(generate(100, np.random.default_rng(1)))
+    write_validated(storage, 40, seed=2)
+    run_script("train_with_ga.py", "v1")
+    assert state_of(storage)["pipeline_watermark"] is None